@@ -20,6 +20,7 @@ import { portfolioReturns } from './api/PortfolioBenchMark';
 
 
 const drawerWidth = 240; // Width of the sidebar drawer
+const chartMaxPoints = 600; // Longer series are downsampled on the server (LTTB), about 2 points per pixel of the chart
 
 // Define a mapping from indicator value to label at the top of your file or inside the component
 const indicatorLabels: Record<string, string> = {
@@ -63,35 +64,19 @@ function App() {
       end_date: dateRange.end,
       market_index: benchmark,
       indicator: indicator,
+      max_points: chartMaxPoints,
+      format: 'columnar',
     }).then(data => {
-      console.log(`🔍 DATA STRUCTURE DEBUG for ${indicator}:`, {
-        totalItems: data.portfolio_returns?.length || 0,
-        firstItem: data.portfolio_returns ? data.portfolio_returns[0] : null,
-        dataKeys: data.portfolio_returns && data.portfolio_returns[0] ? Object.keys(data.portfolio_returns[0]) : []
-      });
-      
-      // console.log('Portfolio returns data:', data);
-      // Expecting: { portfolio_returns: Array, ... }
-      let array: any[] = [];
-      if (Array.isArray(data.portfolio_returns)) {
-        array = data.portfolio_returns;
-        // console.log('First 5 items from portfolio returns:', array.slice(0, 5));
-        
-        console.log(`🔍 ARRAY STRUCTURE DEBUG for ${indicator}:`, {
-          totalItems: array.length,
-          hasIndex: array[0]?.index !== undefined,
-          hasDate: array[0]?.Date !== undefined,
-          dateField: array[0]?.Date || array[0]?.date || array[0]?.index || 'none'
-        });
-      } else {
-        console.error('API did not return an array:', data);
+      // Expecting: { portfolio_returns: { dates: [...], series: { portfolio_return: [...], [benchmark]: [...] } }, ... }
+      const columns = data.portfolio_returns;
+      if (!columns || !Array.isArray(columns.dates)) {
+        console.error('API did not return columnar portfolio returns:', data);
         return;
       }
 
-      // Use 'Date' field as the date label (note: uppercase D in the data)
-      const labels = array.map((item: any) => item.Date || item.date || item.index);
-      const portfolioReturnsArr = array.map((item: any) => item.portfolio_return);
-      const marketIndexReturns = array.map((item: any) => item[benchmark]);
+      const labels = columns.dates;
+      const portfolioReturnsArr: any[] = columns.series.portfolio_return || [];
+      const marketIndexReturns: any[] = columns.series[benchmark] || [];
 
       console.log(`📊 CHART DATA DEBUG for ${indicator}:`, {
         labelsLength: labels.length,
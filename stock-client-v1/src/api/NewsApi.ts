@@ -13,6 +13,10 @@ export interface NewsResponse {
   totalResults: number;
   tickers: string[];
   message?: string;
+  cached?: boolean;
+  stale?: boolean; // Some tickers were served past expiry while the server refreshes them
+  stale_tickers?: string[];
+  freshness?: Record<string, { cached_at: string; expires_at: string; stale: boolean }>;
 }
 
 const API_BASE_URL = 'http://127.0.0.1:8000/api_v1';
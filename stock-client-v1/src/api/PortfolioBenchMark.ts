@@ -7,6 +7,10 @@ interface PortfolioReturnsParams {
   end_date: string;   // Format: 'YYYY-MM-DD'
   market_index: string; // e.g., 'S&P 500', 'NASDAQ', etc.
   indicator: string; // e.g. "Engagement Ratio", "Sentiment Score"
+  top_n?: number; // Stocks held per month, defaults to 5 on the server
+  resolution?: 'daily' | 'weekly' | 'monthly'; // Aggregation of the return series, defaults to daily
+  max_points?: number; // Downsample the series to about this many points
+  format?: 'records' | 'columnar'; // One object per day, or a date array plus one array per series
 }
 
 export const portfolioReturns = async (params: PortfolioReturnsParams) => {
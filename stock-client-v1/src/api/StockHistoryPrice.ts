@@ -6,6 +6,17 @@ interface StockPriceHistoryParams {
   ticker: string;
   start_date: string; // Format: 'YYYY-MM-DD'
   end_date: string;   // Format: 'YYYY-MM-DD'
+  resolution?: 'daily' | 'weekly' | 'monthly'; // OHLCV bars, defaults to daily
+  max_points?: number; // Downsample the series to about this many points
+}
+
+export interface StockPriceRow {
+  date: string;
+  open_price: number;
+  close_price: number;
+  high_price: number;
+  low_price: number;
+  volume: number;
 }
 
 export const fetchStockPriceHistory = async (params: StockPriceHistoryParams) => {
@@ -16,4 +27,22 @@ export const fetchStockPriceHistory = async (params: StockPriceHistoryParams) =>
     console.error('Error fetching stock price history:', error);
     throw error; // Re-throw the error for further handling
   }
-};
\ No newline at end of file
+};
+
+// Prices of several tickers in one request: { GME: [...], AMC: [...] }
+export const fetchStockPriceHistoryBatch = async (
+  tickers: string[],
+  start_date: string,
+  end_date: string,
+  options: Pick<StockPriceHistoryParams, 'resolution' | 'max_points'> = {}
+): Promise<Record<string, StockPriceRow[]>> => {
+  try {
+    const response = await axios.get(BASE_URL, {
+      params: { tickers: tickers.join(','), start_date, end_date, ...options }
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching stock price history:', error);
+    throw error;
+  }
+};
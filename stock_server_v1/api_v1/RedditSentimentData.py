@@ -1,23 +1,96 @@
+import logging
+
 import pandas as pd
 import numpy as np
+from .data_registry import registry
+from . import sentiment_store
+from . import price_panel
+from . import portfolio_engine
+from .ranking_index import MonthlyRankingIndex, AGG_MAP, dataset_version
+
+logger = logging.getLogger(__name__)
 
 class RedditSentimentData:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, use_cache: bool = True):
         """
         Initialize the RedditSentimentData class with the path to the sentiment data file.
+        The parsed dataframe is shared through the process-wide dataset registry and only
+        re-parsed when the file changes; pass use_cache=False to force a private load.
+        The shared dataframe must be treated as read-only.
+        If a current columnar store (see sentiment_store) exists next to the csv, it is loaded instead.
         """
         self.file_path = file_path
-        self.df_sentiment = self.load_sentiment_data()
+        self.store_path = sentiment_store.store_path_for(file_path)
+        self.use_cache = use_cache
+        self._source_path = self.source_path()
+        if use_cache:
+            self.df_sentiment = registry.get(self._source_path, self.load_sentiment_data)
+        else:
+            self.df_sentiment = self.load_sentiment_data()
         self.portfolio = []
 
+    def use_store(self) -> bool:
+        """
+        Whether a columnar store built from the current csv content is available
+        """
+        return sentiment_store.is_store_current(self.file_path, self.store_path)
+
+    def source_path(self) -> str:
+        """
+        File that identifies the loaded data version: the store manifest if the store is used, otherwise the csv
+        """
+        if self.use_store():
+            return sentiment_store.manifest_path(self.store_path)
+        return self.file_path
+
+    @staticmethod
+    def content_hash(file_path: str) -> str:
+        """
+        Content hash of the sentiment csv without loading it, taken from the store manifest when
+        the store is current (so the version does not change when the store is built)
+        """
+        store_path = sentiment_store.store_path_for(file_path)
+        if sentiment_store.is_store_current(file_path, store_path):
+            manifest = sentiment_store.read_manifest(store_path)
+            if manifest.get('source', {}).get('hash'):
+                return manifest['source']['hash']
+            return registry.fingerprint(sentiment_store.manifest_path(store_path))
+        return registry.fingerprint(file_path)
+
+    @staticmethod
+    def dataset_version(file_path: str) -> str:
+        """
+        Version of the monthly rankings built from file_path, see ranking_index.dataset_version
+        """
+        return dataset_version(RedditSentimentData.content_hash(file_path))
+
     def load_sentiment_data(self) -> pd.DataFrame:
+        """
+        Load sentiment data from the columnar store if it is current, otherwise parse the csv file
+        """
+        if self.use_store():
+            return sentiment_store.load_store(self.store_path)
+        return self.read_sentiment_csv(self.file_path)
+
+    @staticmethod
+    def read_sentiment_csv(file_path: str) -> pd.DataFrame:
         """
         Load sentiment data from csv file with title, score, comms_num, body, date, stock, sentiment scores for title and body
         , and return a dataframe with total sentiment and engagement ratio
         """
+        # Only parse the columns the indicators need, title and body text are never used
+        header = pd.read_csv(file_path, nrows=0).columns
+        usecols = [col for col in header if col in ('date', 'stock', 'score', 'comms_num', 'total_sentiment', 'engagement_ratio')
+                   or ('sentiment' in col.lower() and ('title' in col.lower() or 'body' in col.lower()))]
         # Read sentiment data from csv file
-        df = pd.read_csv(self.file_path)
+        df = pd.read_csv(file_path, usecols=usecols)
+        return RedditSentimentData.prepare_sentiment_frame(df)
 
+    @staticmethod
+    def prepare_sentiment_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Derive total sentiment and engagement ratio from raw post rows and index them by (date, stock)
+        """
         # Convert 'date' column to datetime format
         df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
         
@@ -30,7 +103,7 @@ class RedditSentimentData:
             if title_sentiment_cols and body_sentiment_cols:
                 df['total_sentiment'] = df[title_sentiment_cols[0]] + df[body_sentiment_cols[0]]
             else:
-                print(f"Warning: Could not find sentiment columns. Available columns: {df.columns.tolist()}")
+                logger.warning("Could not find sentiment columns. Available columns: %s", df.columns.tolist())
                 # Create dummy sentiment if not available
                 df['total_sentiment'] = 0.0
         
@@ -49,70 +122,51 @@ class RedditSentimentData:
         
         return df
 
-    def filter_strategies(self, indicator: str, debug: bool = False) -> pd.DataFrame:
+    def filter_strategies(self, indicator: str, debug: bool = False, top_n: int = 5) -> pd.DataFrame:
         """
         Aggregate Monthly and calculate average sentiment for the month
         Filter data using the specified indicator
-        - Top 5 "Sentiment" stocks (or fewer if not enough data available)
-        - Top 5 "Engagement ratio" stocks
+        - Top N (default 5) "Sentiment" stocks (or fewer if not enough data available)
+        - Top N "Engagement ratio" stocks
+        Rankings come from the precomputed monthly ranking index.
         """
         df_filtered = pd.DataFrame()
-        # --- Refactored to reduce duplication ---
-        agg_map = {
-            'engagement_ratio': 'mean',
-            'total_sentiment': 'mean',
-            'comms_num': 'mean',
-            'score': 'mean'
-        }
-        if indicator in agg_map:
-            agg_func = agg_map[indicator]
-            
+        if indicator in AGG_MAP:
             # Check if the indicator column exists
             if indicator not in self.df_sentiment.columns:
-                print(f"Warning: Indicator '{indicator}' not found in data. Available columns: {self.df_sentiment.columns.tolist()}")
+                logger.warning("Indicator '%s' not found in data. Available columns: %s", indicator, self.df_sentiment.columns.tolist())
                 return df_filtered
-            
-            # Aggregate monthly by indicator, removing NaN values
-            df_agg = (
-                self.df_sentiment.reset_index('stock')
-                .groupby([pd.Grouper(freq='ME'), 'stock'])[[indicator]]
-                .agg(agg_func)
-                .dropna()  # Remove any NaN results from aggregation
-            )
-            
-            if debug:
-                print(f"Debug: Total stocks per month after aggregation:")
-                stocks_per_month = df_agg.groupby(level=0).size()
-                print(stocks_per_month)
-            
-            # Rank based on specific indicator (method='first' handles ties consistently)
-            df_agg['rank'] = (
-                df_agg.groupby(level=0)[indicator]
-                .transform(lambda x: x.rank(ascending=False, method='first').astype(int))
-            )
-            
+
+            ranking = self.ranking_index()
+
             if debug:
-                print(f"Debug: Rankings for each month:")
-                for date in df_agg.index.get_level_values(0).unique():
-                    month_data = df_agg.xs(date, level=0).sort_values('rank')
-                    available_stocks = len(month_data)
-                    selected_stocks = min(5, available_stocks)
-                    print(f"{date.strftime('%Y-%m')}: {available_stocks} stocks available, selecting top {selected_stocks}")
-                    print(month_data[['rank']].head(5))
-            
-            # Filter out top N ranking - get top 5 or all available if fewer than 5
-            df_filtered = df_agg[df_agg['rank'] <= 5].copy()
-            
+                logger.info("Rankings for each month:")
+                for month in ranking.months(indicator):
+                    month_data = ranking.top(indicator, month)
+                    selected_stocks = min(top_n, len(month_data))
+                    logger.info("%s: %d stocks available, selecting top %d\n%s", month.strftime('%Y-%m'), len(month_data),
+                                selected_stocks, month_data[:top_n])
+
+            # Filter out top N ranking - get top N or all available if fewer than N
+            df_filtered = ranking.top_frame(indicator, top_n)
+
             if debug:
-                print(f"Debug: Final selected stocks per month:")
-                final_per_month = df_filtered.groupby(level=0).size()
-                print(final_per_month)
-            
-            # Adjust date to be the first day of the month
+                logger.info("Final selected stocks per month:\n%s", df_filtered.groupby(level=0).size())
+
+            # Portfolios are formed on the first day of the month after the ranked month
             df_filtered = df_filtered.reset_index('stock')
-            df_filtered.index = df_filtered.index + pd.DateOffset(1)
-            df_filtered = df_filtered.reset_index().set_index(['date', 'stock'])       
+            df_filtered.index = df_filtered.index + pd.offsets.MonthBegin(1)
+            df_filtered = df_filtered.reset_index().set_index(['date', 'stock'])
         return df_filtered
+
+    def ranking_index(self) -> MonthlyRankingIndex:
+        """
+        Monthly ranking table for all indicators, built once per loaded dataset version
+        """
+        if not self.use_cache:
+            return MonthlyRankingIndex(self.df_sentiment)
+        return registry.get_derived(self._source_path, 'monthly_ranking',
+                                    lambda: MonthlyRankingIndex(self.df_sentiment))
     
     def extract_portfolios(self, df_filtered: pd.DataFrame) -> dict:
         """
@@ -134,7 +188,8 @@ class RedditSentimentData:
         '''
         Extract the stocks to form portfolios with at the start of each new month
         Create a dictionary containing start of month and corresponded selected stocks.
-        Read historical prices of the stocks from csv files in stock_historical_prices_2019-2024
+        Read historical prices of the stocks from the price panel built for dir_path if it is current,
+        otherwise from csv files in stock_historical_prices_2019-2024
         '''
         # Check if start and end date are weekends, if so, set to the next Monday
         start = pd.to_datetime(start)
@@ -150,39 +205,31 @@ class RedditSentimentData:
         start = start.strftime('%Y-%m-%d')
         end = end.strftime('%Y-%m-%d')
 
-        # Read historical prices of the stocks from csv files in stock_historical_prices_2019-2024
-        df_all = pd.DataFrame()
-        df_temp = pd.DataFrame()
-        for ticker in stock_list:
-            try:
-                # file_path = f'data/stock_historical_prices_2019-2024/{ticker}.csv'
-                file_path = f'{dir_path}/{ticker}.csv'
-                # Read CSV, skip first 3 rows (header, ticker, date labels), use manual column names
-                df_temp = pd.read_csv(file_path, skiprows=3, names=['Date', 'Close', 'High', 'Low', 'Open', 'Volume'])
-                df_temp['Date'] = pd.to_datetime(df_temp['Date'])
-                df_temp = df_temp.set_index('Date')[start:end]['Close'].to_frame(ticker)
-                # print(f'df_temp: {df_temp}')
-            except Exception as e:
-                print(f'Prices of {ticker} might not exist, let it be NaN. Error: {e}')
-                # If df_temp cannot be read, let the ticker be NaN
-                df_temp = pd.DataFrame(index=pd.date_range(start, end), columns=[ticker])
-                df_temp[ticker] = np.nan
-            df_all = pd.concat([df_all, df_temp], axis=1)
-        # Calculate log return of each stocks
-        df_return = np.log(df_all.astype('float64')).diff().dropna(how='all')
+        # Use the prebuilt memory-mapped price panel when available, it already holds log returns
+        panel = price_panel.load_panel(dir_path)
+        if panel is not None:
+            df_return = panel.log_returns(stock_list, start, end).dropna(how='all')
+        else:
+            # Read historical prices of the stocks from csv files in stock_historical_prices_2019-2024
+            closes = []
+            for ticker in stock_list:
+                try:
+                    # file_path = f'data/stock_historical_prices_2019-2024/{ticker}.csv'
+                    file_path = f'{dir_path}/{ticker}.csv'
+                    df_temp = price_panel.read_price_csv(file_path)[start:end]['Close'].rename(ticker)
+                except Exception as e:
+                    logger.warning('Prices of %s might not exist, let it be NaN. Error: %s', ticker, e)
+                    # If prices cannot be read, let the ticker be an all-NaN column
+                    df_temp = pd.Series(index=pd.DatetimeIndex([]), dtype='float64', name=ticker)
+                closes.append(df_temp)
+            # Concatenate once instead of growing the frame per ticker
+            df_all = pd.concat(closes, axis=1) if closes else pd.DataFrame()
+            # Calculate log return of each stocks
+            df_return = np.log(df_all.astype('float64')).diff().dropna(how='all')
         # print(f'df_return: {df_return}')
-        # Calculate portfolio return based on the fixed dates and stock list
-        df_portfolio = pd.DataFrame()
-        for start_date in fixed_dates.keys():
-            # Find next month end as end date
-            end_date = (pd.to_datetime(start_date) + pd.offsets.MonthEnd()).strftime('%Y-%m-%d')
-            # print(start_date, end_date)
-            tickers = fixed_dates[start_date]
-            # print(tickers)
-            df_temp = df_return[start_date:end_date][tickers].mean(axis=1).to_frame('portfolio_return')
-            df_portfolio = df_portfolio.add(df_temp, fill_value=0)
-        # Convert index to datetime format
-        df_portfolio.index = pd.to_datetime(df_portfolio.index)
+        # Calculate portfolio return based on the fixed dates and stock list,
+        # as one masked reduction over the return matrix instead of a loop per rebalance date
+        df_portfolio = portfolio_engine.portfolio_returns(df_return, fixed_dates)
 
         # print(df_portfolio)
         
@@ -196,9 +243,8 @@ class RedditSentimentData:
                               end_date: str) -> pd.DataFrame:
         # Load prices of market index and calculate returns to compare to our strategy
         # file_path = f'data/market_indexes_2019-2024/{market_index}.csv'
-        benchmark_index = pd.read_csv(file_path, skiprows=3, names=['Date', 'Close', 'High', 'Low', 'Open', 'Volume'])
-        benchmark_index['Date'] = pd.to_datetime(benchmark_index['Date'])
-        benchmark_index = benchmark_index.set_index('Date')[start_date:end_date]
+        # The parsed index csv is shared through the dataset registry, slicing returns a new frame
+        benchmark_index = registry.get(file_path, lambda: price_panel.read_price_csv(file_path))[start_date:end_date]
         # Set index name to 'index'
         benchmark_index.index.name = 'index'
         benchmark_index = benchmark_index.astype('float64')
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ApiV1Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api_v1'
+
+    def ready(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+        from . import instrumentation
+
+        # Count the queries of request stages on every database connection
+        connection_created.connect(instrumentation.install_query_counter)
+        for connection in connections.all(initialized_only=True):
+            instrumentation.install_query_counter(connection=connection)
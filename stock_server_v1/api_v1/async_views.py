@@ -0,0 +1,116 @@
+"""
+Async views of the stock-price-history, news and portfolio-returns endpoints, served at
+/api_v1/async/... They take the same parameters and return the same bodies as the DRF
+viewsets, but under ASGI (serve_asgi.py) a request waiting on the database or NewsAPI
+does not hold a thread:
+
+- price history is read with the async ORM;
+- news is read from the cache with the async ORM, and missing tickers are fetched
+  concurrently with an async HTTP client (news_cache.aget_news);
+- portfolio-returns is pandas work, so the DRF view runs on a pool of
+  ASYNC_PORTFOLIO_WORKERS threads and a burst of requests queues for it.
+"""
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+from django.views import View
+
+from . import downsampling
+from . import instrumentation
+from . import news_cache
+from . import price_history
+from .single_flight import AsyncSingleFlight
+from .views import PortfolioReturnsViewSet
+
+logger = logging.getLogger(__name__)
+
+# Concurrent identical news requests share one fetch
+news_flights = AsyncSingleFlight(name='news')
+
+
+class AsyncStockPriceHistoryView(View):
+    async def get(self, request):
+        ticker = request.GET.get('ticker')
+        tickers = price_history.parse_tickers(request.GET.get('tickers', ''))
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+
+        if not (ticker or tickers) or not all([start_date, end_date]):
+            return JsonResponse({"error": "Please provide ticker (or tickers), start_date, and end_date."}, status=400)
+        if len(tickers) > price_history.MAX_TICKERS:
+            return JsonResponse({"error": f"At most {price_history.MAX_TICKERS} tickers per request."}, status=400)
+        try:
+            resolution, max_points = downsampling.parse_params(request.GET)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        try:
+            if tickers:
+                return JsonResponse(await price_history.aprice_records_by_ticker(tickers, start_date, end_date,
+                                                                                 resolution, max_points))
+            return JsonResponse(await price_history.aprice_records(ticker, start_date, end_date, resolution, max_points),
+                                safe=False)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+
+
+class AsyncNewsView(View):
+    # Build the NewsAPI clients on a cache miss and for background refreshes; tests swap in local stubs
+    news_client_factory = staticmethod(news_cache.async_newsapi_client)
+    refresh_client_factory = staticmethod(news_cache.newsapi_client)
+
+    async def get(self, request):
+        ticker_list = news_cache.parse_tickers(request.GET.get('tickers', ''))
+        if not ticker_list:
+            return JsonResponse({"error": "Please provide tickers parameter."}, status=400)
+        if len(ticker_list) > settings.NEWS_MAX_TICKERS:
+            return JsonResponse({"error": f"At most {settings.NEWS_MAX_TICKERS} tickers per request."}, status=400)
+
+        try:
+            news = await news_flights.do(
+                f"news?tickers={','.join(ticker_list)}",
+                lambda: news_cache.aget_news(ticker_list, client_factory=self.news_client_factory,
+                                             refresh_client_factory=self.refresh_client_factory),
+            )
+            return JsonResponse(news_cache.response_data(ticker_list, news))
+        except ImportError as e:
+            return JsonResponse({"error": f"{e.name or 'HTTP client'} library not installed."}, status=500)
+        except news_cache.NewsConfigError as e:
+            return JsonResponse({"error": str(e)}, status=500)
+        except Exception as e:
+            return JsonResponse({"error": f"Error fetching news: {str(e)}"}, status=500)
+
+
+_portfolio_view = PortfolioReturnsViewSet.as_view({'get': 'list'})
+_portfolio_executor = None
+
+
+def portfolio_executor() -> ThreadPoolExecutor:
+    global _portfolio_executor
+    if _portfolio_executor is None:
+        _portfolio_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_PORTFOLIO_WORKERS,
+                                                 thread_name_prefix='portfolio')
+    return _portfolio_executor
+
+
+def _render_portfolio(request):
+    try:
+        response = _portfolio_view(request)
+        with instrumentation.span('render'):
+            return response.render()
+    finally:
+        # Pool threads outlive the request cycle that would close their connection
+        connection.close()
+
+
+class AsyncPortfolioReturnsView(View):
+    async def get(self, request):
+        # The pool thread records its stage spans into this request's context
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(portfolio_executor(), context.run,
+                                                                _render_portfolio, request)
@@ -0,0 +1,247 @@
+"""
+Database-free backtest core shared by PortfolioReturnsViewSet and the parameter sweep.
+
+A sweep expands a grid of indicator x market_index x date window x top_n into single
+backtests and fans them out over a process pool:
+
+- the run_backtest_sweep command is single-threaded, so it forks a pool per run after
+  loading the sentiment data, its ranking index and the price panel into its dataset
+  registry; the workers share them copy-on-write (and the memory-mapped stores through
+  the page cache) instead of reloading them;
+- the backtest-sweep endpoint runs inside a threaded server, where a fork could copy a
+  lock another thread holds (the registry's, logging's) or that thread's database
+  connection into the child. Its sweeps share one pool of spawned workers per server
+  process (sweep_executor), created on first use; each worker loads the datasets once.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from .RedditSentimentData import RedditSentimentData
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Available data range of the sentiment dataset, requests are clamped to it
+MAX_START_DATE = '2021-01-28'
+MAX_END_DATE = '2021-08-02'
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def data_paths(base_dir) -> dict:
+    """
+    Locations of the sentiment csv, the stock price directory and the market index directory
+    """
+    return {
+        'sentiment': os.path.join(base_dir, 'data', 'reddit_sentiment_data.csv'),
+        'prices': os.path.join(base_dir, 'data', 'stock_historical_prices_2019-2024'),
+        'indexes': os.path.join(base_dir, 'data', 'market_indexes_2019-2024'),
+    }
+
+
+def market_indexes(paths: dict) -> list:
+    """
+    Names of the market indexes with a price csv in the index directory
+    """
+    try:
+        return sorted(name[:-len('.csv')] for name in os.listdir(paths['indexes']) if name.endswith('.csv'))
+    except FileNotFoundError:
+        return []
+
+
+def clamp_date_range(start_date: str, end_date: str) -> tuple:
+    """
+    Clamp the dates to the available range - do not exceed the available data range
+    """
+    if start_date < MAX_START_DATE:
+        start_date = MAX_START_DATE
+    if end_date > MAX_END_DATE:
+        end_date = MAX_END_DATE
+    return start_date, end_date
+
+
+def months_in_range(start_date: str, end_date: str) -> list:
+    """
+    First day of every month from the start month through the end date
+    """
+    start_dt = pd.to_datetime(start_date)
+    end_dt = pd.to_datetime(end_date)
+    return list(pd.date_range(start_dt.replace(day=1), end_dt, freq='MS'))
+
+
+def tickers_by_month(sentiment_data: RedditSentimentData, indicator: str, start_date: str, end_date: str, top_n: int) -> dict:
+    """
+    {month_str: [top_n tickers]} for every month of the range, straight from the ranking index
+    """
+    ranking = sentiment_data.ranking_index()
+    return {
+        month_dt.strftime('%Y-%m-%d'): [ticker for ticker, score, rank in ranking.top(indicator, month_dt, top_n)]
+        for month_dt in months_in_range(start_date, end_date)
+    }
+
+
+def portfolio_frame(sentiment_data: RedditSentimentData, paths: dict, tickers_by_date: dict,
+                    market_index: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """
+    Cumulative returns of the portfolio and of the market index for the rebalance schedule
+    """
+    # Get all unique stocks from monthly selections
+    stock_list = sorted({ticker for tickers in tickers_by_date.values() for ticker in tickers})
+    # Prices of the held stocks and the portfolio's daily returns
+    with instrumentation.span('price_load'):
+        df_portfolio = sentiment_data.load_historical_data(
+            paths['prices'], stock_list, tickers_by_date, start_date, end_date
+        )
+    file_path_index = os.path.join(paths['indexes'], f'{market_index}.csv')
+    with instrumentation.span('return_computation'):
+        return sentiment_data.get_portfolio_returns(
+            file_path_index, df_portfolio, market_index, start_date, end_date
+        )
+
+
+def summarize(cumulative: pd.Series) -> dict:
+    """
+    Summary statistics of a cumulative return series
+    """
+    cumulative = cumulative.dropna()
+    if cumulative.empty:
+        return {'total_return': None, 'annualized_volatility': None, 'sharpe_ratio': None,
+                'max_drawdown': None, 'days': 0}
+    wealth = 1 + cumulative.to_numpy(dtype='float64')
+    daily = np.diff(wealth, prepend=1.0) / np.concatenate(([1.0], wealth[:-1]))
+    volatility = float(np.std(daily, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR)) if len(daily) > 1 else None
+    sharpe = (float(np.mean(daily) * TRADING_DAYS_PER_YEAR / volatility)
+              if volatility else None)
+    drawdown = wealth / np.maximum.accumulate(wealth) - 1
+    return {
+        'total_return': float(cumulative.iloc[-1]),
+        'annualized_volatility': volatility,
+        'sharpe_ratio': sharpe,
+        'max_drawdown': float(drawdown.min()),
+        'days': int(len(cumulative)),
+    }
+
+
+def run_backtest(params: dict) -> dict:
+    """
+    Run one backtest and return its parameters with summary statistics.
+    params: indicator, market_index, start_date, end_date, top_n and paths
+    """
+    paths = params['paths']
+    result = {key: params[key] for key in ('indicator', 'market_index', 'start_date', 'end_date', 'top_n')}
+    try:
+        start_date, end_date = clamp_date_range(params['start_date'], params['end_date'])
+        sentiment_data = RedditSentimentData(paths['sentiment'])
+        tickers_by_date = tickers_by_month(sentiment_data, params['indicator'], start_date, end_date, params['top_n'])
+        if not any(tickers_by_date.values()):
+            result['error'] = 'No portfolio data available for the specified date range.'
+            return result
+        frame = portfolio_frame(sentiment_data, paths, tickers_by_date, params['market_index'], start_date, end_date)
+        result['portfolio'] = summarize(frame['portfolio_return'])
+        result['benchmark'] = summarize(frame[params['market_index']])
+        if result['portfolio']['total_return'] is not None and result['benchmark']['total_return'] is not None:
+            result['excess_return'] = result['portfolio']['total_return'] - result['benchmark']['total_return']
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def expand_grid(grid: dict, paths: dict) -> list:
+    """
+    Cartesian product of the grid, e.g.
+    {'indicators': [...], 'market_indexes': [...], 'windows': [{'start_date', 'end_date'}], 'top_ns': [...]}
+    """
+    windows = grid.get('windows') or [{'start_date': MAX_START_DATE, 'end_date': MAX_END_DATE}]
+    combinations = itertools.product(
+        grid.get('indicators') or ['engagement_ratio'],
+        grid.get('market_indexes') or ['QQQ'],
+        [(window['start_date'], window['end_date']) for window in windows],
+        [int(top_n) for top_n in (grid.get('top_ns') or [5])],
+    )
+    return [
+        {'indicator': indicator, 'market_index': market_index, 'start_date': start_date,
+         'end_date': end_date, 'top_n': top_n, 'paths': paths}
+        for indicator, market_index, (start_date, end_date), top_n in combinations
+    ]
+
+
+def warm_datasets(paths: dict):
+    """
+    Load the shared datasets into this process's registry
+    """
+    sentiment_data = RedditSentimentData(paths['sentiment'])
+    sentiment_data.ranking_index()
+    from .price_panel import load_panel
+    load_panel(paths['prices'])
+
+
+_sweep_executor = None
+_sweep_executor_lock = threading.Lock()
+
+
+def sweep_executor(paths: dict, max_workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool shared by every sweep of this server process, created on first use.
+    Workers are spawned, not forked, so they start without the server's threads' locks
+    and connections, and load the datasets of paths once when they start.
+    """
+    global _sweep_executor
+    with _sweep_executor_lock:
+        if _sweep_executor is None:
+            _sweep_executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                                  initializer=warm_datasets, initargs=(paths,))
+        return _sweep_executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    # A worker died (e.g. killed for memory); the next sweep starts a new pool
+    global _sweep_executor
+    with _sweep_executor_lock:
+        if _sweep_executor is executor:
+            _sweep_executor = None
+    executor.shutdown(wait=False)
+
+
+def run_sweep(tasks: list, max_workers: int = None, executor: ProcessPoolExecutor = None) -> list:
+    """
+    Run the backtests in a process pool and return their results in task order.
+    Without an executor a pool is forked for this sweep, after the datasets are loaded so
+    every worker starts with them in memory; only do that from a single-threaded process.
+    """
+    if not tasks:
+        return []
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(tasks)))
+    chunksize = max(1, len(tasks) // (max_workers * 4))
+    if max_workers == 1:
+        warm_datasets(tasks[0]['paths'])
+        return [run_backtest(task) for task in tasks]
+    if executor is not None:
+        try:
+            return list(executor.map(run_backtest, tasks, chunksize=chunksize))
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            raise
+
+    warm_datasets(tasks[0]['paths'])
+
+    # Forked workers inherit the loaded datasets; spawn-only platforms warm them per worker
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context, initializer, initargs = multiprocessing.get_context('fork'), None, ()
+    else:
+        context, initializer, initargs = multiprocessing.get_context(), warm_datasets, (tasks[0]['paths'],)
+
+    # Do not share the parent's database connections with forked workers
+    from django.db import connections
+    connections.close_all()
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                             initializer=initializer, initargs=initargs) as executor:
+        return list(executor.map(run_backtest, tasks, chunksize=chunksize))
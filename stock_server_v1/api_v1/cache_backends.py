@@ -0,0 +1,531 @@
+"""
+Pluggable storage of the news and monthly indicator caches.
+
+API_CACHE_BACKENDS picks where each cache lives:
+
+- 'database': the NewsCache/NewsArticle and MonthlyIndicatorCache/MonthlyIndicatorScore
+  tables (default; the only backend cleanup_news_cache expires and LRU-evicts);
+- 'memory': an LRU dict per worker process, bounded by MAX_ENTRIES;
+- 'file': one pickle file per entry in LOCATION, shared by every worker process on
+  the host. Writes are atomic renames and reads go through mmap;
+- 'redis': any server speaking the Redis protocol at LOCATION (redis://host:port/db),
+  over a small RESP client, so no client library is needed.
+
+The file and redis backends unpickle what they read, so whoever can write to LOCATION can
+run code in the server: keep the cache directory private to the server's user and the
+Redis server on a trusted network, with a password.
+
+cleanup_news_cache also deletes rankings of superseded dataset versions from the file and
+redis backends; the memory backend only lives as long as its process and is bounded anyway.
+
+news_store() and indicator_store() return the configured store. The key-value backends
+hold plain values (pickled outside the memory backend); a backend that fails is logged
+and treated as a miss, so the endpoints fall back to recomputing rather than erroring.
+"""
+import abc
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import re
+import socket
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import NewsCache, NewsArticle, MonthlyIndicatorCache, MonthlyIndicatorScore
+from . import cache_maintenance
+from . import monthly_aggregates
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackendError(Exception):
+    pass
+
+
+class CachedNews(NamedTuple):
+    created_at: object
+    expires_at: object
+    articles: list
+
+
+# Key-value backends
+
+class KeyValueBackend(abc.ABC):
+    """
+    get_many/set_many/delete_many of picklable values; timeout in seconds, None for no expiry
+    """
+
+    @abc.abstractmethod
+    def get_many(self, keys: list) -> dict:
+        pass
+
+    @abc.abstractmethod
+    def set_many(self, mapping: dict, timeout: float = None):
+        pass
+
+    @abc.abstractmethod
+    def delete_many(self, keys: list):
+        pass
+
+    @abc.abstractmethod
+    def keys(self, prefix: str = '') -> list:
+        """
+        Unexpired keys starting with prefix
+        """
+
+    def get(self, key: str, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set(self, key: str, value, timeout: float = None):
+        self.set_many({key: value}, timeout)
+
+
+class LRUBackend(KeyValueBackend):
+    def __init__(self, location=None, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires, value = entry
+                if expires is not None and expires <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, mapping, timeout=None):
+        expires = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            for key, value in mapping.items():
+                self._entries[key] = (expires, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def keys(self, prefix=''):
+        now = time.time()
+        with self._lock:
+            return [key for key, (expires, _) in self._entries.items()
+                    if key.startswith(prefix) and (expires is None or expires > now)]
+
+
+class FileBackend(KeyValueBackend):
+    def __init__(self, location=None):
+        self.location = str(location or settings.BASE_DIR / '.cache')
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.location, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        for key in keys:
+            try:
+                with open(self.path(key), 'rb') as entry_file, \
+                        mmap.mmap(entry_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    stored_key, expires, value = pickle.loads(data)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                # Empty, truncated or otherwise unreadable: a miss, and the next set rewrites it
+                logger.warning("Dropping unreadable cache file of %s: %s", key, e)
+                self.delete_many([key])
+                continue
+            if stored_key != key:
+                continue
+            if expires is not None and expires <= now:
+                self.delete_many([key])
+                continue
+            found[key] = value
+        return found
+
+    def set_many(self, mapping, timeout=None):
+        os.makedirs(self.location, exist_ok=True)
+        expires = time.time() + timeout if timeout is not None else None
+        for key, value in mapping.items():
+            # Readers in other processes see either the old or the new file, never a partial one
+            fd, tmp_path = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as tmp_file:
+                    pickle.dump((key, expires, value), tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path(key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def delete_many(self, keys):
+        for key in keys:
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def keys(self, prefix=''):
+        # File names are hashes, so every entry is read for its key; only maintenance lists keys
+        now = time.time()
+        try:
+            names = os.listdir(self.location)
+        except FileNotFoundError:
+            return []
+        found = []
+        for name in names:
+            if not name.endswith('.pkl'):
+                continue
+            try:
+                with open(os.path.join(self.location, name), 'rb') as entry_file, \
+                        mmap.mmap(entry_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    stored_key, expires, _ = pickle.loads(data)
+            except Exception:
+                # Removed meanwhile or unreadable; get_many drops unreadable files
+                continue
+            if stored_key.startswith(prefix) and (expires is None or expires > now):
+                found.append(stored_key)
+        return found
+
+
+def _encode_command(args) -> bytes:
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def _read_reply(stream):
+    line = stream.readline()
+    if not line.endswith(b'\r\n'):
+        raise CacheBackendError('Connection closed by the Redis server')
+    kind, payload = line[:1], line[1:-2]
+    if kind == b'+':
+        return payload.decode('utf-8')
+    if kind == b'-':
+        raise CacheBackendError(payload.decode('utf-8'))
+    if kind == b':':
+        return int(payload)
+    if kind == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        length = int(payload)
+        return None if length < 0 else [_read_reply(stream) for _ in range(length)]
+    raise CacheBackendError(f'Unexpected Redis reply: {line!r}')
+
+
+class RedisBackend(KeyValueBackend):
+    """
+    Values are pickled; only use a Redis server that no untrusted client can write to
+    """
+
+    def __init__(self, location=None, socket_timeout: float = 1.0, key_prefix: str = 'stock-server:'):
+        url = urlparse(str(location or 'redis://127.0.0.1:6379/0'))
+        self.host = url.hostname or '127.0.0.1'
+        self.port = url.port or 6379
+        self.db = int(url.path.strip('/') or 0)
+        self.password = url.password
+        self.socket_timeout = socket_timeout
+        self.key_prefix = key_prefix
+        # One connection per thread; replies are read in order
+        self._local = threading.local()
+
+    def _stream(self):
+        stream = getattr(self._local, 'stream', None)
+        if stream is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.socket_timeout)
+            stream = self._local.stream = sock.makefile('rwb')
+            sock.close()  # the stream keeps the socket open
+            setup = []
+            if self.password:
+                setup.append(('AUTH', self.password))
+            if self.db:
+                setup.append(('SELECT', self.db))
+            if setup:
+                self.execute(*setup)
+        return stream
+
+    def execute(self, *commands) -> list:
+        """
+        Replies of the commands, sent in one pipeline
+        """
+        stream = self._stream()
+        try:
+            stream.write(b''.join(_encode_command(command) for command in commands))
+            stream.flush()
+            return [_read_reply(stream) for _ in commands]
+        except (OSError, CacheBackendError):
+            self._local.stream = None
+            stream.close()
+            raise
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        values = self.execute(('MGET', *(self.key_prefix + key for key in keys)))[0]
+        return {key: pickle.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, mapping, timeout=None):
+        expiry = ('PX', max(1, int(timeout * 1000))) if timeout is not None else ()
+        commands = [('SET', self.key_prefix + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), *expiry)
+                    for key, value in mapping.items()]
+        if commands:
+            self.execute(*commands)
+
+    def delete_many(self, keys):
+        if keys:
+            self.execute(('DEL', *(self.key_prefix + key for key in keys)))
+
+    def keys(self, prefix=''):
+        pattern = re.sub(r'([*?\[\]\\])', r'\\\1', self.key_prefix + prefix) + '*'
+        found, cursor = {}, b'0'
+        while True:
+            cursor, batch = self.execute(('SCAN', cursor, 'MATCH', pattern, 'COUNT', 1000))[0]
+            # SCAN may return a key more than once
+            found.update(dict.fromkeys(key.decode('utf-8')[len(self.key_prefix):] for key in batch))
+            if cursor == b'0':
+                return list(found)
+
+
+BACKENDS = {
+    'memory': LRUBackend,
+    'file': FileBackend,
+    'redis': RedisBackend,
+}
+
+# A backend that is down is a cache miss
+BACKEND_ERRORS = (OSError, CacheBackendError, pickle.UnpicklingError, EOFError)
+
+
+# News stores
+
+def _article_dict(article: NewsArticle) -> dict:
+    return {
+        'title': article.title,
+        'source': article.source,
+        'publishedAt': article.published_at,
+        'url': article.url,
+        'description': article.description,
+        'urlToImage': article.url_to_image,
+    }
+
+
+class DatabaseNewsStore:
+    async def aget_many(self, tickers: list, since) -> dict:
+        entries = [entry async for entry in (NewsCache.objects
+                                             .filter(cache_key__in=tickers, expires_at__gt=since)
+                                             .prefetch_related('articles'))]
+        await cache_maintenance.atouch(NewsCache, entries)
+        return {entry.cache_key: CachedNews(entry.created_at, entry.expires_at,
+                                            [_article_dict(article) for article in entry.articles.all()])
+                for entry in entries}
+
+    async def aset(self, ticker: str, articles: list, now, ttl: timedelta) -> CachedNews:
+        # The delete and inserts share one transaction, which needs a sync connection
+        return await sync_to_async(self.set)(ticker, articles, now, ttl)
+
+    def get_many(self, tickers: list, since) -> dict:
+        """
+        {ticker: CachedNews} of the tickers with an entry expiring after since
+        """
+        entries = list(NewsCache.objects
+                       .filter(cache_key__in=tickers, expires_at__gt=since)
+                       .prefetch_related('articles'))
+        cache_maintenance.touch(NewsCache, entries)
+        return {entry.cache_key: CachedNews(entry.created_at, entry.expires_at,
+                                            [_article_dict(article) for article in entry.articles.all()])
+                for entry in entries}
+
+    def set(self, ticker: str, articles: list, now, ttl: timedelta) -> CachedNews:
+        """
+        Replace the cache entry of one ticker
+        """
+        with transaction.atomic():
+            NewsCache.objects.filter(cache_key=ticker).delete()
+            entry = NewsCache.objects.create(cache_key=ticker, tickers=ticker, expires_at=now + ttl,
+                                             total_results=len(articles))
+            NewsArticle.objects.bulk_create([
+                NewsArticle(cache=entry, title=article['title'], source=article['source'],
+                            published_at=article['publishedAt'], url=article['url'],
+                            description=article['description'], url_to_image=article['urlToImage'],
+                            article_order=order)
+                for order, article in enumerate(articles, start=1)
+            ])
+        return CachedNews(entry.created_at, entry.expires_at, list(articles))
+
+
+class KeyValueNewsStore:
+    def __init__(self, backend: KeyValueBackend):
+        self.backend = backend
+
+    # Backends do blocking file or socket I/O, so async callers run them off the event loop
+    async def aget_many(self, tickers, since):
+        return await sync_to_async(self.get_many, thread_sensitive=False)(tickers, since)
+
+    async def aset(self, ticker, articles, now, ttl):
+        return await sync_to_async(self.set, thread_sensitive=False)(ticker, articles, now, ttl)
+
+    def get_many(self, tickers, since):
+        try:
+            found = self.backend.get_many([f'news:{ticker}' for ticker in tickers])
+        except BACKEND_ERRORS as e:
+            logger.warning("News cache backend unavailable: %s", e)
+            return {}
+        entries = {}
+        for ticker in tickers:
+            entry = found.get(f'news:{ticker}')
+            if entry is not None and entry.expires_at > since:
+                entries[ticker] = entry
+        return entries
+
+    def set(self, ticker, articles, now, ttl):
+        entry = CachedNews(timezone.now(), now + ttl, list(articles))
+        # Kept through the stale grace window, then dropped by the backend
+        keep = entry.expires_at + timedelta(seconds=settings.NEWS_CACHE_STALE_SECONDS) - timezone.now()
+        try:
+            self.backend.set(f'news:{ticker}', entry, max(1.0, keep.total_seconds()))
+        except BACKEND_ERRORS as e:
+            logger.warning("Could not cache the news of %s: %s", ticker, e)
+        return entry
+
+
+# Monthly indicator stores
+
+class DatabaseIndicatorStore:
+    def get_rankings(self, indicator: str, months: list, dataset_version: str, top_n: int) -> dict:
+        """
+        {month: [(ticker, score, rank), ...] down to top_n} of the months cached for the dataset
+        version with rankings at least top_n deep, in two queries
+        """
+        cached_months = list(
+            MonthlyIndicatorCache.objects
+            .filter(month_year__in=months, indicator=indicator, dataset_version=dataset_version, depth__gte=top_n)
+            .prefetch_related(Prefetch(
+                'scores',
+                queryset=MonthlyIndicatorScore.objects.filter(rank__lte=top_n).order_by('rank'),
+                to_attr='top_scores'
+            ))
+        )
+        cache_maintenance.touch(MonthlyIndicatorCache, cached_months)
+        return {cached_month.month_year: [(score.ticker, score.score_value, score.rank)
+                                          for score in cached_month.top_scores]
+                for cached_month in cached_months}
+
+    def set_ranking(self, indicator: str, month, stocks_data: list, depth: int, dataset_version: str):
+        monthly_aggregates.replace_monthly_ranking(indicator, month, stocks_data, depth, dataset_version)
+
+    def carry_forward(self, old_version: str, new_version: str, changed_months: list) -> int:
+        return monthly_aggregates.carry_forward(old_version, new_version, changed_months)
+
+
+class KeyValueIndicatorStore:
+    def __init__(self, backend: KeyValueBackend):
+        self.backend = backend
+
+    @staticmethod
+    def key(indicator, month, dataset_version) -> str:
+        return f'indicators:{dataset_version}:{indicator}:{month.isoformat()}'
+
+    def get_rankings(self, indicator, months, dataset_version, top_n):
+        keys = {self.key(indicator, month, dataset_version): month for month in months}
+        try:
+            found = self.backend.get_many(list(keys))
+        except BACKEND_ERRORS as e:
+            logger.warning("Indicator cache backend unavailable: %s", e)
+            return {}
+        return {keys[key]: stocks_data[:top_n] for key, (depth, stocks_data) in found.items() if depth >= top_n}
+
+    def set_ranking(self, indicator, month, stocks_data, depth, dataset_version):
+        month = month.date() if hasattr(month, 'date') else month
+        # Valid for as long as the dataset version is current; cleanup_news_cache purges superseded versions
+        try:
+            self.backend.set(self.key(indicator, month, dataset_version), (depth, list(stocks_data)))
+        except BACKEND_ERRORS as e:
+            logger.warning("Could not cache the %s ranking of %s: %s", indicator, month, e)
+
+    def carry_forward(self, old_version, new_version, changed_months):
+        # Keys embed the version, so the rankings of untouched months are copied to the new version's keys
+        if old_version == new_version:
+            return 0
+        changed = {month.date() if hasattr(month, 'date') else month for month in changed_months}
+        keys = {self.key(indicator, month, old_version): self.key(indicator, month, new_version)
+                for month, indicator in monthly_aggregates.month_indicators() if month not in changed}
+        try:
+            found = self.backend.get_many(list(keys))
+            self.backend.set_many({keys[key]: ranking for key, ranking in found.items()})
+        except BACKEND_ERRORS as e:
+            logger.warning("Could not carry cached rankings forward to %s: %s", new_version, e)
+            return 0
+        return len(found)
+
+    def purge_superseded(self, current_version: str, dry_run: bool = False) -> int:
+        """
+        Delete the rankings of every dataset version but current_version; returns how many there were
+        """
+        current = f'indicators:{current_version}:'
+        superseded = [key for key in self.backend.keys('indicators:') if not key.startswith(current)]
+        if not dry_run:
+            for start in range(0, len(superseded), cache_maintenance.CHUNK_SIZE):
+                self.backend.delete_many(superseded[start:start + cache_maintenance.CHUNK_SIZE])
+        return len(superseded)
+
+
+_stores = {}
+_stores_guard = threading.Lock()
+
+
+def _store(name: str, database_store, key_value_store):
+    config = getattr(settings, 'API_CACHE_BACKENDS', {}).get(name, {'BACKEND': 'database'})
+    cache_key = (name, repr(sorted(config.items())))
+    with _stores_guard:
+        store = _stores.get(cache_key)
+        if store is None:
+            backend = config.get('BACKEND', 'database')
+            if backend == 'database':
+                store = database_store()
+            elif backend in BACKENDS:
+                options = {option.lower(): value for option, value in config.get('OPTIONS', {}).items()}
+                store = key_value_store(BACKENDS[backend](config.get('LOCATION'), **options))
+            else:
+                raise ImproperlyConfigured(
+                    f"Unknown {name} cache backend {backend!r}; use 'database' or one of {sorted(BACKENDS)}"
+                )
+            _stores[cache_key] = store
+    return store
+
+
+def news_store():
+    return _store('news', DatabaseNewsStore, KeyValueNewsStore)
+
+
+def indicator_store():
+    return _store('indicators', DatabaseIndicatorStore, KeyValueIndicatorStore)
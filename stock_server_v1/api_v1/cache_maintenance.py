@@ -0,0 +1,132 @@
+"""
+Bounded cleanup of the news and monthly indicator cache tables.
+
+Deletes run in chunks of entry ids, each chunk in its own short transaction, so a
+large cleanup never holds the SQLite write lock for long. Within a chunk the ORM only
+loads the chunk's entries; their articles/scores go in one fast DELETE.
+
+Besides age and dataset version, the caches can be capped in size: entries are
+evicted least recently used first until at most max_entries remain and their
+estimated size is under max_bytes. Cache hits record last_used_at through touch(),
+at most once per CACHE_LRU_TOUCH_SECONDS per entry so reads rarely write; entries
+never hit are ordered by their creation time.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, Length
+from django.utils import timezone
+
+from .models import NewsCache
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+# Rough storage of an entry row and of an article/score row besides its text, for the byte budget
+ENTRY_BYTES = 128
+ROW_BYTES = 48
+
+
+def _untouched(entries, now) -> list:
+    cutoff = now - timedelta(seconds=settings.CACHE_LRU_TOUCH_SECONDS)
+    return [entry.pk for entry in entries if entry.last_used_at is None or entry.last_used_at < cutoff]
+
+
+def touch(model, entries, now=None):
+    """
+    Record a cache hit on the entries not touched within CACHE_LRU_TOUCH_SECONDS, in one UPDATE
+    """
+    now = now or timezone.now()
+    stale = _untouched(entries, now)
+    if stale:
+        model.objects.filter(pk__in=stale).update(last_used_at=now)
+    return len(stale)
+
+
+async def atouch(model, entries, now=None):
+    now = now or timezone.now()
+    stale = _untouched(entries, now)
+    if stale:
+        await model.objects.filter(pk__in=stale).aupdate(last_used_at=now)
+    return len(stale)
+
+
+def estimated_bytes(model):
+    """
+    Expression of the estimated stored size of an entry with its articles or scores
+    """
+    if model is NewsCache:
+        text_bytes = sum(
+            (Coalesce(Length(f'articles__{field}'), 0) for field in
+             ('title', 'source', 'url', 'description', 'url_to_image')),
+            Value(0),
+        )
+        return Coalesce(Sum(text_bytes), 0) + Count('articles') * ROW_BYTES + ENTRY_BYTES
+    return Count('scores') * ROW_BYTES + ENTRY_BYTES
+
+
+def lru_order(model):
+    return model.objects.annotate(
+        used_at=Coalesce('last_used_at', 'created_at')
+    ).order_by('used_at', 'pk')
+
+
+def delete_in_chunks(queryset, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Delete the entries of queryset chunk by chunk, one transaction each; returns the entries deleted
+    """
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+def summarize(queryset) -> dict:
+    """
+    Entry, article/score row and estimated byte totals of queryset in one query
+    """
+    model = queryset.model
+    related = 'articles' if model is NewsCache else 'scores'
+    totals = {'entries': 0, 'rows': 0, 'bytes': 0}
+    sizes = queryset.annotate(rows=Count(related), size=estimated_bytes(model)).values_list('rows', 'size')
+    for rows, size in sizes.iterator(chunk_size=2000):
+        totals['entries'] += 1
+        totals['rows'] += rows
+        totals['bytes'] += size
+    return totals
+
+
+def evict_lru(model, max_entries: int = None, max_bytes: int = None, chunk_size: int = CHUNK_SIZE,
+              dry_run: bool = False) -> dict:
+    """
+    Evict least recently used entries until at most max_entries remain and their estimated size is
+    under max_bytes. Returns the number of entries and estimated bytes evicted (or to evict).
+    """
+    evicted = {'entries': 0, 'bytes': 0}
+    if max_entries is None and max_bytes is None:
+        return evicted
+    # The (id, size) pairs of every entry in LRU order, from one query; the totals come from the same list
+    ordered = list(lru_order(model).annotate(size=estimated_bytes(model)).values_list('pk', 'size')
+                   .iterator(chunk_size=2000))
+    entries, size = len(ordered), sum(entry_size for _, entry_size in ordered)
+    victims = []
+    for pk, entry_size in ordered:
+        if not ((max_entries is not None and entries > max_entries) or (max_bytes is not None and size > max_bytes)):
+            break
+        victims.append(pk)
+        entries -= 1
+        size -= entry_size
+        evicted['entries'] += 1
+        evicted['bytes'] += entry_size
+    if not dry_run:
+        for start in range(0, len(victims), chunk_size):
+            with transaction.atomic():
+                model.objects.filter(pk__in=victims[start:start + chunk_size]).delete()
+    return evicted
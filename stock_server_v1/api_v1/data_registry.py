@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    """
+    A loaded dataset plus the file fingerprint it was loaded from
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = None
+        self.stat_key = None
+        self.content_hash = None
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.last_load_seconds = 0.0
+        self.total_load_seconds = 0.0
+        self.loaded_at = None
+        self.derived = {}
+
+
+class DatasetRegistry:
+    """
+    Process-wide registry of parsed datasets keyed by file path.
+    A dataset is loaded once and shared by every caller until its file changes:
+    - mtime/size unchanged -> hit, no I/O beyond a stat call
+    - mtime/size changed but content hash unchanged -> hit (e.g. file touched or copied)
+    - content hash changed -> reload through the loader
+    Returned objects are shared between requests and must be treated as read-only.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._fingerprints = {}
+
+    @staticmethod
+    def _stat_key(path: str) -> tuple:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+        """
+        Content hash of a file, read in chunks so large files are not held in memory
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry(self, path: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                entry = self._entries[path] = _Entry()
+            return entry
+
+    def get(self, path: str, loader):
+        """
+        Return the dataset for path, calling loader() only when the file content changed
+        """
+        path = os.path.abspath(path)
+        entry = self._entry(path)
+        with entry.lock:
+            stat_key = self._stat_key(path)
+            if entry.value is not None and entry.stat_key == stat_key:
+                entry.hits += 1
+                return entry.value
+
+            content_hash = self.file_hash(path)
+            if entry.value is not None and entry.content_hash == content_hash:
+                # File was touched but not modified, keep the parsed data
+                entry.stat_key = stat_key
+                entry.hits += 1
+                return entry.value
+
+            started = time.perf_counter()
+            value = loader()
+            elapsed = time.perf_counter() - started
+
+            if entry.value is not None:
+                entry.reloads += 1
+            entry.value = value
+            entry.derived = {}
+            entry.stat_key = stat_key
+            entry.content_hash = content_hash
+            entry.misses += 1
+            entry.last_load_seconds = elapsed
+            entry.total_load_seconds += elapsed
+            entry.loaded_at = time.time()
+            logger.info("Loaded dataset %s in %.3fs (version %s)", path, elapsed, content_hash)
+            return value
+
+    def get_derived(self, path: str, name: str, builder):
+        """
+        Return an artifact built from the currently loaded version of path (e.g. a ranking index),
+        building it once per version. It is dropped whenever the underlying dataset reloads.
+        """
+        entry = self._entry(os.path.abspath(path))
+        with entry.lock:
+            if name not in entry.derived:
+                started = time.perf_counter()
+                entry.derived[name] = builder()
+                logger.info("Built %s for %s in %.3fs", name, path, time.perf_counter() - started)
+            return entry.derived[name]
+
+    def version(self, path: str):
+        """
+        Content hash of the currently loaded version of path, or None if not loaded
+        """
+        entry = self._entries.get(os.path.abspath(path))
+        return entry.content_hash if entry else None
+
+    def fingerprint(self, path: str) -> str:
+        """
+        Content hash of path without loading it, only re-hashed when its mtime/size change
+        """
+        path = os.path.abspath(path)
+        stat_key = self._stat_key(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.value is not None and entry.stat_key == stat_key:
+                return entry.content_hash
+            cached = self._fingerprints.get(path)
+            if cached is not None and cached[0] == stat_key:
+                return cached[1]
+        content_hash = self.file_hash(path)
+        with self._lock:
+            self._fingerprints[path] = (stat_key, content_hash)
+        return content_hash
+
+    def invalidate(self, path: str = None):
+        """
+        Drop one dataset (or all datasets) so the next get() reloads it
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._fingerprints.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+                self._fingerprints.pop(os.path.abspath(path), None)
+
+    def stats(self, path: str = None) -> dict:
+        """
+        Hit/miss/load-time statistics, for one path or for every loaded dataset
+        """
+        with self._lock:
+            items = list(self._entries.items())
+        result = {}
+        for entry_path, entry in items:
+            lookups = entry.hits + entry.misses
+            result[entry_path] = {
+                'hits': entry.hits,
+                'misses': entry.misses,
+                'reloads': entry.reloads,
+                'hit_ratio': entry.hits / lookups if lookups else 0.0,
+                'last_load_seconds': round(entry.last_load_seconds, 6),
+                'total_load_seconds': round(entry.total_load_seconds, 6),
+                'version': entry.content_hash,
+                'loaded_at': entry.loaded_at,
+            }
+        if path is not None:
+            return result.get(os.path.abspath(path), {})
+        return result
+
+
+# Shared by every RedditSentimentData instance in this process
+registry = DatasetRegistry()
@@ -0,0 +1,130 @@
+"""
+Coarser resolutions and point budgets for the chart series of the API.
+
+resolution aggregates daily data to weekly (ISO weeks) or monthly buckets. A bucket is
+labelled with its last trading day, so every returned date exists in the daily data:
+OHLCV bars take the first open, the max high, the min low, the last close and the
+summed volume; cumulative return series take the last row.
+
+max_points thins a series with Largest-Triangle-Three-Buckets (LTTB): the first and last
+points are kept and each bucket in between keeps the point spanning the largest triangle
+with its neighbours, so peaks, troughs and the overall shape survive. Series sharing one
+date axis split the budget and keep the union of their points.
+"""
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = ('daily', 'weekly', 'monthly')
+PERIODS = {'weekly': 'W', 'monthly': 'M'}
+MIN_POINTS = 3
+
+
+def parse_params(query_params) -> tuple:
+    """
+    (resolution, max_points) of a request; raises ValueError with a message for the client
+    """
+    resolution = query_params.get('resolution', 'daily')
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}.")
+    max_points = query_params.get('max_points')
+    if max_points in (None, ''):
+        return resolution, None
+    try:
+        max_points = int(max_points)
+    except (TypeError, ValueError):
+        max_points = 0
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be an integer of at least {MIN_POINTS}.")
+    return resolution, max_points
+
+
+def _bucket(day, resolution: str):
+    if resolution == 'weekly':
+        return day.isocalendar()[:2]
+    return day.year, day.month
+
+
+def resample_bars(rows: list, resolution: str) -> list:
+    """
+    (date, open, close, high, low, volume) rows sorted by date, aggregated to the resolution
+    """
+    if resolution == 'daily' or not rows:
+        return rows
+    bars = []
+    current = None
+    for day, open_price, close_price, high_price, low_price, volume in rows:
+        key = _bucket(day, resolution)
+        if current is not None and key == current[0]:
+            _, _, bar_open, _, bar_high, bar_low, bar_volume = current
+            current = (key, day, bar_open, close_price, max(bar_high, high_price), min(bar_low, low_price),
+                       bar_volume + volume)
+        else:
+            if current is not None:
+                bars.append(current[1:])
+            current = (key, day, open_price, close_price, high_price, low_price, volume)
+    bars.append(current[1:])
+    return bars
+
+
+def resample_frame(df: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """
+    Last row of each bucket of a frame of cumulative series indexed by date
+    """
+    if resolution == 'daily' or df.empty:
+        return df
+    return df.groupby(df.index.to_period(PERIODS[resolution])).nth(-1)
+
+
+def lttb(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Positions of the points LTTB keeps of y over evenly spaced x; NaNs count as 0 for the choice
+    """
+    n = len(y)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+    x = np.arange(n, dtype='float64')
+    # Bucket edges of the n - 2 inner points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample_positions(series: list, max_points: int) -> np.ndarray:
+    """
+    Sorted positions to keep of series sharing one axis, about max_points in total
+    """
+    n = len(series[0]) if series else 0
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    budget = max(MIN_POINTS, max_points // len(series))
+    return np.unique(np.concatenate([lttb(values, budget) for values in series]))
+
+
+def downsample_bars(rows: list, max_points: int) -> list:
+    """
+    Bars kept by LTTB on their closes
+    """
+    if max_points is None or len(rows) <= max_points:
+        return rows
+    return [rows[position] for position in lttb(np.array([row[2] for row in rows], dtype='float64'), max_points)]
+
+
+def downsample_frame(df: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """
+    Rows of a frame kept by LTTB over all its columns
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+    return df.iloc[downsample_positions([df[column].to_numpy(dtype='float64') for column in df.columns], max_points)]
@@ -0,0 +1,255 @@
+"""
+Per-stage request timing and Prometheus-style metrics.
+
+    with instrumentation.span('cache_lookup'):
+        ...
+
+times a stage of the current request and counts the database queries it runs (every
+connection gets an execute wrapper, so async ORM queries made on Django's sync thread
+count too). ServerTimingMiddleware sends the request's spans in the Server-Timing
+header, e.g.
+
+    Server-Timing: cache_lookup;dur=3.2;desc="2 queries", render;dur=1.1, total;dur=48.0
+
+and adds them to the registry behind /metrics: request and stage latency histograms per
+endpoint, stage query counters and cache hit/miss counters with their hit ratio.
+
+Metrics live in the memory of each worker process; with several workers, every scrape
+reaches one of them. Spans outside a request (management commands) are not recorded.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# name: (type, help) of the metrics the server reports
+METRICS = {
+    'stock_server_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'stock_server_stage_duration_seconds': ('histogram', 'Latency of request stages by endpoint'),
+    'stock_server_stage_db_queries_total': ('counter', 'Database queries run by request stages'),
+    'stock_server_cache_lookups_total': ('counter', 'Cache lookups by cache and result (hit, stale, miss)'),
+    'stock_server_cache_hit_ratio': ('gauge', 'Share of cache lookups served from the cache'),
+    'stock_server_single_flight_total': ('counter', 'Coalesced requests by role: leader computed, shared waited for a leader'),
+}
+
+# [name, seconds, queries] lists of the current request, and the spans open in this context
+_timings = contextvars.ContextVar('request_timings', default=None)
+_open_spans = contextvars.ContextVar('open_spans', default=())
+
+
+class MetricsRegistry:
+    def __init__(self, metrics: dict = METRICS):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        for name, (kind, help_text) in metrics.items():
+            self.describe(name, kind, help_text)
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._types[name] = kind
+        self._help[name] = help_text
+
+    def inc(self, name: str, labels: dict, amount: float = 1):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def observe(self, name: str, labels: dict, seconds: float):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def cache_hit_ratios(self) -> dict:
+        """
+        {cache: hits / lookups}; entries served stale count as hits
+        """
+        lookups = defaultdict(lambda: [0.0, 0.0])
+        with self._lock:
+            counters = list(self._counters.items())
+        for (name, labels), value in counters:
+            if name == 'stock_server_cache_lookups_total':
+                labels = dict(labels)
+                lookups[labels['cache']][0 if labels['result'] != 'miss' else 1] += value
+        return {cache: hits / (hits + misses) for cache, (hits, misses) in lookups.items() if hits + misses}
+
+    def render(self) -> str:
+        """
+        The metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            series = defaultdict(list)
+            for (name, labels), value in sorted(self._counters.items()):
+                series[name].append(f'{name}{_labels(labels)} {_number(value)}')
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                for bound, count in zip(BUCKETS, histogram['buckets']):
+                    series[name].append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {count}')
+                series[name].append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+                series[name].append(f'{name}_sum{_labels(labels)} {_number(histogram["sum"])}')
+                series[name].append(f'{name}_count{_labels(labels)} {histogram["count"]}')
+        for cache, ratio in sorted(self.cache_hit_ratios().items()):
+            series['stock_server_cache_hit_ratio'].append(
+                f'stock_server_cache_hit_ratio{_labels((("cache", cache),))} {_number(ratio)}'
+            )
+        for name in sorted(series):
+            lines.append(f'# HELP {name} {self._help.get(name, name)}')
+            lines.append(f'# TYPE {name} {self._types.get(name, "untyped")}')
+            lines.extend(series[name])
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+registry = MetricsRegistry()
+
+
+class _Span:
+    __slots__ = ('queries',)
+
+    def __init__(self):
+        self.queries = 0
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time a stage of the current request with its database query count
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    current = _Span()
+    token = _open_spans.set(_open_spans.get() + (current,))
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append([name, time.perf_counter() - started, current.queries])
+        _open_spans.reset(token)
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0, stale: int = 0):
+    for result, count in (('hit', hits), ('miss', misses), ('stale', stale)):
+        if count:
+            registry.inc('stock_server_cache_lookups_total', {'cache': cache, 'result': result}, count)
+
+
+def count_query(execute, sql, params, many, context):
+    for open_span in _open_spans.get():
+        open_span.queries += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender=None, connection=None, **kwargs):
+    # connection_created receiver; a reconnect keeps the wrapper list. Innermost, so the
+    # temporary wrappers of connection.execute_wrapper() blocks still pop their own
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+def server_timing(timings: list, total: float) -> str:
+    """
+    Server-Timing header value of the spans, same-named spans summed, in first-seen order
+    """
+    stages = {}
+    for name, seconds, queries in timings:
+        stage = stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += queries
+    parts = [f'{name};dur={seconds * 1000:.1f}' + (f';desc="{queries} queries"' if queries else '')
+             for name, (seconds, queries) in stages.items()]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    Collects the spans of each request into the Server-Timing header and the metrics registry
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = []
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        timings = []
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - started)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time the encoding as its own stage
+        timings = _timings.get()
+        if timings is not None and not response.is_rendered:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: timings.append(['render', time.perf_counter() - started, 0])
+            )
+        return response
+
+    def finish(self, request, response, timings, total):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.url_name or match.view_name) if match else 'unmatched'
+        response['Server-Timing'] = server_timing(timings, total)
+        registry.observe('stock_server_request_duration_seconds',
+                         {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)}, total)
+        for name, seconds, queries in timings:
+            registry.observe('stock_server_stage_duration_seconds', {'endpoint': endpoint, 'stage': name}, seconds)
+            if queries:
+                registry.inc('stock_server_stage_db_queries_total', {'endpoint': endpoint, 'stage': name}, queries)
+        return response
+
+
+def metrics(request):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
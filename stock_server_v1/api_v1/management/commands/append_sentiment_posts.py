@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api_v1.RedditSentimentData import RedditSentimentData
+from api_v1 import cache_backends, monthly_aggregates
+from api_v1.data_registry import DatasetRegistry
+from api_v1.ranking_index import dataset_version
+import os
+import pandas as pd
+import shutil
+import time
+
+
+class Command(BaseCommand):
+    help = ('Append newly scored posts to the sentiment dataset, add them to the running monthly aggregates '
+            'and re-rank only the months they fall in')
+
+    def add_arguments(self, parser):
+        parser.add_argument('posts', nargs='?', type=str, help='Scored posts csv (date, stock, score, comms_num, sentiment columns)')
+        parser.add_argument(
+            '--dataset',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'data', 'reddit_sentiment_data.csv'),
+            help='Sentiment csv the posts are appended to (default: data/reddit_sentiment_data.csv)',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help=('Rebuild the aggregates from the whole dataset first (done automatically when they were '
+                  'not built from the current dataset)'),
+        )
+
+    def handle(self, *args, **options):
+        dataset = options['dataset']
+        if not os.path.exists(dataset):
+            raise CommandError(f'Sentiment csv not found: {dataset}')
+
+        started = time.perf_counter()
+        old_version = RedditSentimentData.dataset_version(dataset)
+        # Aggregates of another version (the csv was regenerated or edited, or an earlier run died
+        # before replacing it) would re-rank the new posts' months from the wrong data
+        if options['rebuild'] or monthly_aggregates.source_version() != old_version:
+            rows = monthly_aggregates.rebuild(RedditSentimentData.read_sentiment_csv(dataset), old_version)
+            self.stdout.write(f'Built monthly aggregates from {dataset}: {rows} rows')
+
+        if not options['posts']:
+            return
+        if not os.path.exists(options['posts']):
+            raise CommandError(f'Posts csv not found: {options["posts"]}')
+
+        posts = pd.read_csv(options['posts'])
+        header = pd.read_csv(dataset, nrows=0).columns
+        posts = self.align_columns(posts, header)
+        df_posts = RedditSentimentData.prepare_sentiment_frame(posts.copy())
+
+        # The appended dataset is staged next to the csv and replaces it once the aggregates are
+        # updated; a run that fails before then leaves the csv as it was, and the next run rebuilds
+        # the aggregates that already moved to the staged version
+        staged = f'{dataset}.tmp-{os.getpid()}'
+        try:
+            shutil.copyfile(dataset, staged)
+            posts.to_csv(staged, mode='a', header=False, index=False)
+            new_version = dataset_version(DatasetRegistry.file_hash(staged))
+            months = monthly_aggregates.add_posts(df_posts, new_version)
+            os.replace(staged, dataset)
+        finally:
+            if os.path.exists(staged):
+                os.remove(staged)
+
+        # Rankings are only written under the new version once it is the csv's, so cleanup_news_cache
+        # never sees them as superseded; any that are missing are computed on the next request
+        store = cache_backends.indicator_store()
+        # Rankings of untouched months are still right for the new version
+        carried = store.carry_forward(old_version, new_version, months)
+
+        depth = settings.MONTHLY_INDICATOR_MAX_TOP_N
+        rankings = monthly_aggregates.month_rankings(months, depth)
+        for (indicator, month), stocks_data in rankings.items():
+            store.set_ranking(indicator, month, stocks_data, depth, new_version)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Appended {len(posts)} posts; re-ranked {', '.join(month.strftime('%Y-%m') for month in months) or 'no months'}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {len(rankings)} monthly rankings and carried {carried} cached rankings '
+            f'to dataset version {new_version} in {elapsed:.2f}s'
+        ))
+
+    @staticmethod
+    def align_columns(posts: pd.DataFrame, header: pd.Index) -> pd.DataFrame:
+        """
+        Reorder posts to the dataset's columns, mapping the scorer's title/body sentiment columns
+        (e.g. title_stanza_sentiment) onto the dataset's
+        """
+        renames = {}
+        for part in ('title', 'body'):
+            target = [col for col in header if part in col.lower() and 'sentiment' in col.lower()]
+            source = [col for col in posts.columns if part in col.lower() and 'sentiment' in col.lower()]
+            if target and source and target[0] not in posts.columns:
+                renames[source[0]] = target[0]
+        posts = posts.rename(columns=renames)
+        missing = [col for col in ('date', 'stock', 'score', 'comms_num') if col not in posts.columns]
+        if missing:
+            raise CommandError(f'Posts csv is missing columns: {missing}')
+        return posts.reindex(columns=header)
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api_v1 import price_panel
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compile per-ticker price csvs into one memory-mapped dates x tickers close/log-return panel'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'data', 'stock_historical_prices_2019-2024'),
+            help='Directory of <ticker>.csv price files (default: data/stock_historical_prices_2019-2024)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Panel directory (default: next to the source directory with a .panel suffix)',
+        )
+
+    def handle(self, *args, **options):
+        source = options['source']
+        output = options['output'] or price_panel.panel_path_for(source)
+
+        if not os.path.isdir(source):
+            raise CommandError(f'Price directory not found: {source}')
+
+        started = time.perf_counter()
+        index = price_panel.build_panel(source, output)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Built price panel with {len(index["tickers"])} tickers x {len(index["dates"])} dates '
+                f'at {output} in {elapsed:.2f}s'
+            )
+        )
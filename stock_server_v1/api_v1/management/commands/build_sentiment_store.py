@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api_v1.RedditSentimentData import RedditSentimentData
+from api_v1 import sentiment_store
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compile the Reddit sentiment csv into a memory-mappable columnar store used at runtime'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'data', 'reddit_sentiment_data.csv'),
+            help='Sentiment csv to compile (default: data/reddit_sentiment_data.csv)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Store directory (default: next to the csv with a .store suffix)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild even if the store is already current',
+        )
+
+    def handle(self, *args, **options):
+        source = options['source']
+        output = options['output'] or sentiment_store.store_path_for(source)
+
+        if not os.path.exists(source):
+            raise CommandError(f'Sentiment csv not found: {source}')
+
+        if not options['force'] and sentiment_store.is_store_current(source, output):
+            self.stdout.write(self.style.SUCCESS(f'Store is already current: {output}'))
+            return
+
+        started = time.perf_counter()
+        df = RedditSentimentData.read_sentiment_csv(source)
+        parsed = time.perf_counter()
+        manifest = sentiment_store.build_store(df, source, output)
+        written = time.perf_counter()
+
+        started_load = time.perf_counter()
+        sentiment_store.load_store(output)
+        loaded = time.perf_counter()
+
+        self.stdout.write(
+            f'Parsed csv in {parsed - started:.3f}s, wrote store in {written - parsed:.3f}s, '
+            f'store loads in {loaded - started_load:.3f}s'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Built sentiment store with {manifest["rows"]} rows at {output}')
+        )
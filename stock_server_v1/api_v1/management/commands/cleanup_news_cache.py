@@ -1,11 +1,23 @@
 from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Q
 from django.utils import timezone
+from api_v1 import cache_backends, cache_maintenance
 from api_v1.models import NewsCache, MonthlyIndicatorCache
+from api_v1.RedditSentimentData import RedditSentimentData
 from datetime import timedelta
+import os
+import time
+
+# Entries listed by a dry run; the totals always cover every entry
+DRY_RUN_LISTED = 20
 
 
 class Command(BaseCommand):
-    help = 'Clean up expired cache entries (news and monthly indicators) from the database'
+    help = ('Clean up expired news cache entries and monthly indicator cache entries of superseded '
+            'dataset versions from the database, optionally evicting least recently used entries '
+            'down to a size budget')
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -26,64 +38,173 @@ class Command(BaseCommand):
             default='all',
             help='Type of cache to clean up (default: all)',
         )
+        parser.add_argument(
+            '--dataset',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'data', 'reddit_sentiment_data.csv'),
+            help='Sentiment csv whose current version is kept (default: data/reddit_sentiment_data.csv)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=cache_maintenance.CHUNK_SIZE,
+            help=f'Entries deleted per transaction (default: {cache_maintenance.CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--max-entries',
+            type=int,
+            help='Evict least recently used entries until at most this many remain per cache type',
+        )
+        parser.add_argument(
+            '--max-bytes',
+            type=int,
+            help='Evict least recently used entries until the estimated size per cache type is under this',
+        )
+        parser.add_argument(
+            '--loop',
+            type=int,
+            metavar='SECONDS',
+            help='Keep running, cleaning up every SECONDS seconds until interrupted',
+        )
 
     def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            options['chunk_size'] = cache_maintenance.CHUNK_SIZE
+        if not options['loop']:
+            self.cleanup(options)
+            return
+        self.stdout.write(f"Cleaning up every {options['loop']}s, Ctrl-C to stop")
+        try:
+            while True:
+                started = time.perf_counter()
+                self.stdout.write(f'--- {timezone.now():%Y-%m-%d %H:%M:%S}')
+                try:
+                    self.cleanup(options)
+                except Exception as e:
+                    # e.g. the database is locked by a long write; the next iteration retries
+                    self.stderr.write(self.style.ERROR(f'Cleanup failed, retrying in {options["loop"]}s: {e}'))
+                finally:
+                    # A broken connection is not reused by the next iteration
+                    close_old_connections()
+                time.sleep(max(0.0, options['loop'] - (time.perf_counter() - started)))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Stopped'))
+
+    def cleanup(self, options):
         days = options['days']
         dry_run = options['dry_run']
         cache_type = options['cache_type']
-        
+
         # Find expired cache entries
         cutoff_date = timezone.now() - timedelta(days=days)
-        
+
         if cache_type in ['news', 'all']:
-            self._handle_news_cache(cutoff_date, dry_run)
-        
+            self._handle_news_cache(cutoff_date, dry_run, options['chunk_size'])
+            self._handle_lru(NewsCache, 'news', options)
+
         if cache_type in ['indicators', 'all']:
-            self._handle_monthly_indicator_cache(cutoff_date, dry_run)
-    
-    def _handle_news_cache(self, cutoff_date, dry_run):
+            current_version = self._current_version(options['dataset'])
+            self._handle_monthly_indicator_cache(cutoff_date, dry_run, current_version, options['chunk_size'])
+            self._handle_lru(MonthlyIndicatorCache, 'monthly indicator', options)
+            self._handle_key_value_indicators(current_version, dry_run)
+
+    def _handle_news_cache(self, cutoff_date, dry_run, chunk_size):
         expired_news_caches = NewsCache.objects.filter(expires_at__lt=cutoff_date)
-        count = expired_news_caches.count()
-        
+
+        if dry_run:
+            totals = cache_maintenance.summarize(expired_news_caches)
+            if totals['entries'] == 0:
+                self.stdout.write(self.style.SUCCESS('No expired news cache entries found'))
+                return
+            self.stdout.write(f"Would delete {totals['entries']} expired news cache entries "
+                              f"({totals['rows']} articles, ~{totals['bytes']} bytes):")
+            listed = (expired_news_caches.annotate(article_count=Count('articles'))
+                      .order_by('expires_at').values_list('tickers', 'expires_at', 'article_count'))
+            for tickers, expires_at, article_count in listed[:DRY_RUN_LISTED]:
+                self.stdout.write(f'  - {tickers} (expired: {expires_at}, {article_count} articles)')
+            if totals['entries'] > DRY_RUN_LISTED:
+                self.stdout.write(f"  ... and {totals['entries'] - DRY_RUN_LISTED} more")
+            return
+
+        count = cache_maintenance.delete_in_chunks(expired_news_caches, chunk_size)
         if count == 0:
             self.stdout.write(
                 self.style.SUCCESS('No expired news cache entries found')
             )
         else:
-            if dry_run:
-                self.stdout.write(f'Would delete {count} expired news cache entries:')
-                for cache in expired_news_caches:
-                    article_count = cache.articles.count()
-                    self.stdout.write(
-                        f'  - {cache.tickers} (expired: {cache.expires_at}, {article_count} articles)'
-                    )
-            else:
-                expired_news_caches.delete()
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully deleted {count} expired news cache entries')
+            )
+
+    def _current_version(self, dataset):
+        if os.path.exists(dataset) or os.path.exists(os.path.splitext(dataset)[0] + '.store'):
+            current_version = RedditSentimentData.dataset_version(dataset)
+            self.stdout.write(f'Current dataset version: {current_version}')
+            return current_version
+        self.stdout.write(
+            self.style.WARNING(f'Sentiment data not found at {dataset}, only removing expired legacy entries')
+        )
+        return None
+
+    def _handle_monthly_indicator_cache(self, cutoff_date, dry_run, current_version, chunk_size):
+        # Entries of any other dataset version can never be hit again; legacy TTL entries go once expired
+        if current_version is not None:
+            stale = ~Q(dataset_version=current_version)
+        else:
+            stale = Q(dataset_version='', expires_at__lt=cutoff_date)
+        expired_indicator_caches = MonthlyIndicatorCache.objects.filter(stale)
+
+        if dry_run:
+            totals = cache_maintenance.summarize(expired_indicator_caches)
+            if totals['entries'] == 0:
+                self.stdout.write(self.style.SUCCESS('No superseded monthly indicator cache entries found'))
+                return
+            self.stdout.write(f"Would delete {totals['entries']} superseded monthly indicator cache entries "
+                              f"({totals['rows']} score entries, ~{totals['bytes']} bytes):")
+            listed = (expired_indicator_caches.annotate(scores_count=Count('scores'))
+                      .order_by('month_year', 'indicator')
+                      .values_list('month_year', 'indicator', 'dataset_version', 'scores_count'))
+            for month_year, indicator, dataset_version, scores_count in listed[:DRY_RUN_LISTED]:
                 self.stdout.write(
-                    self.style.SUCCESS(f'Successfully deleted {count} expired news cache entries')
+                    f'  - {month_year.strftime("%Y-%m")}, {indicator} '
+                    f'(version: {dataset_version or "legacy"}, {scores_count} score entries)'
                 )
-    
-    def _handle_monthly_indicator_cache(self, cutoff_date, dry_run):
-        expired_indicator_caches = MonthlyIndicatorCache.objects.filter(expires_at__lt=cutoff_date)
-        count = expired_indicator_caches.count()
-        
+            if totals['entries'] > DRY_RUN_LISTED:
+                self.stdout.write(f"  ... and {totals['entries'] - DRY_RUN_LISTED} more")
+            return
+
+        count = cache_maintenance.delete_in_chunks(expired_indicator_caches, chunk_size)
         if count == 0:
             self.stdout.write(
-                self.style.SUCCESS('No expired monthly indicator cache entries found')
+                self.style.SUCCESS('No superseded monthly indicator cache entries found')
             )
         else:
-            if dry_run:
-                self.stdout.write(f'Would delete {count} expired monthly indicator cache entries:')
-                for cache in expired_indicator_caches:
-                    scores_count = cache.scores.count()
-                    self.stdout.write(
-                        f'  - {cache.year}-{cache.month:02d}, {cache.market_index}'
-                    )
-                    self.stdout.write(
-                        f'    (expired: {cache.expires_at}, {scores_count} score entries)'
-                    )
-            else:
-                expired_indicator_caches.delete()
-                self.stdout.write(
-                    self.style.SUCCESS(f'Successfully deleted {count} expired monthly indicator cache entries')
-                )
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully deleted {count} superseded monthly indicator cache entries')
+            )
+
+    def _handle_key_value_indicators(self, current_version, dry_run):
+        # Rankings kept in a file or redis backend are keyed by dataset version and never expire
+        store = cache_backends.indicator_store()
+        if current_version is None or not isinstance(store, cache_backends.KeyValueIndicatorStore):
+            return
+        count = store.purge_superseded(current_version, dry_run)
+        backend = type(store.backend).__name__
+        if count == 0:
+            self.stdout.write(self.style.SUCCESS(f'No superseded monthly indicator rankings found in {backend}'))
+        else:
+            verb = 'Would delete' if dry_run else 'Successfully deleted'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {count} superseded monthly indicator rankings from {backend}'))
+
+    def _handle_lru(self, model, name, options):
+        if options['max_entries'] is None and options['max_bytes'] is None:
+            return
+        evicted = cache_maintenance.evict_lru(model, options['max_entries'], options['max_bytes'],
+                                              options['chunk_size'], options['dry_run'])
+        verb = 'Would evict' if options['dry_run'] else 'Evicted'
+        if evicted['entries'] == 0:
+            self.stdout.write(self.style.SUCCESS(f'The {name} cache is within its size budget'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {evicted['entries']} least recently used {name} cache entries (~{evicted['bytes']} bytes)"
+            ))
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api_v1 import reddit_ingest
+import json
+import os
+import praw
+import time
+
+
+class Command(BaseCommand):
+    help = 'Fetch new subreddit submissions since the last checkpoint and append them to the monthly csv files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subreddit',
+            type=str,
+            default='wallstreetbets',
+            help='Subreddit to ingest (default: wallstreetbets)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'data', 'reddit_raw_data'),
+            help='Directory of the monthly csv files (default: data/reddit_raw_data)',
+        )
+        parser.add_argument(
+            '--credentials',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'data', 'reddit_raw_data', '.reddit_credentials.json'),
+            help='Reddit API credentials json (client_id, client_secret, user_agent, username, password)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Maximum number of submissions to request (default: as many as the listing returns)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Posts buffered before they are appended to disk (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['credentials'], 'r') as f:
+                credentials = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            raise CommandError(f'Cannot read Reddit credentials from {options["credentials"]}: {e}')
+
+        client = praw.Reddit(
+            client_id=credentials['client_id'],
+            client_secret=credentials['client_secret'],
+            user_agent=credentials['user_agent'],
+            username=credentials['username'],
+            password=credentials['password'],
+        )
+
+        started = time.perf_counter()
+        summary = reddit_ingest.ingest(
+            client, options['subreddit'], options['output'],
+            limit=options['limit'], batch_size=options['batch_size'],
+        )
+        elapsed = time.perf_counter() - started
+
+        for month, count in sorted(summary['months'].items()):
+            self.stdout.write(f'{month}: +{count} posts')
+        if not summary['complete']:
+            self.stdout.write(self.style.WARNING(
+                'The listing ended before the last checkpoint; posts older than the ones fetched may be missing, '
+                'the checkpoint was kept'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"r/{options['subreddit']}: fetched {summary['fetched']}, wrote {summary['written']} new, "
+            f"skipped {summary['duplicates']} already seen in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api_v1 import price_history_loader
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Bulk load (upsert) every price csv of the stock and market index directories into StockPriceHistory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            type=str,
+            action='append',
+            default=None,
+            help='Directory of <ticker>.csv files, can be repeated '
+                 '(default: data/stock_historical_prices_2019-2024 and data/market_indexes_2019-2024)',
+        )
+        parser.add_argument(
+            '--tickers',
+            type=str,
+            default=None,
+            help='Comma-separated tickers to load (default: all files)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Parser processes (default: number of CPUs)',
+        )
+        parser.add_argument(
+            '--batch-rows',
+            type=int,
+            default=50_000,
+            help='Rows inserted per transaction (default: 50000)',
+        )
+
+    def handle(self, *args, **options):
+        sources = options['source'] or [
+            os.path.join(settings.BASE_DIR, 'data', 'stock_historical_prices_2019-2024'),
+            os.path.join(settings.BASE_DIR, 'data', 'market_indexes_2019-2024'),
+        ]
+        missing = [source for source in sources if not os.path.isdir(source)]
+        if missing:
+            self.stdout.write(self.style.WARNING(f'Skipping missing directories: {missing}'))
+
+        files = price_history_loader.discover_files([source for source in sources if os.path.isdir(source)])
+        if options['tickers']:
+            wanted = {ticker.strip().upper() for ticker in options['tickers'].split(',') if ticker.strip()}
+            files = [(ticker, path) for ticker, path in files if ticker.upper() in wanted]
+        if not files:
+            raise CommandError('No price csv files found')
+
+        self.stdout.write(f'Loading {len(files)} files with {options["workers"]} workers...')
+        started = time.perf_counter()
+        stats = price_history_loader.load_price_history(files, options['workers'], options['batch_rows'])
+        elapsed = time.perf_counter() - started
+
+        for ticker, error in stats['failed'].items():
+            self.stdout.write(self.style.WARNING(f'  {ticker}: {error}'))
+        self.stdout.write(
+            f"Parsed in {stats['parse_seconds']:.2f}s, inserted in {stats['insert_seconds']:.2f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Upserted {stats['rows']} rows from {stats['files']} files in {elapsed:.2f}s "
+            f"({stats['rows'] / elapsed if elapsed else 0:,.0f} rows/s)"
+        ))
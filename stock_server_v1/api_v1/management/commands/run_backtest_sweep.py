@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api_v1 import backtest
+from api_v1.ranking_index import AGG_MAP
+import json
+import time
+
+
+class Command(BaseCommand):
+    help = 'Run a grid of portfolio backtests (indicator x market index x window x top_n) in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--indicators',
+            type=str,
+            default=','.join(AGG_MAP),
+            help='Comma-separated indicators (default: all)',
+        )
+        parser.add_argument(
+            '--market-indexes',
+            type=str,
+            default='QQQ',
+            help='Comma-separated market indexes (default: QQQ)',
+        )
+        parser.add_argument(
+            '--windows',
+            type=str,
+            default=f'{backtest.MAX_START_DATE}:{backtest.MAX_END_DATE}',
+            help='Comma-separated start:end date windows (default: the full data range)',
+        )
+        parser.add_argument(
+            '--top-n',
+            type=str,
+            default=str(settings.MONTHLY_INDICATOR_DEFAULT_TOP_N),
+            help='Comma-separated portfolio sizes (default: 5)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.BACKTEST_SWEEP_MAX_WORKERS,
+            help='Worker processes (default: BACKTEST_SWEEP_MAX_WORKERS)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Write the results as json to this file instead of printing a table',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            grid = {
+                'indicators': [i.strip() for i in options['indicators'].split(',') if i.strip()],
+                'market_indexes': [m.strip() for m in options['market_indexes'].split(',') if m.strip()],
+                'windows': [
+                    dict(zip(('start_date', 'end_date'), window.strip().split(':')))
+                    for window in options['windows'].split(',') if window.strip()
+                ],
+                'top_ns': [int(n) for n in options['top_n'].split(',') if n.strip()],
+            }
+        except ValueError as e:
+            raise CommandError(f'Invalid sweep grid: {e}')
+
+        unknown = [indicator for indicator in grid['indicators'] if indicator not in AGG_MAP]
+        if unknown:
+            raise CommandError(f'Unknown indicators: {unknown}. Available: {list(AGG_MAP)}')
+        if any(len(window) != 2 for window in grid['windows']):
+            raise CommandError('Windows must be given as start:end')
+
+        tasks = backtest.expand_grid(grid, backtest.data_paths(settings.BASE_DIR))
+        started = time.perf_counter()
+        results = backtest.run_sweep(tasks, options['workers'])
+        elapsed = time.perf_counter() - started
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        else:
+            for result in results:
+                label = (f"{result['indicator']:<17} {result['market_index']:<5} "
+                         f"{result['start_date']}..{result['end_date']} top {result['top_n']:<3}")
+                if 'error' in result:
+                    self.stdout.write(f'{label} error: {result["error"]}')
+                    continue
+                portfolio = result['portfolio']
+                self.stdout.write(
+                    f"{label} return {portfolio['total_return']:+.2%} "
+                    f"excess {result.get('excess_return', float('nan')):+.2%} "
+                    f"max drawdown {portfolio['max_drawdown']:.2%}"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Ran {len(results)} backtests with {options["workers"]} workers in {elapsed:.2f}s')
+        )
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api_v1 import sentiment_scoring
+import json
+import os
+import pandas as pd
+import time
+
+
+class Command(BaseCommand):
+    help = 'Score title and body sentiment of a posts csv in batches, reusing cached scores of texts seen before'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', type=str, help='Posts csv with title and body columns')
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Scored csv to write (default: overwrite the source)',
+        )
+        parser.add_argument(
+            '--scorer',
+            type=str,
+            default='stanza',
+            choices=list(sentiment_scoring.SCORERS),
+            help='Sentiment scorer (default: stanza)',
+        )
+        parser.add_argument(
+            '--scorer-options',
+            type=str,
+            default='{}',
+            help='Scorer keyword arguments as json, e.g. \'{"model": "cardiffnlp/twitter-roberta-base-sentiment"}\'',
+        )
+        parser.add_argument(
+            '--cache',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'data', 'sentiment_score_cache.sqlite3'),
+            help='Persistent score cache (default: data/sentiment_score_cache.sqlite3), "" to disable',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=64,
+            help='Texts per model call (default: 64)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Scoring processes, each loads its own model (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['source']):
+            raise CommandError(f'Posts csv not found: {options["source"]}')
+        try:
+            scorer_options = json.loads(options['scorer_options'])
+        except json.JSONDecodeError as e:
+            raise CommandError(f'Invalid --scorer-options: {e}')
+
+        df = pd.read_csv(options['source'])
+        started = time.perf_counter()
+        pipeline = sentiment_scoring.ScoringPipeline(
+            options['scorer'], scorer_options, cache_path=options['cache'] or None,
+            batch_size=options['batch_size'], workers=options['workers'],
+        )
+        df = pipeline.score_frame(df)
+        elapsed = time.perf_counter() - started
+
+        output = options['output'] or options['source']
+        df.to_csv(output, index=False)
+        stats = pipeline.stats
+        self.stdout.write(
+            f"{stats['texts']} texts, {stats['unique']} unique, {stats['cached']} from cache, "
+            f"{stats['scored']} scored in {elapsed:.2f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(df)} scored rows to {output}'))
@@ -0,0 +1,142 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api_v1 import backtest, cache_backends, news_cache
+from api_v1.ranking_index import AGG_MAP
+from api_v1.RedditSentimentData import RedditSentimentData
+from datetime import timedelta
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = ('Warm the shared caches after a deploy or data refresh: monthly indicator rankings of every month '
+            'and the news of every ticker the default portfolio-returns windows hold')
+
+    # Builds the NewsAPI client when news has to be fetched; tests swap in a local stub
+    news_client_factory = staticmethod(news_cache.newsapi_client)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--indicators',
+            type=str,
+            default=','.join(AGG_MAP),
+            help='Comma-separated indicators (default: all)',
+        )
+        parser.add_argument(
+            '--windows',
+            type=str,
+            # The endpoint's default window and the dashboard's initial date range
+            default=f'{backtest.MAX_START_DATE}:{backtest.MAX_END_DATE},2021-03-01:2021-08-31',
+            help='Comma-separated start:end portfolio windows whose tickers\' news is fetched '
+                 '(default: the endpoint and dashboard defaults)',
+        )
+        parser.add_argument(
+            '--top-n',
+            type=str,
+            default=str(settings.MONTHLY_INDICATOR_DEFAULT_TOP_N),
+            help='Comma-separated portfolio sizes (default: 5)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.NEWS_FETCH_WORKERS,
+            help='NewsAPI calls run this many at a time (default: NEWS_FETCH_WORKERS)',
+        )
+        parser.add_argument(
+            '--skip-news',
+            action='store_true',
+            help='Do not prefetch news',
+        )
+
+    def handle(self, *args, **options):
+        indicators = [i.strip() for i in options['indicators'].split(',') if i.strip()]
+        unknown = [indicator for indicator in indicators if indicator not in AGG_MAP]
+        if unknown:
+            raise CommandError(f'Unknown indicators: {unknown}. Available: {list(AGG_MAP)}')
+        try:
+            windows = [tuple(window.strip().split(':')) for window in options['windows'].split(',') if window.strip()]
+            top_ns = [int(n) for n in options['top_n'].split(',') if n.strip()]
+        except ValueError as e:
+            raise CommandError(f'Invalid --top-n: {e}')
+        if any(len(window) != 2 for window in windows):
+            raise CommandError('Windows must be given as start:end')
+        workers = max(1, options['workers'])
+
+        # Portfolio returns themselves are not cached across requests, only the rankings and news they read
+        report = []
+        started = time.perf_counter()
+        report.append(('monthly indicators', *self.warm_indicators(indicators)))
+
+        tickers = self.held_tickers(indicators, windows, top_ns)
+        if options['skip_news']:
+            report.append(('news tickers', len(tickers), 0, 0.0))
+        else:
+            report.append(('news tickers', *self.warm_news(sorted(tickers), workers)))
+
+        self.stdout.write(f'\n{"stage":<20} {"items":>7} {"warmed":>7} {"seconds":>9}')
+        for stage, items, warmed, seconds in report:
+            self.stdout.write(f'{stage:<20} {items:>7} {warmed:>7} {seconds:>9.2f}')
+        self.stdout.write(self.style.SUCCESS(f'Caches warmed in {time.perf_counter() - started:.1f}s'))
+
+    def warm_indicators(self, indicators):
+        """
+        Cache the full-depth ranking of every month not yet cached for the current dataset version
+        """
+        started = time.perf_counter()
+        sentiment_data_path = os.path.join(settings.BASE_DIR, 'data', 'reddit_sentiment_data.csv')
+        dataset_version = RedditSentimentData.dataset_version(sentiment_data_path)
+        ranking = RedditSentimentData(sentiment_data_path).ranking_index()
+        depth = settings.MONTHLY_INDICATOR_MAX_TOP_N
+        store = cache_backends.indicator_store()
+
+        months = warmed = 0
+        for indicator in indicators:
+            indicator_months = ranking.months(indicator)
+            cached = store.get_rankings(indicator, [month.date() for month in indicator_months],
+                                        dataset_version, depth)
+            months += len(indicator_months)
+            for month in indicator_months:
+                if month.date() in cached:
+                    continue
+                store.set_ranking(indicator, month, ranking.top(indicator, month, depth), depth, dataset_version)
+                warmed += 1
+        self.stdout.write(f'Monthly indicators: {warmed} of {months} months computed for version {dataset_version}')
+        return months, warmed, time.perf_counter() - started
+
+    def held_tickers(self, indicators, windows, top_ns):
+        """
+        Every ticker the portfolios of the windows hold, from the ranking index
+        """
+        sentiment_data_path = os.path.join(settings.BASE_DIR, 'data', 'reddit_sentiment_data.csv')
+        sentiment_data = RedditSentimentData(sentiment_data_path)
+        tickers = set()
+        for indicator in indicators:
+            for start, end in windows:
+                start, end = backtest.clamp_date_range(start, end)
+                for top_n in top_ns:
+                    for month_tickers in backtest.tickers_by_month(sentiment_data, indicator, start, end, top_n).values():
+                        tickers.update(month_tickers)
+        self.stdout.write(f'Portfolio windows: {len(windows)} windows hold {len(tickers)} tickers')
+        return tickers
+
+    def warm_news(self, tickers, workers):
+        """
+        Fetch the news of every ticker without a fresh entry; stale entries are refetched now, not in the background
+        """
+        started = time.perf_counter()
+        if not tickers:
+            return 0, 0, 0.0
+        try:
+            news = news_cache.get_news(tickers, client_factory=self.news_client_factory, workers=workers,
+                                       grace=timedelta(0))
+        except (ImportError, news_cache.NewsConfigError) as e:
+            self.stdout.write(self.style.WARNING(f'Skipping news: {e}'))
+            return len(tickers), 0, time.perf_counter() - started
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'News prefetch failed: {e}'))
+            return len(tickers), 0, time.perf_counter() - started
+        if news['failed_tickers']:
+            self.stdout.write(self.style.WARNING(f"News failed for: {', '.join(news['failed_tickers'])}"))
+        self.stdout.write(f"News: {len(news['fetched_tickers'])} tickers fetched, "
+                          f"{len(news['cached_tickers'])} already cached")
+        return len(tickers), len(news['fetched_tickers']), time.perf_counter() - started
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0006_cleanup_old_portfolio_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlyindicatorcache',
+            name='depth',
+            field=models.PositiveIntegerField(default=5),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0007_monthlyindicatorcache_depth'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyStockAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month_year', models.DateField()),
+                ('indicator', models.CharField(max_length=50)),
+                ('ticker', models.CharField(max_length=10)),
+                ('total', models.FloatField()),
+                ('count', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['month_year', 'indicator', 'ticker'],
+                'indexes': [models.Index(fields=['month_year', 'indicator'], name='api_v1_mont_month_y_0bfee5_idx')],
+                'unique_together': {('month_year', 'indicator', 'ticker')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0008_monthlystockaggregate'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='monthlyindicatorcache',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='monthlyindicatorcache',
+            name='dataset_version',
+            field=models.CharField(default='', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='monthlyindicatorcache',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyindicatorcache',
+            unique_together={('month_year', 'indicator', 'dataset_version')},
+        ),
+        migrations.AddIndex(
+            model_name='monthlyindicatorcache',
+            index=models.Index(fields=['dataset_version'], name='api_v1_mont_dataset_a54ed1_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# StockPriceHistory used date as its primary key, so only one ticker could have a row per day.
+# The table is rebuilt with an id primary key and a unique (ticker, date) constraint; existing
+# rows are copied over.
+
+from django.db import migrations, models
+
+
+def copy_prices(apps, schema_editor):
+    table_from = apps.get_model('api_v1', 'StockPriceHistory')._meta.db_table
+    table_to = apps.get_model('api_v1', 'StockPriceHistoryByTicker')._meta.db_table
+    columns = 'ticker, date, open_price, close_price, high_price, low_price, volume'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table_to} ({columns}) SELECT {columns} FROM {table_from}')
+
+
+def copy_prices_back(apps, schema_editor):
+    table_from = apps.get_model('api_v1', 'StockPriceHistoryByTicker')._meta.db_table
+    table_to = apps.get_model('api_v1', 'StockPriceHistory')._meta.db_table
+    columns = 'ticker, date, open_price, close_price, high_price, low_price, volume'
+    with schema_editor.connection.cursor() as cursor:
+        # The old schema holds one row per date
+        cursor.execute(
+            f'INSERT INTO {table_to} ({columns}) SELECT {columns} FROM {table_from} '
+            f'WHERE id IN (SELECT MIN(id) FROM {table_from} GROUP BY date)'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0009_monthlyindicatorcache_dataset_version'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockPriceHistoryByTicker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10)),
+                ('date', models.DateField()),
+                ('open_price', models.DecimalField(decimal_places=6, max_digits=12)),
+                ('close_price', models.DecimalField(decimal_places=6, max_digits=12)),
+                ('high_price', models.DecimalField(decimal_places=6, max_digits=12)),
+                ('low_price', models.DecimalField(decimal_places=6, max_digits=12)),
+                ('volume', models.BigIntegerField()),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.RunPython(copy_prices, copy_prices_back),
+        migrations.DeleteModel(
+            name='StockPriceHistory',
+        ),
+        migrations.RenameModel(
+            old_name='StockPriceHistoryByTicker',
+            new_name='StockPriceHistory',
+        ),
+        migrations.AddConstraint(
+            model_name='stockpricehistory',
+            constraint=models.UniqueConstraint(fields=('ticker', 'date'), name='unique_stock_price_ticker_date'),
+        ),
+    ]
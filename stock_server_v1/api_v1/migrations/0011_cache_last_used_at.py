@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0010_stockpricehistory_ticker_date_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlyindicatorcache',
+            name='last_used_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='newscache',
+            name='last_used_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='monthlyindicatorcache',
+            index=models.Index(fields=['last_used_at'], name='api_v1_mont_last_us_bd6d6a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newscache',
+            index=models.Index(fields=['last_used_at'], name='api_v1_news_last_us_a71630_idx'),
+        ),
+    ]
@@ -1,17 +1,23 @@
 from django.db import models
 
 class StockPriceHistory(models.Model):
-    date = models.DateField(primary_key=True)
+    """
+    Daily prices of stocks and market indexes, one row per (ticker, date)
+    """
     ticker = models.CharField(max_length=10)
+    date = models.DateField()
     open_price = models.DecimalField(max_digits=12, decimal_places=6)
     close_price = models.DecimalField(max_digits=12, decimal_places=6)
     high_price = models.DecimalField(max_digits=12, decimal_places=6)
     low_price = models.DecimalField(max_digits=12, decimal_places=6)
-    volume = models.IntegerField()
+    volume = models.BigIntegerField()
 
     class Meta:
-        unique_together = ('ticker', 'date')
         ordering = ['-date']
+        constraints = [
+            # Also the index for per-ticker date range queries
+            models.UniqueConstraint(fields=['ticker', 'date'], name='unique_stock_price_ticker_date'),
+        ]
 
 
 # Build the database table with columns: 'title', 'score', 'comms_num', 'body', 'date', 'stock', 'title_unstemmed_sentiment', 'body_unstemmed_sentiment'
@@ -40,12 +46,14 @@ class NewsCache(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()  # Cache expiration time
     total_results = models.IntegerField(default=0)
+    last_used_at = models.DateTimeField(null=True, blank=True)  # Last cache hit, for LRU eviction
     
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['cache_key']),
             models.Index(fields=['expires_at']),
+            models.Index(fields=['last_used_at']),
         ]
 
     def __str__(self):
@@ -80,23 +88,30 @@ class NewsArticle(models.Model):
 class MonthlyIndicatorCache(models.Model):
     """
     Cache for monthly indicator scores (engagement_ratio, total_sentiment, etc.)
-    This allows incremental building of portfolio calculations
+    This allows incremental building of portfolio calculations.
+    Entries are keyed by the dataset version they were ranked from (content hash of the
+    sentiment data plus the ranking parameters) and are valid exactly while it is current.
     """
     month_year = models.DateField()  # First day of the month (e.g., 2021-04-01)
     indicator = models.CharField(max_length=50)  # engagement_ratio, total_sentiment, etc.
+    dataset_version = models.CharField(max_length=32, default='')  # See ranking_index.dataset_version
+    depth = models.PositiveIntegerField(default=5)  # Number of ranks persisted in scores (serves any top_n <= depth)
     created_at = models.DateTimeField(auto_now_add=True)
-    expires_at = models.DateTimeField()  # Cache expiration time (longer than portfolio cache)
+    expires_at = models.DateTimeField(null=True, blank=True)  # Legacy TTL, versioned entries do not expire
+    last_used_at = models.DateTimeField(null=True, blank=True)  # Last cache hit, for LRU eviction
     
     class Meta:
         ordering = ['-created_at']
-        unique_together = ('month_year', 'indicator')
+        unique_together = ('month_year', 'indicator', 'dataset_version')
         indexes = [
             models.Index(fields=['month_year', 'indicator']),
+            models.Index(fields=['dataset_version']),
             models.Index(fields=['expires_at']),
+            models.Index(fields=['last_used_at']),
         ]
 
     def __str__(self):
-        return f"MonthlyIndicatorCache({self.month_year.strftime('%Y-%m')}, {self.indicator})"
+        return f"MonthlyIndicatorCache({self.month_year.strftime('%Y-%m')}, {self.indicator}, {self.dataset_version})"
 
 
 class MonthlyIndicatorScore(models.Model):
@@ -117,4 +132,38 @@ class MonthlyIndicatorScore(models.Model):
         ]
 
     def __str__(self):
-        return f"MonthlyIndicatorScore({self.cache.month_year.strftime('%Y-%m')}, {self.ticker}): {self.score_value:.4f} (rank {self.rank})"
\ No newline at end of file
+        return f"MonthlyIndicatorScore({self.cache.month_year.strftime('%Y-%m')}, {self.ticker}): {self.score_value:.4f} (rank {self.rank})"
+
+class MonthlyStockAggregate(models.Model):
+    """
+    Running sum and count of an indicator per (month, stock), updated as new posts are appended
+    so affected months can be re-ranked without re-aggregating the whole dataset
+    """
+    month_year = models.DateField()  # First day of the month the posts were made in
+    indicator = models.CharField(max_length=50)
+    ticker = models.CharField(max_length=10)
+    total = models.FloatField()  # Sum of the indicator over the month's posts
+    count = models.PositiveIntegerField()  # Number of posts
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['month_year', 'indicator', 'ticker']
+        unique_together = ('month_year', 'indicator', 'ticker')
+        indexes = [
+            models.Index(fields=['month_year', 'indicator']),
+        ]
+
+    def __str__(self):
+        return f"MonthlyStockAggregate({self.month_year.strftime('%Y-%m')}, {self.indicator}, {self.ticker}): {self.total:.4f}/{self.count}"
+
+
+class MonthlyAggregateSource(models.Model):
+    """
+    Dataset version the MonthlyStockAggregate rows were built from (a single row), so posts are
+    only added to aggregates of the csv they are appended to
+    """
+    dataset_version = models.CharField(max_length=32)  # See ranking_index.dataset_version
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"MonthlyAggregateSource({self.dataset_version})"
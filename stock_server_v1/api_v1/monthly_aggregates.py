@@ -0,0 +1,193 @@
+"""
+Running per (month, stock) aggregates of the indicators, kept in MonthlyStockAggregate.
+
+Each row holds the sum and count of one indicator for one stock in one month, so
+appending a batch of posts only adds the batch's sums and counts to the months it
+touches. Rankings of those months are then recomputed from the aggregates alone and
+written to MonthlyIndicatorCache under the new dataset version; cached rankings of every
+other month are carried forward to that version with one UPDATE.
+
+The dataset version the aggregates describe is kept with them (MonthlyAggregateSource)
+and moves to the new version in the same transaction as each batch, so aggregates of a
+csv that was changed some other way are rebuilt instead of extended.
+
+Monthly values follow AGG_MAP ('mean' = total / count, 'sum' = total, 'count' = count)
+and stocks are ranked like MonthlyRankingIndex: descending value, ties by ticker.
+"""
+import logging
+
+import pandas as pd
+from django.db import transaction
+
+from .models import MonthlyStockAggregate, MonthlyIndicatorCache, MonthlyIndicatorScore, MonthlyAggregateSource
+from .ranking_index import AGG_MAP
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def aggregate_posts(df_sentiment: pd.DataFrame) -> pd.DataFrame:
+    """
+    Long frame of (month_year, indicator, ticker, total, count) for posts indexed by (date, stock)
+    """
+    indicators = [indicator for indicator in AGG_MAP if indicator in df_sentiment.columns]
+    if df_sentiment.empty or not indicators:
+        return pd.DataFrame(columns=['month_year', 'indicator', 'ticker', 'total', 'count'])
+    dates = df_sentiment.index.get_level_values('date')
+    months = pd.DatetimeIndex(dates.values.astype('datetime64[M]').astype('datetime64[ns]'), name='month_year')
+    stocks = df_sentiment.index.get_level_values('stock').rename('ticker')
+
+    grouped = df_sentiment[indicators].groupby([months, stocks])
+    sums = grouped.sum().stack().rename('total')
+    counts = grouped.count().stack().rename('count')
+    df = pd.concat([sums, counts], axis=1).reset_index()
+    df.columns = ['month_year', 'ticker', 'indicator', 'total', 'count']
+    df = df[df['count'] > 0]
+    return df[['month_year', 'indicator', 'ticker', 'total', 'count']].reset_index(drop=True)
+
+
+def _rows(df: pd.DataFrame) -> list:
+    return [
+        MonthlyStockAggregate(month_year=month.date(), indicator=indicator, ticker=ticker,
+                              total=float(total), count=int(count))
+        for month, indicator, ticker, total, count in df.itertuples(index=False)
+    ]
+
+
+def _set_source_version(dataset_version: str):
+    MonthlyAggregateSource.objects.all().delete()
+    MonthlyAggregateSource.objects.create(dataset_version=dataset_version)
+
+
+def source_version():
+    """
+    Dataset version the aggregates were built from, or None if unknown
+    """
+    source = MonthlyAggregateSource.objects.first()
+    return source.dataset_version if source else None
+
+
+def rebuild(df_sentiment: pd.DataFrame, dataset_version: str = '') -> int:
+    """
+    Replace the whole aggregate store with the aggregates of df_sentiment, the data of dataset_version
+    """
+    df = aggregate_posts(df_sentiment)
+    with transaction.atomic():
+        MonthlyStockAggregate.objects.all().delete()
+        MonthlyStockAggregate.objects.bulk_create(_rows(df), batch_size=BATCH_SIZE)
+        _set_source_version(dataset_version)
+    logger.info("Rebuilt monthly aggregates: %d rows over %d months", len(df), df['month_year'].nunique())
+    return len(df)
+
+
+def add_posts(df_sentiment: pd.DataFrame, dataset_version: str = '') -> list:
+    """
+    Add the sums and counts of new posts to the store, which then describes dataset_version.
+    Returns the affected months (first day).
+    """
+    df = aggregate_posts(df_sentiment)
+    months = sorted(df['month_year'].unique())
+    with transaction.atomic():
+        _set_source_version(dataset_version)
+        if df.empty:
+            return []
+        existing = pd.DataFrame(
+            MonthlyStockAggregate.objects
+            .filter(month_year__in=[pd.Timestamp(month).date() for month in months])
+            .values_list('month_year', 'indicator', 'ticker', 'total', 'count'),
+            columns=['month_year', 'indicator', 'ticker', 'total', 'count'],
+        )
+        if not existing.empty:
+            existing['month_year'] = pd.to_datetime(existing['month_year'])
+            df = (pd.concat([existing, df])
+                  .groupby(['month_year', 'indicator', 'ticker'], as_index=False)[['total', 'count']].sum())
+        MonthlyStockAggregate.objects.bulk_create(
+            _rows(df), batch_size=BATCH_SIZE, update_conflicts=True,
+            unique_fields=['month_year', 'indicator', 'ticker'], update_fields=['total', 'count'],
+        )
+    return [pd.Timestamp(month) for month in months]
+
+
+def is_empty() -> bool:
+    return not MonthlyStockAggregate.objects.exists()
+
+
+def month_indicators() -> list:
+    """
+    (month, indicator) pairs the store holds aggregates of, months as dates
+    """
+    return list(MonthlyStockAggregate.objects.values_list('month_year', 'indicator').distinct().order_by())
+
+
+def month_rankings(months: list, depth: int = None) -> dict:
+    """
+    {(indicator, month): [(ticker, value, rank), ...]} for the months, from the aggregates only
+    """
+    df = pd.DataFrame(
+        MonthlyStockAggregate.objects
+        .filter(month_year__in=[pd.Timestamp(month).date() for month in months])
+        .values_list('month_year', 'indicator', 'ticker', 'total', 'count'),
+        columns=['month_year', 'indicator', 'ticker', 'total', 'count'],
+    )
+    rankings = {}
+    if df.empty:
+        return rankings
+    for (indicator, month), group in df.groupby(['indicator', 'month_year'], sort=True):
+        how = AGG_MAP.get(indicator, 'mean')
+        if how == 'mean':
+            values = group['total'] / group['count']
+        elif how == 'count':
+            values = group['count']
+        else:
+            values = group['total']
+        ranked = (pd.DataFrame({'ticker': group['ticker'], 'value': values.astype('float64')})
+                  .dropna()
+                  .sort_values(['value', 'ticker'], ascending=[False, True], kind='stable'))
+        if depth is not None:
+            ranked = ranked.head(depth)
+        rankings[(indicator, pd.Timestamp(month))] = [
+            (ticker, float(value), rank)
+            for rank, (ticker, value) in enumerate(ranked.itertuples(index=False), start=1)
+        ]
+    return rankings
+
+
+def replace_monthly_ranking(indicator: str, month_dt, stocks_data: list, depth: int,
+                            dataset_version: str) -> MonthlyIndicatorCache:
+    """
+    Replace the cached ranking of one month/indicator/dataset version in a single transaction.
+    stocks_data: list of (ticker, score, rank) tuples, the full ranking down to depth
+    """
+    month = pd.Timestamp(month_dt).date()
+    with transaction.atomic():
+        MonthlyIndicatorCache.objects.filter(
+            month_year=month, indicator=indicator, dataset_version=dataset_version
+        ).delete()
+        monthly_cache = MonthlyIndicatorCache.objects.create(
+            month_year=month,
+            indicator=indicator,
+            dataset_version=dataset_version,
+            depth=depth
+        )
+        MonthlyIndicatorScore.objects.bulk_create([
+            MonthlyIndicatorScore(cache=monthly_cache, ticker=ticker, score_value=score_value, rank=rank)
+            for ticker, score_value, rank in stocks_data
+        ])
+    return monthly_cache
+
+
+def carry_forward(old_version: str, new_version: str, changed_months: list) -> int:
+    """
+    Move cached rankings of the months a data change did not touch to the new dataset version
+    """
+    if old_version == new_version:
+        return 0
+    with transaction.atomic():
+        MonthlyIndicatorCache.objects.filter(dataset_version=new_version).exclude(
+            month_year__in=[pd.Timestamp(month).date() for month in changed_months]
+        ).delete()
+        return (MonthlyIndicatorCache.objects
+                .filter(dataset_version=old_version)
+                .exclude(month_year__in=[pd.Timestamp(month).date() for month in changed_months])
+                .update(dataset_version=new_version))
@@ -0,0 +1,381 @@
+"""
+Per-ticker NewsAPI cache of the news endpoint.
+
+Every ticker has its own cache entry (a NewsCache row keyed by ticker, or the
+entry of the configured cache backend, see cache_backends) holding up to
+ARTICLES_PER_TICKER articles, so portfolios that share a ticker share its cached news.
+A multi-ticker request reads the valid entries of all its tickers in one lookup, fetches
+only the missing or expired tickers, at most NEWS_FETCH_WORKERS NewsAPI calls at a time,
+and merges the articles newest first. Tickers without news are cached as empty entries,
+so they are not asked for again until the entry expires. As every uncached ticker is one
+NewsAPI request, the views accept at most NEWS_MAX_TICKERS tickers per request.
+
+Stale-while-revalidate: an entry that expired less than NEWS_CACHE_STALE_SECONDS ago is
+still served, flagged stale, and its ticker is refreshed by a background thread (at most
+one refresh per ticker across threads and worker processes). Only tickers with no entry,
+or one past the grace window, are fetched while the request waits.
+
+The NewsAPI client comes from a factory that is only called when something has to be
+fetched. Anything with NewsApiClient.get_everything works, which is how the tests run
+against a local stub.
+
+aget_news is the same flow for the async news view: the missing tickers are fetched
+concurrently on the event loop with AsyncNewsApiClient (or any object with an async
+get_everything).
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache_backends, instrumentation, single_flight
+
+logger = logging.getLogger(__name__)
+
+ARTICLES_PER_TICKER = 5
+MAX_ARTICLES = 5
+# NewsAPI page per ticker, filtered down to the articles with a title and description
+PAGE_SIZE = 10
+REQUEST_TIMEOUT_SECONDS = 10
+NEWS_DOMAINS = ('wsj.com,bloomberg.com,reuters.com,cnbc.com,marketwatch.com,yahoo.com,forbes.com,cnn.com,'
+                'foxbusiness.com,barrons.com,thestreet.com,seekingalpha.com,fool.com,benzinga.com,investorplace.com')
+
+
+class NewsConfigError(Exception):
+    pass
+
+
+def _api_key(config_path: str = None) -> str:
+    config_path = config_path or os.path.join(settings.BASE_DIR, '..', '.api_keys.json')
+    try:
+        with open(config_path, 'r') as config_file:
+            return json.load(config_file)['news_api_key']
+    except FileNotFoundError:
+        raise NewsConfigError("API keys configuration file not found.")
+    except KeyError:
+        raise NewsConfigError("News API key not found in configuration.")
+
+
+def newsapi_client(config_path: str = None):
+    """
+    NewsApiClient with the key of .api_keys.json next to the project
+    """
+    from newsapi import NewsApiClient
+
+    return NewsApiClient(api_key=_api_key(config_path))
+
+
+class AsyncNewsApiClient:
+    """
+    NewsApiClient.get_everything as a coroutine, over httpx
+    """
+    URL = 'https://newsapi.org/v2/everything'
+
+    def __init__(self, api_key: str, timeout: float = REQUEST_TIMEOUT_SECONDS):
+        import httpx
+
+        self._client = httpx.AsyncClient(timeout=timeout, headers={'X-Api-Key': api_key})
+
+    async def get_everything(self, q, language, sort_by, page_size, page, domains):
+        response = await self._client.get(self.URL, params={
+            'q': q, 'language': language, 'sortBy': sort_by, 'pageSize': page_size, 'page': page, 'domains': domains,
+        })
+        return response.json()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def async_newsapi_client(config_path: str = None) -> AsyncNewsApiClient:
+    """
+    AsyncNewsApiClient with the key of .api_keys.json next to the project; the caller closes it
+    """
+    return AsyncNewsApiClient(_api_key(config_path))
+
+
+def parse_tickers(value: str) -> list:
+    """
+    Sorted, upper-cased, de-duplicated tickers of a comma-separated list
+    """
+    return sorted({ticker.strip().upper() for ticker in value.split(',') if ticker.strip()})
+
+
+def _query(ticker: str) -> dict:
+    return {'q': ticker, 'language': 'en', 'sort_by': 'publishedAt', 'page_size': PAGE_SIZE, 'page': 1,
+            'domains': NEWS_DOMAINS}
+
+
+def fetch_ticker_articles(client, ticker: str) -> list:
+    """
+    Newest articles about one ticker from NewsAPI, as response dicts with publishedAt parsed
+    """
+    return parse_articles(client.get_everything(**_query(ticker)))
+
+
+async def afetch_ticker_articles(client, ticker: str) -> list:
+    return parse_articles(await client.get_everything(**_query(ticker)))
+
+
+def parse_articles(response: dict) -> list:
+    """
+    Up to ARTICLES_PER_TICKER articles of a NewsAPI response with a title, description and a
+    parseable publishedAt, each url once
+    """
+    if response.get('status') != 'ok':
+        raise RuntimeError(response.get('message') or f"NewsAPI status {response.get('status')}")
+    articles = []
+    seen_urls = set()
+    for article in response.get('articles', []):
+        # Only include articles that have proper content
+        if not (article.get('title') and article.get('description')) or article.get('url') in seen_urls:
+            continue
+        try:
+            published_at = parse_datetime(article.get('publishedAt') or '')
+        except ValueError:
+            published_at = None
+        if published_at is None:
+            continue
+        seen_urls.add(article['url'])
+        articles.append({
+            'title': article['title'],
+            'source': (article.get('source') or {}).get('name') or '',
+            'publishedAt': published_at,
+            'url': article['url'],
+            'description': article['description'],
+            'urlToImage': article.get('urlToImage') or '',
+        })
+        if len(articles) == ARTICLES_PER_TICKER:
+            break
+    return articles
+
+
+def cached_entries(tickers: list, since) -> dict:
+    """
+    {ticker: CachedNews} of the tickers with an entry expiring after since
+    """
+    return cache_backends.news_store().get_many(tickers, since)
+
+
+def store(ticker: str, articles: list, now, ttl: timedelta) -> cache_backends.CachedNews:
+    """
+    Replace the cache entry of one ticker
+    """
+    return cache_backends.news_store().set(ticker, articles, now, ttl)
+
+
+def merge_articles(articles_by_ticker: list, limit: int = MAX_ARTICLES) -> list:
+    """
+    Newest articles first across tickers, each url once
+    """
+    ranked = sorted((article for articles in articles_by_ticker for article in articles),
+                    key=lambda article: article['publishedAt'], reverse=True)
+    merged = []
+    seen_urls = set()
+    for article in ranked:
+        if article['url'] not in seen_urls:
+            seen_urls.add(article['url'])
+            merged.append(article)
+    return merged[:limit]
+
+
+# Background refreshes of stale tickers
+_refresh_executor = None
+_refreshing = set()
+_refresh_guard = threading.Lock()
+
+
+def refresh_ticker(ticker: str, client_factory=newsapi_client, ttl: timedelta = None):
+    """
+    Fetch and store one ticker unless another process is already refreshing it
+    """
+    ttl = ttl or timedelta(seconds=settings.NEWS_CACHE_TTL_SECONDS)
+    flights = single_flight.SingleFlight()
+    os.makedirs(flights.lock_dir, exist_ok=True)
+    with single_flight.file_lock(flights.lock_path(f'news-refresh:{ticker}'), timeout=0) as locked:
+        # Without fcntl there is no cross-process lock to respect
+        if locked or single_flight.fcntl is None:
+            store(ticker, fetch_ticker_articles(client_factory(), ticker), timezone.now(), ttl)
+
+
+def _refresh_in_background(ticker: str, client_factory, ttl: timedelta):
+    try:
+        refresh_ticker(ticker, client_factory, ttl)
+        logger.info("Refreshed stale news of %s", ticker)
+    except Exception as e:
+        logger.warning("Background news refresh failed for %s: %s", ticker, e)
+    finally:
+        with _refresh_guard:
+            _refreshing.discard(ticker)
+        # Worker threads outlive the request cycle that would close their connection
+        connection.close()
+
+
+def schedule_refresh(tickers: list, client_factory=newsapi_client, ttl: timedelta = None) -> list:
+    """
+    Refresh the tickers on background threads; returns those not already being refreshed
+    """
+    global _refresh_executor
+    scheduled = []
+    with _refresh_guard:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=settings.NEWS_FETCH_WORKERS,
+                                                   thread_name_prefix='news-refresh')
+        for ticker in tickers:
+            if ticker not in _refreshing:
+                _refreshing.add(ticker)
+                scheduled.append(ticker)
+                _refresh_executor.submit(_refresh_in_background, ticker, client_factory, ttl)
+    return scheduled
+
+
+def get_news(tickers: list, client_factory=newsapi_client, workers: int = None, ttl: timedelta = None,
+             grace: timedelta = None, now=None, refresh=schedule_refresh) -> dict:
+    """
+    Merged news of the tickers, fetching only those without a usable cache entry.
+    Entries expired within the grace window are served and passed to refresh(tickers, client_factory, ttl).
+    A ticker whose fetch or cache write failed is left out of the response; if every ticker failed
+    the first error is raised.
+    """
+    now = now or timezone.now()
+    ttl = ttl or timedelta(seconds=settings.NEWS_CACHE_TTL_SECONDS)
+    grace = grace if grace is not None else timedelta(seconds=settings.NEWS_CACHE_STALE_SECONDS)
+    workers = workers or settings.NEWS_FETCH_WORKERS
+
+    with instrumentation.span('cache_lookup'):
+        entries = cached_entries(tickers, now - grace)
+    missing = [ticker for ticker in tickers if ticker not in entries]
+    stale = sorted(ticker for ticker, entry in entries.items() if entry.expires_at <= now)
+    instrumentation.record_cache('news', hits=len(entries) - len(stale), misses=len(missing), stale=len(stale))
+    if stale:
+        refresh(stale, client_factory, ttl)
+    failed = {}
+    if missing:
+        client = client_factory()
+        # Only the NewsAPI calls run in the pool; the cache writes stay on this thread's connection
+        with instrumentation.span('news_fetch'), ThreadPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+            futures = {ticker: executor.submit(fetch_ticker_articles, client, ticker) for ticker in missing}
+        for ticker, future in futures.items():
+            try:
+                articles = future.result()
+            except Exception as e:
+                logger.warning("News fetch failed for %s: %s", ticker, e)
+                failed[ticker] = e
+                continue
+            try:
+                entries[ticker] = store(ticker, articles, now, ttl)
+            except Exception as e:
+                logger.warning("News cache write failed for %s: %s", ticker, e)
+                failed[ticker] = e
+        if failed and not entries:
+            raise next(iter(failed.values()))
+    return _summary(tickers, entries, missing, failed, stale, now)
+
+
+async def aget_news(tickers: list, client_factory=async_newsapi_client, workers: int = None,
+                    ttl: timedelta = None, grace: timedelta = None, now=None, refresh=schedule_refresh,
+                    refresh_client_factory=newsapi_client) -> dict:
+    """
+    get_news for async views: the cache is read with the async ORM (or off the event loop) and the
+    missing tickers are fetched concurrently with an async client, at most workers at a time.
+    Stale tickers are refreshed by the background threads, through refresh_client_factory.
+    """
+    now = now or timezone.now()
+    ttl = ttl or timedelta(seconds=settings.NEWS_CACHE_TTL_SECONDS)
+    grace = grace if grace is not None else timedelta(seconds=settings.NEWS_CACHE_STALE_SECONDS)
+    limit = asyncio.Semaphore(workers or settings.NEWS_FETCH_WORKERS)
+    store = cache_backends.news_store()
+
+    with instrumentation.span('cache_lookup'):
+        entries = await store.aget_many(tickers, now - grace)
+    missing = [ticker for ticker in tickers if ticker not in entries]
+    stale = sorted(ticker for ticker, entry in entries.items() if entry.expires_at <= now)
+    instrumentation.record_cache('news', hits=len(entries) - len(stale), misses=len(missing), stale=len(stale))
+    if stale:
+        refresh(stale, refresh_client_factory, ttl)
+    failed = {}
+    if missing:
+        client = client_factory()
+
+        async def fetch(ticker):
+            async with limit:
+                return await afetch_ticker_articles(client, ticker)
+
+        try:
+            with instrumentation.span('news_fetch'):
+                results = await asyncio.gather(*(fetch(ticker) for ticker in missing), return_exceptions=True)
+        finally:
+            if hasattr(client, 'aclose'):
+                await client.aclose()
+        for ticker, result in zip(missing, results):
+            if isinstance(result, Exception):
+                logger.warning("News fetch failed for %s: %s", ticker, result)
+                failed[ticker] = result
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            try:
+                entries[ticker] = await store.aset(ticker, result, now, ttl)
+            except Exception as e:
+                logger.warning("News cache write failed for %s: %s", ticker, e)
+                failed[ticker] = e
+        if failed and not entries:
+            raise next(iter(failed.values()))
+    return _summary(tickers, entries, missing, failed, stale, now)
+
+
+def _summary(tickers, entries, missing, failed, stale, now) -> dict:
+    used = list(entries.values())
+    return {
+        'articles': merge_articles([entry.articles for entry in used]),
+        'cached_tickers': sorted(set(tickers) - set(missing)),
+        'fetched_tickers': sorted(set(missing) - set(failed)),
+        'failed_tickers': sorted(failed),
+        'stale_tickers': stale,
+        'cached_at': min(entry.created_at for entry in used),
+        'expires_at': min(entry.expires_at for entry in used),
+        'freshness': {
+            ticker: {'cached_at': entry.created_at, 'expires_at': entry.expires_at, 'stale': entry.expires_at <= now}
+            for ticker, entry in sorted(entries.items())
+        },
+    }
+
+
+def response_data(tickers: list, news: dict) -> dict:
+    """
+    Body of the news endpoint for the result of get_news
+    """
+    if not news['articles']:
+        return {
+            'status': 'no_results',
+            'message': 'No recent news found for the specified tickers.',
+            'tickers': tickers
+        }
+    articles = [dict(article, publishedAt=article['publishedAt'].isoformat()) for article in news['articles']]
+    return {
+        'status': 'success',
+        'articles': articles,
+        'totalResults': len(articles),
+        'tickers': tickers,
+        'cached': not news['fetched_tickers'],  # True if every ticker came from the cache
+        'cached_at': news['cached_at'].isoformat(),
+        'cache_expires_at': news['expires_at'].isoformat(),
+        'cached_tickers': news['cached_tickers'],
+        'fetched_tickers': news['fetched_tickers'],
+        'failed_tickers': news['failed_tickers'],
+        # Served past expiry while a background refresh runs
+        'stale': bool(news['stale_tickers']),
+        'stale_tickers': news['stale_tickers'],
+        'freshness': {
+            ticker: {'cached_at': entry['cached_at'].isoformat(),
+                     'expires_at': entry['expires_at'].isoformat(), 'stale': entry['stale']}
+            for ticker, entry in news['freshness'].items()
+        },
+    }
@@ -0,0 +1,84 @@
+"""
+Vectorized equal-weight portfolio returns.
+
+A rebalance schedule (tickers_by_date: {'YYYY-MM-DD': [tickers]}) is turned into a sparse
+dates x tickers weight matrix, stored as one padded row of column positions per holding
+period. The daily portfolio return is the mean of the held tickers' returns, computed as
+one masked reduction over the gathered returns:
+
+    held   = returns[date, holdings[period_of_date]]
+    valid  = holding_mask & ~isnan(held)
+    return = sum(held where valid) / count(valid)
+
+Only the held (date, ticker) cells are read, so the cost grows with the number of
+positions rather than with the size of the universe. Each portfolio is held from its
+start date through the end of that month, the same holding period the per-rebalance
+loop used.
+"""
+import numpy as np
+import pandas as pd
+
+
+def holding_periods(tickers_by_date: dict) -> tuple:
+    """
+    Sorted (starts, ends, tickers) of the holding periods; each runs to the end of its start month
+    """
+    keys = list(tickers_by_date.keys())
+    starts = pd.to_datetime(keys, format='ISO8601')
+    order = np.argsort(starts.values, kind='stable')
+    starts = starts[order]
+    ends = starts + pd.offsets.MonthEnd()
+    tickers = [tickers_by_date[keys[i]] for i in order]
+    return starts, ends, tickers
+
+
+def build_weight_matrix(dates: pd.DatetimeIndex, columns: pd.Index, tickers_by_date: dict) -> tuple:
+    """
+    Build the sparse equal-weight matrix for the rebalance schedule.
+    Returns (covered, holdings, mask):
+    - covered: bool mask over dates that fall in a holding period
+    - holdings: int matrix (covered.sum(), max tickers per period) of column positions in columns
+    - mask: bool matrix of the same shape, False for padding and tickers not in columns
+    If holding periods overlap, a date belongs to the period that started last.
+    """
+    starts, ends, tickers = holding_periods(tickers_by_date)
+    dates = pd.DatetimeIndex(dates)
+
+    # One padded row of column positions per period
+    width = max((len(period) for period in tickers), default=0)
+    positions = np.full((len(starts), max(width, 1)), -1, dtype='int64')
+    for period_id, period in enumerate(tickers):
+        if period:
+            positions[period_id, :len(period)] = columns.get_indexer(period)
+
+    # Period of each date: the latest period starting on or before it, if the date is within its month
+    period_of_date = starts.searchsorted(dates, side='right') - 1
+    covered = period_of_date >= 0
+    covered[covered] = dates[covered] <= ends[period_of_date[covered]]
+
+    holdings = positions[period_of_date[covered]]
+    mask = holdings >= 0
+    return covered, np.where(mask, holdings, 0), mask
+
+
+def portfolio_returns(df_return: pd.DataFrame, tickers_by_date: dict) -> pd.DataFrame:
+    """
+    Daily equal-weight portfolio return for a dates x tickers return frame and a rebalance schedule.
+    Tickers with no return on a given day are left out of that day's mean; a day on which
+    none of the held tickers has a return is NaN.
+    """
+    if not tickers_by_date or df_return.empty:
+        return pd.DataFrame(columns=['portfolio_return'], index=pd.DatetimeIndex([]), dtype='float64')
+
+    covered, holdings, mask = build_weight_matrix(df_return.index, df_return.columns, tickers_by_date)
+
+    values = df_return.to_numpy(dtype='float64')
+    held = values[np.flatnonzero(covered)[:, None], holdings]
+
+    valid = mask & ~np.isnan(held)
+    totals = np.where(valid, held, 0.0).sum(axis=1)
+    counts = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_return = np.where(counts > 0, totals / counts, np.nan)
+
+    return pd.DataFrame({'portfolio_return': mean_return}, index=pd.DatetimeIndex(df_return.index[covered]))
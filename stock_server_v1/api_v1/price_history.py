@@ -0,0 +1,101 @@
+"""
+Price history rows for the stock-price-history endpoint, read without model instances.
+
+All requested tickers come from one query ordered by (ticker, date), which the
+(ticker, date) unique index serves. Prices are cast to float in the database, so
+values_list yields plain tuples of str, date, float and int, and no Decimal or
+StockPriceHistory objects are built per row. Single-ticker rows keep the serializer's
+fixed-point strings (formatted back from the floats, which hold every stored digit), so
+existing clients see the same response. The a* variants read the same query with the
+async ORM, for the async view.
+"""
+from itertools import groupby
+
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from . import downsampling
+from .models import StockPriceHistory
+
+PRICE_FIELDS = ['open_price', 'close_price', 'high_price', 'low_price']
+MAX_TICKERS = 100
+# Decimal places of the price columns, as StockPriceHistorySerializer renders them
+PRICE_PLACES = StockPriceHistory._meta.get_field('close_price').decimal_places
+
+
+def parse_tickers(value: str) -> list:
+    """
+    Upper-cased, de-duplicated tickers of a comma-separated list, in request order
+    """
+    tickers = (ticker.strip().upper() for ticker in value.split(','))
+    return list(dict.fromkeys(ticker for ticker in tickers if ticker))
+
+
+def price_rows(tickers: list, start_date, end_date):
+    """
+    (id, ticker, date, open, close, high, low, volume) tuples of the tickers, by ticker then date
+    """
+    floats = {f'{field}_float': Cast(field, FloatField()) for field in PRICE_FIELDS}
+    return (StockPriceHistory.objects
+            .filter(ticker__in=tickers, date__gte=start_date, date__lte=end_date)
+            .order_by('ticker', 'date')
+            .annotate(**floats)
+            .values_list('id', 'ticker', 'date', *floats, 'volume'))
+
+
+def _bars(rows, resolution: str, max_points: int) -> list:
+    bars = [row[2:] for row in rows]
+    return downsampling.downsample_bars(downsampling.resample_bars(bars, resolution), max_points)
+
+
+def price_records(ticker: str, start_date, end_date, resolution: str = 'daily', max_points: int = None) -> list:
+    """
+    Rows of one ticker with the keys and decimal string prices of StockPriceHistorySerializer.
+    Aggregated bars carry the id of the row of their (last) date.
+    """
+    return _records(ticker, list(price_rows([ticker], start_date, end_date)), resolution, max_points)
+
+
+async def aprice_records(ticker: str, start_date, end_date, resolution: str = 'daily', max_points: int = None) -> list:
+    rows = [row async for row in price_rows([ticker], start_date, end_date)]
+    return _records(ticker, rows, resolution, max_points)
+
+
+def _records(ticker: str, rows: list, resolution: str, max_points: int) -> list:
+    ids = {row[2]: row[0] for row in rows}
+    return [
+        {'id': ids[day], 'ticker': ticker, 'date': day.isoformat(), 'open_price': _decimal_string(open_price),
+         'close_price': _decimal_string(close_price), 'high_price': _decimal_string(high_price),
+         'low_price': _decimal_string(low_price), 'volume': volume}
+        for day, open_price, close_price, high_price, low_price, volume in _bars(rows, resolution, max_points)
+    ]
+
+
+def _decimal_string(value: float) -> str:
+    return f'{value:.{PRICE_PLACES}f}'
+
+
+def price_records_by_ticker(tickers: list, start_date, end_date, resolution: str = 'daily',
+                            max_points: int = None) -> dict:
+    """
+    {ticker: [{date, open_price, close_price, high_price, low_price, volume}, ...]}; tickers without rows map to [].
+    max_points applies to each ticker's series.
+    """
+    return _records_by_ticker(tickers, price_rows(tickers, start_date, end_date), resolution, max_points)
+
+
+async def aprice_records_by_ticker(tickers: list, start_date, end_date, resolution: str = 'daily',
+                                   max_points: int = None) -> dict:
+    rows = [row async for row in price_rows(tickers, start_date, end_date)]
+    return _records_by_ticker(tickers, rows, resolution, max_points)
+
+
+def _records_by_ticker(tickers: list, rows, resolution: str, max_points: int) -> dict:
+    grouped = {ticker: [] for ticker in tickers}
+    for ticker, ticker_rows in groupby(rows, key=lambda row: row[1]):
+        grouped[ticker] = [
+            {'date': day.isoformat(), 'open_price': open_price, 'close_price': close_price,
+             'high_price': high_price, 'low_price': low_price, 'volume': volume}
+            for day, open_price, close_price, high_price, low_price, volume in _bars(ticker_rows, resolution, max_points)
+        ]
+    return grouped
@@ -0,0 +1,133 @@
+"""
+Bulk loader of the yfinance-style price csvs into StockPriceHistory.
+
+Files are parsed in a process pool (pandas, one file per task) while the parent inserts
+the parsed rows in large batches, each in one transaction. Inserts are upserts on the
+(ticker, date) key, so re-running the loader over the same or updated files is safe.
+On SQLite and PostgreSQL the batches go through one executemany of
+INSERT ... ON CONFLICT DO UPDATE; other backends use bulk_create(update_conflicts=True).
+The ticker of a file is its name, e.g. GME.csv -> GME, as for the price panel.
+"""
+import glob
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from django.db import connections, transaction
+
+from .models import StockPriceHistory
+from .price_panel import read_price_csv
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = ['Open', 'Close', 'High', 'Low', 'Volume']
+UPDATE_FIELDS = ['open_price', 'close_price', 'high_price', 'low_price', 'volume']
+
+
+def discover_files(dir_paths: list) -> list:
+    """
+    (ticker, path) of every csv in the directories, in directory then name order
+    """
+    files = []
+    for dir_path in dir_paths:
+        for path in sorted(glob.glob(os.path.join(dir_path, '*.csv'))):
+            files.append((os.path.splitext(os.path.basename(path))[0], path))
+    return files
+
+
+def parse_price_file(task: tuple) -> tuple:
+    """
+    (ticker, dates, prices, volumes, error) for one csv; rows with missing values are dropped
+    """
+    ticker, path = task
+    try:
+        df = read_price_csv(path)[PRICE_COLUMNS].apply(pd.to_numeric, errors='coerce').dropna()
+    except Exception as e:
+        return ticker, None, None, None, str(e)
+    dates = df.index.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    prices = df[['Open', 'Close', 'High', 'Low']].to_numpy(dtype='float64').round(6)
+    volumes = df['Volume'].to_numpy(dtype='float64').astype('int64')
+    return ticker, dates, prices, volumes, None
+
+
+def _rows(ticker: str, dates, prices, volumes) -> list:
+    return [
+        (ticker, date, open_price, close_price, high_price, low_price, volume)
+        for date, (open_price, close_price, high_price, low_price), volume
+        in zip(dates, prices.tolist(), volumes.tolist())
+    ]
+
+
+def _upsert_sql(connection) -> str:
+    quote = connection.ops.quote_name
+    fields = ['ticker', 'date'] + UPDATE_FIELDS
+    columns = [StockPriceHistory._meta.get_field(field).column for field in fields]
+    return (
+        f'INSERT INTO {quote(StockPriceHistory._meta.db_table)} ({", ".join(map(quote, columns))}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))}) '
+        f'ON CONFLICT ({quote(columns[0])}, {quote(columns[1])}) DO UPDATE SET '
+        + ', '.join(f'{quote(column)} = excluded.{quote(column)}' for column in columns[2:])
+    )
+
+
+def _insert(rows: list):
+    connection = connections['default']
+    with transaction.atomic():
+        if connection.vendor in ('sqlite', 'postgresql'):
+            # Plain parameter tuples skip building a model instance and Decimals per row
+            with connection.cursor() as cursor:
+                cursor.executemany(_upsert_sql(connection), rows)
+        else:
+            StockPriceHistory.objects.bulk_create(
+                [StockPriceHistory(ticker=ticker, date=date, open_price=open_price, close_price=close_price,
+                                   high_price=high_price, low_price=low_price, volume=volume)
+                 for ticker, date, open_price, close_price, high_price, low_price, volume in rows],
+                update_conflicts=True, unique_fields=['ticker', 'date'], update_fields=UPDATE_FIELDS,
+            )
+
+
+def load_price_history(files: list, workers: int = 1, batch_rows: int = 50_000) -> dict:
+    """
+    Parse and upsert the (ticker, path) files. Returns counts of files, rows and failures.
+    """
+    stats = {'files': 0, 'rows': 0, 'failed': {}, 'parse_seconds': 0.0, 'insert_seconds': 0.0}
+    if not files:
+        return stats
+    workers = max(1, min(workers, len(files)))
+
+    def flush(pending: list):
+        started = time.perf_counter()
+        _insert(pending)
+        stats['insert_seconds'] += time.perf_counter() - started
+        stats['rows'] += len(pending)
+
+    def consume(results):
+        pending = []
+        for ticker, dates, prices, volumes, error in results:
+            if error is not None:
+                logger.warning("Skipping %s: %s", ticker, error)
+                stats['failed'][ticker] = error
+                continue
+            stats['files'] += 1
+            pending.extend(_rows(ticker, dates, prices, volumes))
+            if len(pending) >= batch_rows:
+                flush(pending)
+                pending = []
+        if pending:
+            flush(pending)
+
+    started = time.perf_counter()
+    if workers == 1:
+        consume(parse_price_file(task) for task in files)
+    else:
+        # Workers only parse; the parent keeps the only database connection
+        connections.close_all()
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        chunksize = max(1, len(files) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            consume(executor.map(parse_price_file, files, chunksize=chunksize))
+    stats['parse_seconds'] = time.perf_counter() - started - stats['insert_seconds']
+    return stats
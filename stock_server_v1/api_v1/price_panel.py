@@ -0,0 +1,198 @@
+"""
+Consolidated dates x tickers price panel.
+
+All per-ticker price csvs of a directory (e.g. data/stock_historical_prices_2019-2024)
+are compiled into a single memory-mapped array next to that directory:
+
+    stock_historical_prices_2019-2024.panel/
+        panel.npy       float64 array of shape (2, n_dates, n_tickers):
+                        [0] close prices, [1] log returns of the close prices
+        index.json      written last; ticker -> column index, dates and source info
+
+Rows are dates and columns are tickers, so a date window of every ticker is a view of
+the mapped file (PricePanel.window); gathering a set of tickers copies just their
+columns of the window. Build it with `python manage.py build_price_panel`; a panel
+older than its price directory is not used until it is rebuilt.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from .data_registry import registry
+
+logger = logging.getLogger(__name__)
+
+PANEL_FORMAT_VERSION = 1
+PANEL_FILE = 'panel.npy'
+INDEX_FILE = 'index.json'
+CLOSE, LOG_RETURN = 0, 1
+
+# Source state of the price directory each panel was last reported out of date for
+_reported_stale = {}
+
+
+def panel_path_for(dir_path: str) -> str:
+    """
+    Default panel location next to the price directory, e.g. data/stock_historical_prices_2019-2024.panel
+    """
+    return os.path.normpath(str(dir_path)) + '.panel'
+
+
+def read_price_csv(file_path: str) -> pd.DataFrame:
+    """
+    Read one yfinance-style price csv, skipping the 3 header rows (header, ticker, date labels)
+    """
+    df = pd.read_csv(file_path, skiprows=3, names=['Date', 'Close', 'High', 'Low', 'Open', 'Volume'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df.set_index('Date')
+
+
+def build_panel(dir_path: str, panel_path: str = None) -> dict:
+    """
+    Read every <ticker>.csv in dir_path once and write the close and log-return matrices
+    """
+    panel_path = panel_path or panel_path_for(dir_path)
+    # Taken before reading, so a csv changed during the build makes the panel out of date
+    files_count, digest = source_state(dir_path)
+    files = sorted(glob.glob(os.path.join(dir_path, '*.csv')))
+
+    closes = []
+    for file_path in files:
+        ticker = os.path.splitext(os.path.basename(file_path))[0]
+        try:
+            closes.append(read_price_csv(file_path)['Close'].astype('float64').rename(ticker))
+        except Exception as e:
+            logger.warning("Skipping %s: %s", file_path, e)
+
+    # A single concat over all tickers, aligned on the union of their trading dates
+    df_close = pd.concat(closes, axis=1).sort_index() if closes else pd.DataFrame(dtype='float64')
+    df_close = df_close[~df_close.index.duplicated(keep='last')]
+    df_return = np.log(df_close).diff()
+
+    tmp_path = f'{panel_path}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    panel = np.lib.format.open_memmap(
+        os.path.join(tmp_path, PANEL_FILE), mode='w+', dtype='float64', shape=(2,) + df_close.shape
+    )
+    panel[CLOSE] = df_close.to_numpy()
+    panel[LOG_RETURN] = df_return.to_numpy()
+    panel.flush()
+    del panel
+
+    index = {
+        'format_version': PANEL_FORMAT_VERSION,
+        'tickers': {ticker: column for column, ticker in enumerate(df_close.columns)},
+        'dates': df_close.index.strftime('%Y-%m-%d').tolist(),
+        'source': {
+            'path': os.path.abspath(dir_path),
+            'files': files_count,
+            'digest': digest,
+        },
+        'built_at': time.time(),
+    }
+    with open(os.path.join(tmp_path, INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+
+    shutil.rmtree(panel_path, ignore_errors=True)
+    os.replace(tmp_path, panel_path)
+    return index
+
+
+class PricePanel:
+    """
+    Read-only view over a built panel. Instances are shared through the dataset registry.
+    """
+    def __init__(self, panel_path: str):
+        with open(os.path.join(panel_path, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        self.panel_path = panel_path
+        self.columns = index['tickers']
+        self.tickers = pd.Index(sorted(self.columns, key=self.columns.get))
+        self.dates = pd.DatetimeIndex(pd.to_datetime(index['dates']))
+        self.source = index.get('source', {})
+        self.data = np.load(os.path.join(panel_path, PANEL_FILE), mmap_mode='r')
+
+    def date_slice(self, start, end) -> slice:
+        """
+        Row slice covering start..end inclusive, like label slicing a DatetimeIndex
+        """
+        return self.dates.slice_indexer(pd.to_datetime(start), pd.to_datetime(end))
+
+    def window(self, kind: int, start, end) -> np.ndarray:
+        """
+        Zero-copy view of every ticker for the dates start..end
+        """
+        return self.data[kind, self.date_slice(start, end)]
+
+    def frame(self, kind: int, tickers: list, start, end) -> pd.DataFrame:
+        """
+        Dates x tickers frame for the window, a copy of those columns of the mapped file.
+        Tickers missing from the panel are all-NaN columns.
+        """
+        rows = self.date_slice(start, end)
+        positions = np.array([self.columns.get(ticker, -1) for ticker in tickers], dtype='int64')
+        present = positions >= 0
+        values = np.full((rows.stop - rows.start, len(tickers)), np.nan)
+        if present.any():
+            values[:, present] = self.data[kind, rows][:, positions[present]]
+        for ticker in np.asarray(tickers, dtype=object)[~present]:
+            logger.warning("Prices of %s do not exist in %s, let it be NaN", ticker, self.panel_path)
+        return pd.DataFrame(values, index=self.dates[rows], columns=list(tickers))
+
+    def closes(self, tickers: list, start, end) -> pd.DataFrame:
+        return self.frame(CLOSE, tickers, start, end)
+
+    def log_returns(self, tickers: list, start, end) -> pd.DataFrame:
+        """
+        Log returns within start..end. The first row of the window is dropped so the result
+        matches np.log(closes).diff() computed on the window alone.
+        """
+        return self.frame(LOG_RETURN, tickers, start, end).iloc[1:]
+
+
+def source_state(dir_path: str) -> tuple:
+    """
+    (number of csvs, digest of every csv's name, size and mtime_ns) of a price directory, from one
+    directory scan. Any replaced csv changes the digest, even one with an older or preserved mtime.
+    """
+    files = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns) for entry in os.scandir(dir_path)
+                   if entry.name.endswith('.csv') and entry.is_file())
+    digest = hashlib.blake2b(json.dumps(files).encode('utf-8'), digest_size=16).hexdigest()
+    return len(files), digest
+
+
+def is_panel_current(dir_path: str, panel: PricePanel) -> bool:
+    """
+    True if no price csv was added, removed or modified since the panel was built.
+    A missing directory means the panel is the only copy of the prices and is always used.
+    """
+    if not os.path.isdir(dir_path):
+        return True
+    state = source_state(dir_path)
+    if state == (panel.source.get('files'), panel.source.get('digest')):
+        return True
+    if _reported_stale.get(panel.panel_path) != state:
+        _reported_stale[panel.panel_path] = state
+        logger.warning("Price panel %s is out of date with %s, reading the csvs instead", panel.panel_path, dir_path)
+    return False
+
+
+def load_panel(dir_path: str):
+    """
+    Shared PricePanel for a price directory, or None if no current panel has been built for it
+    """
+    panel_path = panel_path_for(dir_path)
+    index_path = os.path.join(panel_path, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+    panel = registry.get(index_path, lambda: PricePanel(panel_path))
+    return panel if is_panel_current(dir_path, panel) else None
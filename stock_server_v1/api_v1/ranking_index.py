@@ -0,0 +1,118 @@
+"""
+Monthly ranking table for every indicator, built in one pass over the sentiment data.
+
+For each month (keyed by the first day of the month the posts were made in) and each
+indicator, every stock's aggregate and its rank within the month are precomputed with
+one grouped aggregation and one grouped rank. "Top N for month M under indicator I"
+is then a slice of a presorted array instead of a recompute.
+"""
+import hashlib
+import json
+
+import pandas as pd
+
+# Monthly aggregation per indicator
+AGG_MAP = {
+    'engagement_ratio': 'mean',
+    'total_sentiment': 'mean',
+    'comms_num': 'mean',
+    'score': 'mean',
+}
+
+# Everything besides the data that decides a ranking; part of the dataset version
+RANKING_PARAMS = {
+    'aggregation': AGG_MAP,
+    'rank_method': 'first',
+    'ascending': False,
+    'month_key': 'post_month',
+}
+
+
+def dataset_version(content_hash: str) -> str:
+    """
+    Version of the monthly rankings: the sentiment data content hash plus the ranking parameters.
+    Cached rankings are valid for exactly one version.
+    """
+    payload = json.dumps({'data': content_hash, 'ranking': RANKING_PARAMS}, sort_keys=True)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class MonthlyRankingIndex:
+    def __init__(self, df_sentiment: pd.DataFrame):
+        """
+        Aggregate df_sentiment (indexed by date, stock) per (month, stock) for all indicators
+        at once and rank stocks within each month (descending, ties broken by stock order like
+        rank(method='first') on the aggregated frame).
+        """
+        indicators = [indicator for indicator in AGG_MAP if indicator in df_sentiment.columns]
+        dates = df_sentiment.index.get_level_values('date')
+        months = pd.DatetimeIndex(dates.values.astype('datetime64[M]').astype('datetime64[ns]'), name='month')
+        stocks = df_sentiment.index.get_level_values('stock').rename('stock')
+
+        df_agg = (
+            df_sentiment[indicators]
+            .groupby([months, stocks])
+            .agg({indicator: AGG_MAP[indicator] for indicator in indicators})
+        )
+        # Missing aggregates get a NaN rank and are dropped below, like dropna() before ranking
+        df_rank = df_agg.groupby(level='month').rank(ascending=False, method='first')
+
+        self.indicators = indicators
+        self._tables = {}
+        for indicator in indicators:
+            table = pd.DataFrame({
+                'month': df_agg.index.get_level_values('month'),
+                'stock': df_agg.index.get_level_values('stock'),
+                'value': df_agg[indicator].to_numpy(),
+                'rank': df_rank[indicator].to_numpy(),
+            }).dropna(subset=['value', 'rank'])
+            table['rank'] = table['rank'].astype('int64')
+            table = table.sort_values(['month', 'rank'], kind='stable').reset_index(drop=True)
+            self._tables[indicator] = (
+                pd.DatetimeIndex(table['month']),
+                table['stock'].to_numpy(dtype=object),
+                table['value'].to_numpy(dtype='float64'),
+                table['rank'].to_numpy(dtype='int64'),
+            )
+
+    def months(self, indicator: str) -> pd.DatetimeIndex:
+        """
+        Months (first day) that have at least one ranked stock for the indicator
+        """
+        if indicator not in self._tables:
+            return pd.DatetimeIndex([])
+        return self._tables[indicator][0].unique()
+
+    def _bounds(self, indicator: str, month) -> tuple:
+        months = self._tables[indicator][0]
+        month = pd.Timestamp(month).normalize().replace(day=1)
+        return months.searchsorted(month, side='left'), months.searchsorted(month, side='right')
+
+    def top(self, indicator: str, month, n: int = None) -> list:
+        """
+        [(ticker, aggregate, rank), ...] for the month in rank order, limited to the top n
+        """
+        if indicator not in self._tables:
+            return []
+        start, stop = self._bounds(indicator, month)
+        if n is not None:
+            stop = min(stop, start + n)
+        _, stocks, values, ranks = self._tables[indicator]
+        return [(stocks[i], float(values[i]), int(ranks[i])) for i in range(start, stop)]
+
+    def top_frame(self, indicator: str, n: int) -> pd.DataFrame:
+        """
+        Top n stocks of every month as a frame indexed by (month, stock) with the indicator
+        aggregate and rank columns, stocks ordered alphabetically within each month
+        """
+        if indicator not in self._tables:
+            return pd.DataFrame()
+        months, stocks, values, ranks = self._tables[indicator]
+        selected = ranks <= n
+        df = pd.DataFrame({
+            'date': months[selected],
+            'stock': stocks[selected],
+            indicator: values[selected],
+            'rank': ranks[selected],
+        })
+        return df.sort_values(['date', 'stock'], kind='stable').set_index(['date', 'stock'])
@@ -0,0 +1,217 @@
+"""
+Incremental, checkpointed ingestion of subreddit submissions.
+
+Submissions are streamed from a PRAW-like client (anything with
+client.subreddit(name).new(limit=...) yielding objects with id, title, score,
+num_comments, selftext and created_utc) and appended to month-partitioned csv
+files in the same layout the scraper produced:
+
+    reddit_raw_data/
+        reddit_posts_<subreddit>_<YYYY-MM>.csv    one file per month of created_utc
+        .ingest/<subreddit>_checkpoint.json       newest created_utc ingested so far
+        .ingest/<subreddit>_seen_ids.txt          append-only index of ingested post ids
+        .ingest/<subreddit>_batch.json            sizes of the files a batch in progress appends to
+
+The listing is newest first, so a run stops at the first submission older than the
+checkpoint. The checkpoint only moves to the newest post when the run got back to it: a
+run cut short by --limit or by Reddit's listing cap (about 1000 posts) keeps the old
+checkpoint and warns about the gap, so the next run scans down to it again. Posts are deduplicated by id against the seen index, which is bootstrapped
+from the existing csv files the first time. Rows and ids are flushed in batches and the
+checkpoint only advances after a run completes, so an interrupted run is simply repeated.
+A batch journals the sizes of its csv files and the seen index before writing them; if
+a run dies between those writes, the next one truncates them back, so its rows are
+neither duplicated nor marked seen without being written.
+"""
+import csv
+import glob
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+POST_FIELDS = ['id', 'title', 'score', 'num_comments', 'body', 'created_utc']
+STATE_DIR = '.ingest'
+
+
+def month_of(created_utc: float) -> str:
+    return datetime.fromtimestamp(created_utc, tz=timezone.utc).strftime('%Y-%m')
+
+
+def monthly_file(output_dir: str, subreddit: str, month: str) -> str:
+    return os.path.join(output_dir, f'reddit_posts_{subreddit}_{month}.csv')
+
+
+def submission_to_post(submission) -> dict:
+    return {
+        'id': submission.id,
+        'title': submission.title,
+        'score': submission.score,
+        'num_comments': submission.num_comments,
+        'body': submission.selftext,
+        'created_utc': submission.created_utc,
+    }
+
+
+class IngestState:
+    """
+    Checkpoint and seen-id index of one subreddit
+    """
+
+    def __init__(self, output_dir: str, subreddit: str):
+        self.output_dir = output_dir
+        self.subreddit = subreddit
+        state_dir = os.path.join(output_dir, STATE_DIR)
+        self.checkpoint_path = os.path.join(state_dir, f'{subreddit}_checkpoint.json')
+        self.seen_path = os.path.join(state_dir, f'{subreddit}_seen_ids.txt')
+        self.batch_path = os.path.join(state_dir, f'{subreddit}_batch.json')
+        self.last_created_utc = self._read_checkpoint()
+        self._roll_back_batch()
+        self.seen = self._load_seen()
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                return json.load(f).get('last_created_utc')
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _load_seen(self) -> set:
+        if os.path.exists(self.seen_path):
+            with open(self.seen_path, 'r') as f:
+                return {line.strip() for line in f if line.strip()}
+        # First run against an existing data directory: index the ids already on disk
+        seen = set()
+        for path in glob.glob(os.path.join(self.output_dir, f'reddit_posts_{self.subreddit}_*.csv')):
+            try:
+                seen.update(pd.read_csv(path, usecols=['id'], dtype={'id': str})['id'].dropna())
+            except (ValueError, pd.errors.EmptyDataError) as e:
+                logger.warning("Skipping %s while indexing seen ids: %s", path, e)
+        os.makedirs(os.path.dirname(self.seen_path), exist_ok=True)
+        with open(self.seen_path, 'w') as f:
+            f.writelines(f'{post_id}\n' for post_id in sorted(seen))
+        logger.info("Indexed %d existing post ids for r/%s", len(seen), self.subreddit)
+        return seen
+
+    def _roll_back_batch(self):
+        try:
+            with open(self.batch_path, 'r') as f:
+                sizes = json.load(f)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError:
+            # Died while writing the journal, before any file was touched
+            os.remove(self.batch_path)
+            return
+        for path, size in sizes.items():
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+        os.remove(self.batch_path)
+        logger.warning("Rolled back an interrupted batch of r/%s (%d files)", self.subreddit, len(sizes))
+
+    def begin_batch(self, paths: list):
+        """
+        Journal the sizes of the files a batch appends to; end_batch() once they are all written
+        """
+        sizes = {path: os.path.getsize(path) if os.path.exists(path) else 0 for path in [*paths, self.seen_path]}
+        tmp_path = self.batch_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(sizes, f)
+        os.replace(tmp_path, self.batch_path)
+
+    def end_batch(self):
+        os.remove(self.batch_path)
+
+    def add_seen(self, post_ids: list):
+        with open(self.seen_path, 'a') as f:
+            f.writelines(f'{post_id}\n' for post_id in post_ids)
+        self.seen.update(post_ids)
+
+    def save_checkpoint(self, last_created_utc: float):
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_created_utc': last_created_utc,
+                       'updated_at': datetime.now(tz=timezone.utc).isoformat()}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.last_created_utc = last_created_utc
+
+
+def append_posts(output_dir: str, subreddit: str, posts: list) -> dict:
+    """
+    Append posts to their monthly csv files, oldest first. Returns {month: rows written}.
+    """
+    by_month = {}
+    for post in sorted(posts, key=lambda post: post['created_utc']):
+        by_month.setdefault(month_of(post['created_utc']), []).append(post)
+    for month, rows in by_month.items():
+        path = monthly_file(output_dir, subreddit, month)
+        write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=POST_FIELDS)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(rows)
+    return {month: len(rows) for month, rows in by_month.items()}
+
+
+def ingest(client, subreddit: str, output_dir: str, limit: int = None, batch_size: int = 500) -> dict:
+    """
+    Fetch submissions newer than the checkpoint and append the unseen ones.
+    Returns a summary with fetched, written, duplicates, months, checkpoint and complete (whether
+    the scan reached the previous checkpoint).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state = IngestState(output_dir, subreddit)
+    since = state.last_created_utc
+    summary = {'fetched': 0, 'written': 0, 'duplicates': 0, 'months': {}}
+    newest = since
+    oldest = None
+    reached_checkpoint = since is None
+    batch = []
+
+    def flush():
+        state.begin_batch(sorted({monthly_file(output_dir, subreddit, month_of(post['created_utc'])) for post in batch}))
+        for month, count in append_posts(output_dir, subreddit, batch).items():
+            summary['months'][month] = summary['months'].get(month, 0) + count
+        state.add_seen([post['id'] for post in batch])
+        state.end_batch()
+        summary['written'] += len(batch)
+        batch.clear()
+
+    for submission in client.subreddit(subreddit).new(limit=limit):
+        # Posts created in the checkpoint second may not all have been seen, the id index settles those
+        if since is not None and submission.created_utc <= since:
+            reached_checkpoint = True
+            if submission.created_utc < since:
+                break
+        summary['fetched'] += 1
+        if newest is None or submission.created_utc > newest:
+            newest = submission.created_utc
+        if oldest is None or submission.created_utc < oldest:
+            oldest = submission.created_utc
+        if submission.id in state.seen:
+            summary['duplicates'] += 1
+            continue
+        # Listings can shift while paging, do not write a post twice in the same run
+        state.seen.add(submission.id)
+        batch.append(submission_to_post(submission))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if reached_checkpoint and newest is not None and newest != since:
+        state.save_checkpoint(newest)
+    elif not reached_checkpoint:
+        logger.warning("r/%s: the listing ended before the checkpoint, posts between %s and %s may be missing; "
+                       "keeping the checkpoint", subreddit, since, oldest)
+    summary['complete'] = reached_checkpoint
+    summary['checkpoint'] = state.last_created_utc
+    logger.info("r/%s: fetched %d, wrote %d new, skipped %d seen posts",
+                subreddit, summary['fetched'], summary['written'], summary['duplicates'])
+    return summary
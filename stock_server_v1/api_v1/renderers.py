@@ -0,0 +1,68 @@
+"""
+Response layouts and encodings for the chart series of the API.
+
+Layout (?format=): 'records' (default) is one dict per day, as the dashboard has
+always read it; 'columnar' is a shared date array plus one float array per series:
+
+    {"dates": ["2021-03-01", ...], "series": {"portfolio_return": [...], "QQQ": [...]}}
+
+Encoding is negotiated separately from the Accept header: JSON, or MessagePack with
+Accept: application/msgpack. LayoutContentNegotiation keeps ?format=columnar from
+being taken for a renderer name. Compression is left to GZipMiddleware.
+"""
+import msgpack
+import numpy as np
+import pandas as pd
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+LAYOUTS = ('records', 'columnar')
+
+
+def parse_layout(query_params) -> str:
+    layout = query_params.get('format', 'records')
+    # Any other format is a renderer name (?format=json), served in the default layout
+    return layout if layout in LAYOUTS else 'records'
+
+
+def frame_records(df: pd.DataFrame) -> list:
+    """
+    One dict per row of a date-indexed frame, the date under the index name, NaN as None
+    """
+    df = df.set_axis(df.index.strftime('%Y-%m-%d').rename(df.index.name))
+    return df.reset_index().replace({np.nan: None}).to_dict(orient='records')
+
+
+def frame_columns(df: pd.DataFrame) -> dict:
+    """
+    {'dates': [...], 'series': {column: [...]}} of a date-indexed frame, NaN as None
+    """
+    series = {}
+    for column in df.columns:
+        values = df[column].to_numpy(dtype='float64')
+        missing = np.isnan(values)
+        series[column] = values.tolist() if not missing.any() else np.where(missing, None, values).tolist()
+    return {'dates': df.index.strftime('%Y-%m-%d').tolist(), 'series': series}
+
+
+class LayoutContentNegotiation(DefaultContentNegotiation):
+    """
+    Treats ?format=records|columnar as a layout, so the renderer comes from the Accept header
+    """
+
+    def filter_renderers(self, renderers, format):
+        if format in LAYOUTS:
+            return renderers
+        return super().filter_renderers(renderers, format)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True, default=str)
@@ -0,0 +1,297 @@
+"""
+Batched, deduplicated sentiment scoring of Reddit titles and bodies.
+
+Replaces the per-text get_sentiment_score / sentiment_score loops of the sentiment
+notebooks. For each text column:
+
+1. texts are hashed (blake2b) and identical texts are scored once
+2. hashes already in the persistent score cache, keyed by (scorer key, text hash),
+   are not scored again, so adding a month of posts only scores the new texts
+3. the remaining texts are sorted by length and cut into batches, so each model call
+   pads to similar lengths
+4. batches are spread over a process pool; every worker loads the model once
+
+Scorers share one interface (key, empty_score, score_batch) and are registered in
+SCORERS: 'stanza' and 'transformer' wrap the models used in the notebooks, 'lexicon'
+is a dependency-free CPU fallback. Scores follow the notebooks' three-class scale
+(0 negative, 1 neutral, 2 positive); empty texts get the scorer's empty_score.
+
+The output columns are <column>_<scorer>_sentiment (e.g. title_stanza_sentiment,
+body_stanza_sentiment), which RedditSentimentData sums into total_sentiment.
+"""
+import abc
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+NEGATIVE, NEUTRAL, POSITIVE = 0, 1, 2
+
+
+class Scorer(abc.ABC):
+    """
+    Scores a batch of non-empty texts. key identifies the model (and its version) in the score cache.
+    """
+    name = None
+    empty_score = 0.0
+
+    @property
+    def key(self) -> str:
+        return self.name
+
+    @abc.abstractmethod
+    def score_batch(self, texts: list) -> list:
+        pass
+
+
+class LexiconScorer(Scorer):
+    """
+    Word-list scorer: more positive than negative words is positive, the reverse negative.
+    Needs no model, used as a CPU fallback and in tests.
+    """
+    name = 'lexicon'
+    POSITIVE_WORDS = frozenset("""
+        bull bullish buy buying calls moon mooning rocket gain gains green up profit profits
+        long hold hodl tendies rally beat beats strong good great love win winning squeeze
+        soar soaring undervalued upside breakout rip
+    """.split())
+    NEGATIVE_WORDS = frozenset("""
+        bear bearish sell selling puts crash crashing dump dumping loss losses red down short
+        drop drops fall falling weak bad worst hate lose losing bagholder bagholding overvalued
+        downside tank tanking rug bankrupt fraud
+    """.split())
+    WORD_PATTERN = re.compile(r"[a-z']+")
+
+    @property
+    def key(self) -> str:
+        return f'{self.name}:{len(self.POSITIVE_WORDS)}:{len(self.NEGATIVE_WORDS)}'
+
+    def score_batch(self, texts: list) -> list:
+        scores = []
+        for text in texts:
+            words = self.WORD_PATTERN.findall(text.lower())
+            balance = sum(word in self.POSITIVE_WORDS for word in words) - sum(word in self.NEGATIVE_WORDS for word in words)
+            scores.append(POSITIVE if balance > 0 else NEGATIVE if balance < 0 else NEUTRAL)
+        return scores
+
+
+class StanzaScorer(Scorer):
+    """
+    Stanza sentiment of the first sentence, as in sentiment_analysis_stanza.ipynb.
+    Texts of a batch go through the pipeline in one bulk_process call; if that fails the batch
+    is scored text by text, and a text that fails on its own scores None like in the notebook.
+    """
+    name = 'stanza'
+
+    def __init__(self, lang: str = 'en'):
+        import stanza
+        self.stanza = stanza
+        self.lang = lang
+        self.nlp = stanza.Pipeline(lang, processors='tokenize,sentiment', verbose=False)
+
+    @property
+    def key(self) -> str:
+        return f'{self.name}:{self.lang}:{self.stanza.__version__}'
+
+    def score_batch(self, texts: list) -> list:
+        try:
+            docs = self.nlp.bulk_process([self.stanza.Document([], text=text) for text in texts])
+        except Exception as e:
+            logger.warning("Stanza failed on a batch of %d texts, scoring them one by one: %s", len(texts), e)
+            return [self.score_text(text) for text in texts]
+        return [doc.sentences[0].sentiment if doc.sentences else None for doc in docs]
+
+    def score_text(self, text: str):
+        try:
+            doc = self.nlp(text)
+        except Exception as e:
+            logger.warning("Stanza failed on a text of %d characters: %s", len(text), e)
+            return None
+        return doc.sentences[0].sentiment if doc.sentences else None
+
+
+class TransformerScorer(Scorer):
+    """
+    Argmax class of a Hugging Face sequence classification model, as in
+    sentiment_analysis_huggingface.ipynb, with one padded forward pass per batch
+    """
+    name = 'transformer'
+    DEFAULT_MODEL = 'cardiffnlp/twitter-roberta-base-sentiment'
+
+    def __init__(self, model: str = DEFAULT_MODEL, max_length: int = 512):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        self.torch = torch
+        self.model_name = model
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model)
+        self.model.eval()
+
+    @property
+    def key(self) -> str:
+        return f'{self.name}:{self.model_name}:{self.max_length}'
+
+    @staticmethod
+    def preprocess(text: str) -> str:
+        # Username and link placeholders
+        return ' '.join('@user' if t.startswith('@') and len(t) > 1 else 'http' if t.startswith('http') else t
+                        for t in text.split(' '))
+
+    def score_batch(self, texts: list) -> list:
+        encoded = self.tokenizer([self.preprocess(text) for text in texts], return_tensors='pt',
+                                 padding=True, truncation=True, max_length=self.max_length)
+        with self.torch.no_grad():
+            logits = self.model(**encoded).logits
+        return logits.argmax(dim=-1).tolist()
+
+
+SCORERS = {
+    LexiconScorer.name: LexiconScorer,
+    StanzaScorer.name: StanzaScorer,
+    TransformerScorer.name: TransformerScorer,
+}
+
+
+def get_scorer(name: str, **options) -> Scorer:
+    if name not in SCORERS:
+        raise ValueError(f"Unknown scorer '{name}'. Available: {list(SCORERS)}")
+    return SCORERS[name](**options)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ScoreCache:
+    """
+    Persistent scores keyed by (scorer key, text hash) in a SQLite file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS scores ('
+                         'scorer TEXT NOT NULL, hash TEXT NOT NULL, score REAL, PRIMARY KEY (scorer, hash))')
+
+    def get_many(self, scorer_key: str, hashes: list, chunk_size: int = 900) -> dict:
+        found = {}
+        with sqlite3.connect(self.path) as conn:
+            for start in range(0, len(hashes), chunk_size):
+                chunk = hashes[start:start + chunk_size]
+                rows = conn.execute(
+                    f'SELECT hash, score FROM scores WHERE scorer = ? AND hash IN ({",".join("?" * len(chunk))})',
+                    [scorer_key, *chunk],
+                )
+                found.update(rows)
+        return found
+
+    def put_many(self, scorer_key: str, scores: dict):
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany('INSERT OR REPLACE INTO scores (scorer, hash, score) VALUES (?, ?, ?)',
+                             [(scorer_key, h, score) for h, score in scores.items()])
+
+
+def length_batches(texts: list, batch_size: int) -> list:
+    """
+    Positions of texts grouped into batches of similar length
+    """
+    order = np.argsort([len(text) for text in texts], kind='stable')
+    return [order[start:start + batch_size].tolist() for start in range(0, len(order), batch_size)]
+
+
+# Per-process scorer of the pool workers
+_worker_scorer = None
+
+
+def _init_worker(name: str, options: dict):
+    global _worker_scorer
+    _worker_scorer = get_scorer(name, **options)
+
+
+def _score_in_worker(texts: list) -> list:
+    return _worker_scorer.score_batch(texts)
+
+
+class ScoringPipeline:
+    def __init__(self, scorer_name: str = 'lexicon', scorer_options: dict = None, cache_path: str = None,
+                 batch_size: int = 64, workers: int = 1):
+        """
+        scorer_name/scorer_options select the scorer from SCORERS; each pool worker builds its own.
+        cache_path: SQLite file of the persistent score cache, None to score everything.
+        """
+        self.scorer_name = scorer_name
+        self.scorer_options = scorer_options or {}
+        self.scorer = get_scorer(scorer_name, **self.scorer_options)
+        self.cache = ScoreCache(cache_path) if cache_path else None
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.stats = {'texts': 0, 'unique': 0, 'cached': 0, 'scored': 0}
+
+    def _score_unique(self, texts: list) -> list:
+        position_batches = length_batches(texts, self.batch_size)
+        batches = [[texts[i] for i in batch] for batch in position_batches]
+        positions = [i for batch in position_batches for i in batch]
+        if self.workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(batches)), initializer=_init_worker,
+                                     initargs=(self.scorer_name, self.scorer_options)) as executor:
+                results = list(executor.map(_score_in_worker, batches))
+        else:
+            results = [self.scorer.score_batch(batch) for batch in batches]
+
+        scores = [None] * len(texts)
+        for position, score in zip(positions, (score for batch in results for score in batch)):
+            scores[position] = score
+        return scores
+
+    def score_texts(self, texts: pd.Series) -> np.ndarray:
+        """
+        Score of every text as a float array aligned with texts; NaN/empty texts get empty_score
+        """
+        texts = texts.fillna('').astype(str)
+        non_empty = texts.str.strip() != ''
+        scores = np.full(len(texts), self.scorer.empty_score, dtype='float64')
+        if not non_empty.any():
+            return scores
+
+        present = texts[non_empty]
+        hashes = present.map(text_hash)
+        unique_hashes = pd.unique(hashes.to_numpy())
+        first_text = present.groupby(hashes.to_numpy(), sort=False).first()
+
+        known = self.cache.get_many(self.scorer.key, list(unique_hashes)) if self.cache else {}
+        missing = [h for h in unique_hashes if h not in known]
+        if missing:
+            new_scores = self._score_unique(first_text.loc[missing].tolist())
+            new = dict(zip(missing, (np.nan if score is None else float(score) for score in new_scores)))
+            if self.cache:
+                self.cache.put_many(self.scorer.key, new)
+            known.update(new)
+
+        self.stats['texts'] += len(texts)
+        self.stats['unique'] += len(unique_hashes)
+        self.stats['cached'] += len(unique_hashes) - len(missing)
+        self.stats['scored'] += len(missing)
+
+        scores[non_empty.to_numpy()] = hashes.map(known).astype('float64').to_numpy()
+        return scores
+
+    def score_frame(self, df: pd.DataFrame, text_columns: tuple = ('title', 'body')) -> pd.DataFrame:
+        """
+        Copy of df with a <column>_<scorer>_sentiment column per text column
+        """
+        df = df.copy()
+        for column in text_columns:
+            if column in df.columns:
+                df[f'{column}_{self.scorer_name}_sentiment'] = self.score_texts(df[column])
+        return df
@@ -0,0 +1,169 @@
+"""
+Columnar on-disk store for the Reddit sentiment dataset.
+
+The store is a directory of NumPy .npy files (one per column) that can be
+memory-mapped, plus a manifest describing the columns and the source CSV. The store
+path is a symlink to the directory of the latest build, replaced atomically by the next
+build, so readers always see one complete store:
+
+    reddit_sentiment_data.store/
+        manifest.json       written last, marks the store as complete
+        stocks.json         dictionary for the stock codes
+        dates.npy           sorted unique dates, int64 nanoseconds since epoch
+        date.npy            int32 codes into dates.npy
+        stock.npy           int32 codes into stocks.json
+        <indicator>.npy     one file per indicator column
+
+Dates are stored as codes like the stocks, so loading builds the index from the saved
+levels and codes, and the indicator columns stay memory-mapped in the loaded frame.
+
+Only the columns used by the indicators are kept, so title/body text is never parsed
+at request time. Build it with `python manage.py build_sentiment_store`.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from .data_registry import DatasetRegistry, registry
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT_VERSION = 2
+MANIFEST_FILE = 'manifest.json'
+STOCKS_FILE = 'stocks.json'
+INDICATOR_COLUMNS = ['total_sentiment', 'engagement_ratio', 'comms_num', 'score']
+
+# (mtime_ns, size) of the csv each store was last reported out of date for
+_reported_stale = {}
+
+
+def store_path_for(csv_path: str) -> str:
+    """
+    Default store location next to the csv, e.g. data/reddit_sentiment_data.store
+    """
+    return os.path.splitext(csv_path)[0] + '.store'
+
+
+def manifest_path(store_path: str) -> str:
+    return os.path.join(store_path, MANIFEST_FILE)
+
+
+def _source_info(csv_path: str, with_hash: bool = True) -> dict:
+    st = os.stat(csv_path)
+    info = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if with_hash:
+        info['hash'] = DatasetRegistry.file_hash(csv_path)
+    return info
+
+
+def read_manifest(store_path: str):
+    try:
+        with open(manifest_path(store_path), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def is_store_current(csv_path: str, store_path: str) -> bool:
+    """
+    True if the store exists and was built from the current content of csv_path.
+    A missing csv means the store is the only copy of the data and is always used.
+    """
+    manifest = read_manifest(store_path)
+    if manifest is None or manifest.get('format_version') != STORE_FORMAT_VERSION:
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    source = manifest.get('source', {})
+    current = _source_info(csv_path, with_hash=False)
+    if current['mtime_ns'] == source.get('mtime_ns') and current['size'] == source.get('size'):
+        return True
+    # Touched, copied or modified: fall back to comparing content, hashed once per mtime/size
+    if current['size'] == source.get('size') and registry.fingerprint(csv_path) == source.get('hash'):
+        return True
+    stat_key = (current['mtime_ns'], current['size'])
+    if _reported_stale.get(store_path) != stat_key:
+        _reported_stale[store_path] = stat_key
+        logger.warning("Sentiment store %s is out of date with %s, reading the csv instead", store_path, csv_path)
+    return False
+
+
+def build_store(df: pd.DataFrame, csv_path: str, store_path: str = None) -> dict:
+    """
+    Write a prepared sentiment frame (indexed by date, stock) as a columnar store.
+    The store is written to a new build directory and the store symlink swapped to it once complete.
+    """
+    store_path = store_path or store_path_for(csv_path)
+    parent, name = os.path.split(os.path.abspath(store_path))
+    tmp_path = tempfile.mkdtemp(prefix=f'{name}.', dir=parent)
+    os.chmod(tmp_path, 0o755)  # mkdtemp makes it private to the builder
+
+    date_codes, dates = pd.factorize(df.index.get_level_values('date'), sort=True)
+    stock_codes, stocks = pd.factorize(df.index.get_level_values('stock'), sort=True)
+
+    np.save(os.path.join(tmp_path, 'dates.npy'), dates.values.astype('datetime64[ns]').view('int64'))
+    np.save(os.path.join(tmp_path, 'date.npy'), date_codes.astype('int32'))
+    np.save(os.path.join(tmp_path, 'stock.npy'), stock_codes.astype('int32'))
+    columns = {}
+    for column in INDICATOR_COLUMNS:
+        values = df[column].to_numpy()
+        np.save(os.path.join(tmp_path, f'{column}.npy'), values)
+        columns[column] = str(values.dtype)
+
+    with open(os.path.join(tmp_path, STOCKS_FILE), 'w') as f:
+        json.dump([str(stock) for stock in stocks], f)
+
+    manifest = {
+        'format_version': STORE_FORMAT_VERSION,
+        'rows': int(len(df)),
+        'columns': columns,
+        'source': dict(path=os.path.abspath(csv_path), **_source_info(csv_path)),
+        'built_at': time.time(),
+    }
+    with open(manifest_path(tmp_path), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Point the store at the new build in one rename, then remove the previous build
+    previous = os.path.realpath(store_path) if os.path.islink(store_path) else None
+    if os.path.isdir(store_path) and previous is None:
+        shutil.rmtree(store_path)  # a store built before stores were symlinked
+    link_path = f'{tmp_path}.link'
+    os.symlink(os.path.basename(tmp_path), link_path)
+    os.replace(link_path, store_path)
+    if previous and previous != tmp_path:
+        shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+def load_store(store_path: str) -> pd.DataFrame:
+    """
+    Load the store into a dataframe indexed by (date, stock), the same shape
+    RedditSentimentData.load_sentiment_data returns. The indicator columns are the
+    memory-mapped (read-only) column files; only the index codes are copied.
+    """
+    # Every file comes from the same build, even if a new one is swapped in meanwhile
+    store_path = os.path.realpath(store_path)
+    manifest = read_manifest(store_path)
+    if manifest is None:
+        raise FileNotFoundError(f'No sentiment store found at {store_path}')
+
+    with open(os.path.join(store_path, STOCKS_FILE), 'r') as f:
+        stocks = json.load(f)
+
+    def column(name):
+        # A plain ndarray view of the mapped file, so pandas treats it like any other column
+        return np.load(os.path.join(store_path, f'{name}.npy'), mmap_mode='r').view(np.ndarray)
+
+    index = pd.MultiIndex(
+        levels=[pd.DatetimeIndex(column('dates').view('datetime64[ns]')), pd.Index(stocks, dtype=object)],
+        codes=[column('date'), column('stock')],
+        names=['date', 'stock'],
+        verify_integrity=False,
+    )
+    return pd.DataFrame({name: column(name) for name in manifest['columns']}, index=index, copy=False)
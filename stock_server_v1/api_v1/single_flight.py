@@ -0,0 +1,175 @@
+"""
+Single-flight coalescing of identical expensive requests.
+
+SingleFlight.do(key, fn) runs fn once per key at a time:
+
+- callers in the same process that arrive while the key is in flight wait for the
+  running call, however long the leader takes, and share its result (or its exception);
+- across worker processes the leader holds an flock on the key's lock file in
+  SINGLE_FLIGHT_LOCK_DIR. A leader in another process waits for that lock and then runs
+  fn itself, by which time fn finds the first leader's work in the caches. Keys are
+  hashed into LOCK_BUCKETS lock files, so the directory stays bounded however many
+  distinct queries arrive; keys sharing a bucket only wait for each other across processes.
+
+If the file lock cannot be taken within the timeout the leader runs anyway, so a stuck
+process slows duplicates down but never blocks them for good. Platforms without
+fcntl only coalesce within a process.
+
+AsyncSingleFlight is the in-process half for async views: concurrent callers of a key on
+the same event loop await one task.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import instrumentation
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 0.05
+# Number of lock files keys are spread over
+LOCK_BUCKETS = 1024
+
+
+def request_key(name: str, params) -> str:
+    """
+    Key of a request from its endpoint name and query parameters, independent of parameter order
+    """
+    items = sorted((key, tuple(values)) for key, values in params.lists())
+    return f'{name}?' + '&'.join(f'{key}={",".join(values)}' for key, values in items)
+
+
+@contextmanager
+def file_lock(path: str, timeout: float):
+    """
+    Exclusive flock on path, polled until timeout; yields whether the lock was taken.
+    timeout=0 only tries once.
+    """
+    if fcntl is None:
+        yield False
+        return
+    with open(path, 'a') as lock_file:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    if timeout > 0:
+                        logger.warning("Timed out waiting for %s, running without the lock", path)
+                    yield False
+                    return
+                time.sleep(POLL_SECONDS)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _count(flight: str, role: str):
+    if flight:
+        instrumentation.registry.inc('stock_server_single_flight_total', {'flight': flight, 'role': role})
+
+
+class SingleFlight:
+    def __init__(self, lock_dir: str = None, timeout: float = None, name: str = None):
+        """
+        lock_dir/timeout default to SINGLE_FLIGHT_LOCK_DIR and SINGLE_FLIGHT_TIMEOUT_SECONDS;
+        a named flight counts its leaders and shared calls in the metrics registry
+        """
+        self.name = name
+        self._lock_dir = lock_dir
+        self._timeout = timeout
+        self._calls = {}
+        self._guard = threading.Lock()
+        self.stats = {'leaders': 0, 'shared': 0}
+
+    @property
+    def lock_dir(self) -> str:
+        return str(self._lock_dir or settings.SINGLE_FLIGHT_LOCK_DIR)
+
+    @property
+    def timeout(self) -> float:
+        return self._timeout if self._timeout is not None else settings.SINGLE_FLIGHT_TIMEOUT_SECONDS
+
+    def lock_path(self, key: str) -> str:
+        bucket = int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16) % LOCK_BUCKETS
+        return os.path.join(self.lock_dir, f'{bucket:04d}.lock')
+
+    def do(self, key: str, fn):
+        """
+        Result of fn, computed once for all concurrent callers of key in this process
+        """
+        with self._guard:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats['leaders'] += 1
+            else:
+                self.stats['shared'] += 1
+        _count(self.name, 'leader' if leader else 'shared')
+
+        if not leader:
+            # The leader always finishes or raises, after at most the lock timeout plus fn itself
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            with file_lock(self.lock_path(key), self.timeout):
+                call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._guard:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    def __init__(self, name: str = None):
+        self.name = name
+        self._tasks = {}
+        self.stats = {'leaders': 0, 'shared': 0}
+
+    async def do(self, key: str, fn):
+        """
+        Result of await fn(), computed once for all concurrent callers of key on this event loop
+        """
+        # Tasks belong to one loop; under WSGI every async request runs its own
+        task_key = (id(asyncio.get_running_loop()), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = self._tasks[task_key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+            self.stats['leaders'] += 1
+            _count(self.name, 'leader')
+        else:
+            self.stats['shared'] += 1
+            _count(self.name, 'shared')
+        # A caller that is cancelled does not cancel the others' computation
+        return await asyncio.shield(task)
@@ -1,3 +1,1287 @@
-from django.test import TestCase
+import asyncio
+import fnmatch
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import msgpack
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api_v1 import (backtest, reddit_ingest, monthly_aggregates, price_history_loader, downsampling, renderers, news_cache,
+                    single_flight, cache_maintenance, cache_backends, instrumentation, sentiment_store, price_panel,
+                    portfolio_engine)
+from api_v1.models import (StockPriceHistory, NewsCache, NewsArticle, MonthlyIndicatorCache,
+                           MonthlyIndicatorScore, MonthlyStockAggregate)
+from api_v1.data_registry import DatasetRegistry
+from api_v1.views import NewsViewSet
+from api_v1.management.commands.cleanup_news_cache import Command as CleanupCommand
+from api_v1.management.commands.warm_caches import Command as WarmCachesCommand
+from api_v1.async_views import AsyncNewsView
+from api_v1.ranking_index import MonthlyRankingIndex, AGG_MAP
+from api_v1.RedditSentimentData import RedditSentimentData
+from api_v1.sentiment_scoring import Scorer, ScoringPipeline, StanzaScorer
+from api_v1.ticker_extractor import TickerExtractor, attach_tickers
+
+
+class DatasetRegistryTests(SimpleTestCase):
+    def setUp(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        self.path = os.path.join(data_dir, 'data.csv')
+        self.registry = DatasetRegistry()
+        self.loads = 0
+        self.write('a\n1\n', mtime=1_600_000_000)
+
+    def write(self, text, mtime):
+        with open(self.path, 'w') as f:
+            f.write(text)
+        os.utime(self.path, (mtime, mtime))
+
+    def load(self):
+        self.loads += 1
+        with open(self.path) as f:
+            return f.read()
+
+    def test_reloads_only_when_the_content_changes(self):
+        first = self.registry.get(self.path, self.load)
+        self.registry.get_derived(self.path, 'upper', first.upper)
+        # Touched: new mtime, same content
+        os.utime(self.path, (1_600_000_100, 1_600_000_100))
+        self.assertIs(self.registry.get(self.path, self.load), first)
+        self.assertEqual(self.loads, 1)
+
+        self.write('a\n2\n', mtime=1_600_000_200)
+        second = self.registry.get(self.path, self.load)
+
+        self.assertEqual((second, self.loads), ('a\n2\n', 2))
+        self.assertEqual(self.registry.get_derived(self.path, 'upper', second.upper), 'A\n2\n')
+        stats = self.registry.stats(self.path)
+        self.assertEqual((stats['hits'], stats['misses'], stats['reloads']), (1, 2, 1))
+        self.assertEqual(stats['version'], DatasetRegistry.file_hash(self.path))
+
+    def test_fingerprint_follows_the_content_without_loading(self):
+        before = self.registry.fingerprint(self.path)
+        self.write('a\n2\n', mtime=1_600_000_200)
+
+        self.assertNotEqual(self.registry.fingerprint(self.path), before)
+        self.assertEqual(self.registry.fingerprint(self.path), DatasetRegistry.file_hash(self.path))
+        self.assertIsNone(self.registry.version(self.path))
+        self.assertEqual(self.loads, 0)
+
+
+def write_sentiment_csv(path, rows, mtime=1_600_000_000):
+    pd.DataFrame(rows, columns=['date', 'stock', 'score', 'comms_num', 'title_sentiment', 'body_sentiment']).to_csv(
+        path, index=False)
+    os.utime(path, (mtime, mtime))
+
+
+SENTIMENT_ROWS = [
+    ('2021-01-05', 'GME', 10, 5, 2, 1), ('2021-01-20', 'AMC', 4, 8, 0, 1), ('2021-01-21', 'BB', 4, 8, 0, 1),
+    ('2021-02-03', 'GME', 3, 1, 1, 1), ('2021-02-10', 'BB', 7, 7, 2, 2), ('2021-02-11', 'AMC', 0, 3, 1, 0),
+]
+
+
+class SentimentStoreTests(SimpleTestCase):
+    def setUp(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        self.csv_path = os.path.join(data_dir, 'reddit_sentiment_data.csv')
+        self.store_path = sentiment_store.store_path_for(self.csv_path)
+        write_sentiment_csv(self.csv_path, SENTIMENT_ROWS)
+        call_command('build_sentiment_store', source=self.csv_path, stdout=StringIO())
+
+    def test_store_loads_the_same_frame_as_the_csv(self):
+        stored = sentiment_store.load_store(self.store_path)
+        parsed = RedditSentimentData.read_sentiment_csv(self.csv_path)
+
+        pd.testing.assert_frame_equal(stored, parsed[sentiment_store.INDICATOR_COLUMNS], check_dtype=False)
+        # Columns are the read-only mapped files, not copies
+        self.assertFalse(any(stored[name].to_numpy().flags.writeable for name in sentiment_store.INDICATOR_COLUMNS))
+        self.assertEqual(RedditSentimentData(self.csv_path).source_path(), sentiment_store.manifest_path(self.store_path))
+
+    def test_touched_csv_is_hashed_once_and_changed_csv_falls_back_until_rebuilt(self):
+        os.utime(self.csv_path, (1_600_000_100, 1_600_000_100))
+        with mock.patch.object(DatasetRegistry, 'file_hash', wraps=DatasetRegistry.file_hash) as file_hash:
+            for _ in range(3):
+                self.assertTrue(sentiment_store.is_store_current(self.csv_path, self.store_path))
+        self.assertEqual(file_hash.call_count, 1)
+
+        write_sentiment_csv(self.csv_path, SENTIMENT_ROWS + [('2021-02-12', 'NOK', 5, 5, 1, 1)], mtime=1_600_000_200)
+        with self.assertLogs('api_v1.sentiment_store', 'WARNING') as logs:
+            self.assertFalse(sentiment_store.is_store_current(self.csv_path, self.store_path))
+            self.assertFalse(sentiment_store.is_store_current(self.csv_path, self.store_path))
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(len(RedditSentimentData(self.csv_path, use_cache=False).df_sentiment), 7)
+
+        call_command('build_sentiment_store', source=self.csv_path, stdout=StringIO())
+        self.assertTrue(sentiment_store.is_store_current(self.csv_path, self.store_path))
+        self.assertEqual(len(sentiment_store.load_store(self.store_path)), 7)
+        # Only the latest build is kept
+        builds = [name for name in os.listdir(os.path.dirname(self.csv_path)) if name.startswith('reddit_sentiment_data.store.')]
+        self.assertEqual(builds, [os.path.basename(os.path.realpath(self.store_path))])
+
+
+class PricePanelTests(SimpleTestCase):
+    def setUp(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        self.price_dir = os.path.join(data_dir, 'prices')
+        os.makedirs(self.price_dir)
+        self.write('GME', [('2021-01-04', 17.25, 10), ('2021-01-05', 17.37, 11), ('2021-01-06', 18.36, 12)])
+        self.write('AMC', [('2021-01-04', 2.01, 20), ('2021-01-06', 2.05, 21)])
+        call_command('build_price_panel', source=self.price_dir, stdout=StringIO())
+
+    def write(self, ticker, rows, mtime=1_600_000_000):
+        path = os.path.join(self.price_dir, f'{ticker}.csv')
+        write_price_csv(path, ticker, rows)
+        os.utime(path, (mtime, mtime))
+
+    def test_panel_matches_the_csvs(self):
+        panel = price_panel.load_panel(self.price_dir)
+        closes = panel.closes(['AMC', 'GME', 'NOPE'], '2021-01-04', '2021-01-06')
+
+        self.assertEqual(closes['GME'].tolist(), [17.25, 17.37, 18.36])
+        self.assertTrue(np.isnan(closes['AMC'].iloc[1]) and closes['NOPE'].isna().all())
+        expected = np.log(pd.concat([price_panel.read_price_csv(os.path.join(self.price_dir, f'{ticker}.csv'))['Close']
+                                     .rename(ticker) for ticker in ['GME', 'AMC']], axis=1)).diff()
+        pd.testing.assert_frame_equal(panel.log_returns(['GME', 'AMC'], '2021-01-04', '2021-01-06'),
+                                      expected.loc['2021-01-05':], check_names=False, check_freq=False)
+
+    def test_changed_price_directory_falls_back_until_rebuilt(self):
+        self.write('BB', [('2021-01-04', 10.0, 1)], mtime=1_600_000_100)
+        with self.assertLogs('api_v1.price_panel', 'WARNING'):
+            self.assertIsNone(price_panel.load_panel(self.price_dir))
+
+        call_command('build_price_panel', source=self.price_dir, stdout=StringIO())
+        self.assertEqual(price_panel.load_panel(self.price_dir).closes(['BB'], '2021-01-04', '2021-01-04')['BB'].tolist(),
+                         [10.0])
+
+        self.write('GME', [('2021-01-04', 20.0, 10)], mtime=1_600_000_200)
+        self.assertIsNone(price_panel.load_panel(self.price_dir))
+
+    def test_csv_replaced_with_an_older_mtime_is_detected(self):
+        # e.g. restored from a backup with cp -p
+        self.write('GME', [('2021-01-04', 20.0, 10), ('2021-01-05', 21.0, 11)], mtime=1_500_000_000)
+        with self.assertLogs('api_v1.price_panel', 'WARNING'):
+            self.assertIsNone(price_panel.load_panel(self.price_dir))
+
+
+class PortfolioEngineTests(SimpleTestCase):
+    @staticmethod
+    def loop_returns(df_return, tickers_by_date):
+        # The per-rebalance loop the engine replaced
+        df_portfolio = pd.DataFrame()
+        for start_date, tickers in tickers_by_date.items():
+            end_date = (pd.to_datetime(start_date) + pd.offsets.MonthEnd()).strftime('%Y-%m-%d')
+            df_temp = df_return[start_date:end_date][tickers].mean(axis=1).to_frame('portfolio_return')
+            df_portfolio = df_portfolio.add(df_temp, fill_value=0)
+        df_portfolio.index = pd.to_datetime(df_portfolio.index)
+        return df_portfolio
+
+    def test_matches_the_per_rebalance_loop(self):
+        rng = np.random.default_rng(7)
+        dates = pd.bdate_range('2021-01-04', '2021-05-31')
+        values = rng.normal(0, 0.02, (len(dates), 6))
+        values[rng.random(values.shape) < 0.15] = np.nan
+        df_return = pd.DataFrame(values, index=dates, columns=list('ABCDEF'))
+        # A day on which none of the held tickers has a return
+        df_return.loc['2021-03-10', ['A', 'B']] = np.nan
+        # Unordered schedule with uneven portfolio sizes
+        tickers_by_date = {'2021-03-01': ['A', 'B'], '2021-02-01': ['B', 'C', 'D'], '2021-04-01': ['F', 'E', 'A', 'C']}
+
+        engine = portfolio_engine.portfolio_returns(df_return, tickers_by_date)
+
+        pd.testing.assert_frame_equal(engine, self.loop_returns(df_return, tickers_by_date).sort_index(),
+                                      check_freq=False, check_names=False)
+        self.assertTrue(np.isnan(engine.loc['2021-03-10', 'portfolio_return']))
+        self.assertTrue(portfolio_engine.portfolio_returns(df_return, {}).empty)
+
+
+class RankingIndexTests(SimpleTestCase):
+    def setUp(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        csv_path = os.path.join(data_dir, 'reddit_sentiment_data.csv')
+        write_sentiment_csv(csv_path, SENTIMENT_ROWS)
+        self.sentiment_data = RedditSentimentData(csv_path, use_cache=False)
+
+    @staticmethod
+    def baseline_filter(df_sentiment, indicator, top_n):
+        # filter_strategies before the ranking index
+        df_agg = (df_sentiment.reset_index('stock')
+                  .groupby([pd.Grouper(freq='ME'), 'stock'])[[indicator]].agg('mean').dropna())
+        df_agg['rank'] = df_agg.groupby(level=0)[indicator].transform(
+            lambda x: x.rank(ascending=False, method='first').astype(int))
+        df_filtered = df_agg[df_agg['rank'] <= top_n].copy().reset_index('stock')
+        df_filtered.index = df_filtered.index + pd.DateOffset(1)
+        return df_filtered.reset_index().set_index(['date', 'stock'])
+
+    def test_ties_are_ranked_by_ticker(self):
+        ranking = MonthlyRankingIndex(self.sentiment_data.df_sentiment)
+
+        self.assertEqual(ranking.top('comms_num', '2021-01-15'), [('AMC', 8.0, 1), ('BB', 8.0, 2), ('GME', 5.0, 3)])
+        self.assertEqual(ranking.top('comms_num', '2021-02-01', 2), [('BB', 7.0, 1), ('AMC', 3.0, 2)])
+        self.assertEqual(ranking.top('comms_num', '2021-03-01'), [])
+
+    def test_filter_strategies_matches_the_baseline(self):
+        for indicator in AGG_MAP:
+            for top_n in (1, 2, 5):
+                with self.subTest(indicator=indicator, top_n=top_n):
+                    filtered = self.sentiment_data.filter_strategies(indicator, top_n=top_n)
+                    expected = self.baseline_filter(self.sentiment_data.df_sentiment, indicator, top_n)
+                    pd.testing.assert_frame_equal(filtered, expected, check_dtype=False, check_index_type=False)
+                    self.assertEqual(self.sentiment_data.extract_portfolios(filtered),
+                                     self.sentiment_data.extract_portfolios(expected))
+        self.assertTrue(self.sentiment_data.filter_strategies('likes').empty)
+
+
+class IndicatorCacheStoreTests(TestCase):
+    def setUp(self):
+        self.store = cache_backends.DatabaseIndicatorStore()
+        self.months = [date(2021, 1, 1), date(2021, 2, 1), date(2021, 3, 1)]
+        self.ranking = [('AMC', 8.0, 1), ('BB', 8.0, 2), ('GME', 5.0, 3)]
+
+    def test_rankings_round_trip_in_batched_queries(self):
+        self.store.set_ranking('comms_num', pd.Timestamp('2021-01-01'), [('GME', 1.0, 1)], 1, 'v1')
+        # Rewriting a month replaces its ranking
+        self.store.set_ranking('comms_num', pd.Timestamp('2021-01-01'), self.ranking, 3, 'v1')
+        self.store.set_ranking('comms_num', pd.Timestamp('2021-02-01'), self.ranking[:2], 2, 'v1')
+        self.store.get_rankings('comms_num', self.months, 'v1', 2)
+
+        with self.assertNumQueries(2):
+            rankings = self.store.get_rankings('comms_num', self.months, 'v1', 2)
+
+        self.assertEqual(rankings, {self.months[0]: self.ranking[:2], self.months[1]: self.ranking[:2]})
+        self.assertEqual(MonthlyIndicatorScore.objects.count(), 5)
+        self.assertEqual(MonthlyIndicatorCache.objects.filter(month_year=self.months[0]).count(), 1)
+        self.assertEqual(self.store.get_rankings('score', self.months, 'v1', 2), {})
+
+
+class SampleDataMixin:
+    """
+    A BASE_DIR holding a small sentiment csv, price files of its tickers and a QQQ index
+    """
+    def setUp(self):
+        super().setUp()
+        base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, base_dir)
+        self.paths = backtest.data_paths(base_dir)
+        os.makedirs(self.paths['prices'])
+        os.makedirs(self.paths['indexes'])
+        write_sentiment_csv(self.paths['sentiment'], SENTIMENT_ROWS + [('2021-03-02', 'GME', 6, 6, 1, 0)])
+        days = pd.bdate_range('2021-01-04', '2021-04-30')
+        for offset, ticker in enumerate(['GME', 'AMC', 'BB', 'QQQ']):
+            directory = self.paths['indexes'] if ticker == 'QQQ' else self.paths['prices']
+            write_price_csv(os.path.join(directory, f'{ticker}.csv'), ticker,
+                            [(day.strftime('%Y-%m-%d'), round(10 + offset + np.sin(i / 3), 4), 100)
+                             for i, day in enumerate(days)])
+        override = override_settings(BASE_DIR=base_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def portfolio(self, **params):
+        return self.client.get('/api_v1/portfolio-returns/', {
+            'indicator': 'comms_num', 'start_date': '2021-01-28', 'end_date': '2021-03-31', **params
+        })
+
+
+class PortfolioTopNTests(SampleDataMixin, TestCase):
+    def test_full_depth_rankings_serve_any_smaller_top_n(self):
+        first = self.portfolio(top_n=1).json()
+        deeper = self.portfolio(top_n=3).json()
+
+        self.assertFalse(first['cached'])
+        self.assertEqual(set(MonthlyIndicatorCache.objects.values_list('depth', flat=True)),
+                         {settings.MONTHLY_INDICATOR_MAX_TOP_N})
+        self.assertTrue(deeper['cached'])
+        # January's portfolio starts before the window and is not listed
+        self.assertEqual([row['tickers'] for row in first['tickers_by_date']], [['BB'], ['GME']])
+        self.assertEqual([row['tickers'] for row in deeper['tickers_by_date']], [['BB', 'AMC', 'GME'], ['GME']])
+        self.assertNotEqual(first['portfolio_returns'], deeper['portfolio_returns'])
+        self.assertEqual(self.portfolio(top_n=0).status_code, 400)
+
+    def test_changed_dataset_misses_rankings_of_the_old_version(self):
+        first = self.portfolio(top_n=1).json()
+        self.assertTrue(self.portfolio(top_n=1).json()['cached'])
+        old_version = RedditSentimentData.dataset_version(self.paths['sentiment'])
+
+        # AMC now has the most comments in February
+        write_sentiment_csv(self.paths['sentiment'], SENTIMENT_ROWS + [('2021-02-12', 'AMC', 1, 90, 1, 0),
+                                                                       ('2021-03-02', 'GME', 6, 6, 1, 0)],
+                            mtime=1_600_000_100)
+        changed = self.portfolio(top_n=1).json()
+
+        self.assertNotEqual(RedditSentimentData.dataset_version(self.paths['sentiment']), old_version)
+        self.assertFalse(changed['cached'])
+        self.assertEqual([row['tickers'] for row in first['tickers_by_date']], [['BB'], ['GME']])
+        self.assertEqual([row['tickers'] for row in changed['tickers_by_date']], [['AMC'], ['GME']])
+        self.assertEqual(set(MonthlyIndicatorCache.objects.values_list('dataset_version', flat=True)),
+                         {old_version, RedditSentimentData.dataset_version(self.paths['sentiment'])})
+
+
+class FakeSubreddit:
+    def __init__(self, submissions):
+        self.submissions = submissions
+        self.requested = 0
+
+    def new(self, limit=None):
+        # Newest first, like the Reddit listing
+        for submission in sorted(self.submissions, key=lambda s: s.created_utc, reverse=True)[:limit]:
+            self.requested += 1
+            yield submission
+
+
+class FakeReddit:
+    """
+    Local stand-in for praw.Reddit serving a fixed list of submissions
+    """
+
+    def __init__(self, submissions):
+        self.listing = FakeSubreddit(submissions)
+
+    def subreddit(self, name):
+        return self.listing
+
+
+def submission(post_id, created_utc, title='title'):
+    return SimpleNamespace(id=post_id, title=title, score=1, num_comments=0,
+                           selftext='body, with "quotes"\nand lines', created_utc=created_utc)
+
+
+# 2025-06-30 23:00 UTC and 2025-07-01 01:00 UTC
+JUNE = 1751324400.0
+JULY = 1751331600.0
+
+
+class RedditIngestTests(SimpleTestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def read_month(self, month):
+        return pd.read_csv(reddit_ingest.monthly_file(self.output_dir, 'wsb', month), dtype={'id': str})
+
+    def test_appends_posts_to_monthly_files(self):
+        client = FakeReddit([submission('a', JUNE), submission('b', JULY), submission('c', JULY + 60)])
+        summary = reddit_ingest.ingest(client, 'wsb', self.output_dir)
+
+        self.assertEqual(summary['written'], 3)
+        self.assertEqual(summary['months'], {'2025-06': 1, '2025-07': 2})
+        self.assertEqual(self.read_month('2025-07')['id'].tolist(), ['b', 'c'])
+        self.assertEqual(self.read_month('2025-06')['body'].iloc[0], 'body, with "quotes"\nand lines')
+        self.assertEqual(summary['checkpoint'], JULY + 60)
+
+    def test_rerun_only_fetches_posts_after_checkpoint(self):
+        posts = [submission('a', JUNE), submission('b', JULY)]
+        reddit_ingest.ingest(FakeReddit(posts), 'wsb', self.output_dir)
+
+        client = FakeReddit(posts + [submission('c', JULY + 60)])
+        summary = reddit_ingest.ingest(client, 'wsb', self.output_dir)
+
+        # Stops at the first post older than the checkpoint; the checkpoint post itself is deduplicated
+        self.assertEqual(client.listing.requested, 3)
+        self.assertEqual((summary['fetched'], summary['written'], summary['duplicates']), (2, 1, 1))
+        self.assertEqual(self.read_month('2025-07')['id'].tolist(), ['b', 'c'])
+        self.assertEqual(len(self.read_month('2025-06')), 1)
+
+    def test_scan_cut_short_by_limit_keeps_the_checkpoint(self):
+        posts = [submission('a', JUNE)]
+        reddit_ingest.ingest(FakeReddit(posts), 'wsb', self.output_dir)
+        posts += [submission(post_id, JULY + minute * 60) for minute, post_id in enumerate('bcde')]
+
+        with self.assertLogs('api_v1.reddit_ingest', 'WARNING'):
+            cut_short = reddit_ingest.ingest(FakeReddit(posts), 'wsb', self.output_dir, limit=2)
+        self.assertEqual((cut_short['written'], cut_short['complete'], cut_short['checkpoint']), (2, False, JUNE))
+
+        # The next run scans down to the old checkpoint and picks up the posts in between
+        summary = reddit_ingest.ingest(FakeReddit(posts), 'wsb', self.output_dir)
+        self.assertEqual((summary['written'], summary['complete'], summary['checkpoint']), (2, True, JULY + 180))
+        self.assertEqual(self.read_month('2025-07')['id'].tolist(), ['d', 'e', 'b', 'c'])
+
+    def test_seen_index_is_bootstrapped_from_existing_files(self):
+        pd.DataFrame([reddit_ingest.submission_to_post(submission('a', JUNE))]).to_csv(
+            os.path.join(self.output_dir, 'reddit_posts_wsb_latest.csv'), index=False)
+
+        summary = reddit_ingest.ingest(FakeReddit([submission('a', JUNE), submission('b', JULY)]), 'wsb', self.output_dir)
+
+        self.assertEqual((summary['written'], summary['duplicates']), (1, 1))
+        self.assertFalse(os.path.exists(reddit_ingest.monthly_file(self.output_dir, 'wsb', '2025-06')))
+
+    def test_small_batches_do_not_duplicate_posts(self):
+        posts = [submission(f'p{i}', JULY + i) for i in range(7)]
+        reddit_ingest.ingest(FakeReddit(posts + posts[:2]), 'wsb', self.output_dir, batch_size=2)
+
+        self.assertEqual(sorted(self.read_month('2025-07')['id']), sorted(f'p{i}' for i in range(7)))
+
+    def test_batch_interrupted_between_writes_is_rolled_back(self):
+        posts = [submission(f'p{i}', JULY + i) for i in range(4)]
+        reddit_ingest.ingest(FakeReddit(posts[:1]), 'wsb', self.output_dir)
+
+        with mock.patch.object(reddit_ingest.IngestState, 'end_batch', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                reddit_ingest.ingest(FakeReddit(posts), 'wsb', self.output_dir)
+        summary = reddit_ingest.ingest(FakeReddit(posts), 'wsb', self.output_dir)
+
+        self.assertEqual((summary['written'], summary['duplicates']), (3, 1))
+        self.assertEqual(self.read_month('2025-07')['id'].tolist(), ['p0', 'p1', 'p2', 'p3'])
+
+
+class TickerExtractorTests(SimpleTestCase):
+    def setUp(self):
+        self.extractor = TickerExtractor(['GME', 'AMC', 'TSLA', 'A', 'BB', 'SPACEX'])
+        self.posts = pd.DataFrame({
+            'id': ['p1', 'p2', 'p3', 'p4'],
+            'title': ['GME and AMC to the moon', 'Buying $TSLA and $A', None, 'YOLO'],
+            'body': ['More GME, not BBB', None, '$GME1 is not a ticker but $BB is', 'nothing here'],
+        })
+
+    def test_extracts_long_post_ticker_pairs(self):
+        pairs = self.extractor.extract(self.posts)
+
+        self.assertEqual(list(zip(pairs['post_id'], pairs['ticker'])),
+                         [('p1', 'GME'), ('p1', 'AMC'), ('p2', 'TSLA'), ('p3', 'BB')])
+
+    def test_dollar_tickers_only_for_posts_without_bare_tickers(self):
+        # Longer than five letters, so only the $ form can find it
+        posts = pd.DataFrame({'id': ['p1', 'p2'], 'title': ['AMC beats $SPACEX', 'Long $SPACEX'], 'body': ['', '']})
+
+        self.assertEqual(list(zip(*self.extractor.extract(posts).to_numpy().T)), [('p1', 'AMC'), ('p2', 'SPACEX')])
+
+    def test_attach_tickers_repeats_posts_per_ticker(self):
+        rows = attach_tickers(self.posts, self.extractor.extract(self.posts, batch_size=2))
+
+        self.assertEqual(rows['stock'].tolist(), ['GME', 'AMC', 'TSLA', 'BB'])
+        self.assertEqual(rows['id'].tolist(), ['p1', 'p1', 'p2', 'p3'])
+
+
+class ScoringPipelineTests(SimpleTestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.cache_path = os.path.join(cache_dir, 'scores.sqlite3')
+        self.posts = pd.DataFrame({
+            'date': ['2021-02-01'] * 4,
+            'stock': ['GME', 'AMC', 'GME', 'BB'],
+            'score': [10, 5, 1, 3],
+            'comms_num': [2, 1, 0, 4],
+            'title': ['GME to the moon', 'Sell everything, crash incoming', 'GME to the moon', None],
+            'body': [None, 'puts on AMC', '', 'holding'],
+        })
+
+    def test_scores_columns_consumed_by_sentiment_data(self):
+        scored = ScoringPipeline('lexicon').score_frame(self.posts)
+
+        self.assertEqual(scored['title_lexicon_sentiment'].tolist(), [2.0, 0.0, 2.0, 0.0])
+        self.assertEqual(scored['body_lexicon_sentiment'].tolist(), [0.0, 0.0, 0.0, 1.0])
+        df = RedditSentimentData.prepare_sentiment_frame(scored)
+        self.assertEqual(df['total_sentiment'].tolist(), [2.0, 0.0, 2.0, 1.0])
+
+    def test_identical_and_cached_texts_are_scored_once(self):
+        pipeline = ScoringPipeline('lexicon', cache_path=self.cache_path, batch_size=2)
+        pipeline.score_frame(self.posts)
+        self.assertEqual(pipeline.stats['scored'], 4)
+
+        rerun = ScoringPipeline('lexicon', cache_path=self.cache_path)
+        first = pipeline.score_frame(self.posts)
+        self.assertEqual(rerun.score_frame(self.posts).to_dict(), first.to_dict())
+        self.assertEqual((rerun.stats['cached'], rerun.stats['scored']), (4, 0))
+
+    def test_stanza_batch_failure_falls_back_to_single_texts(self):
+        def doc(text):
+            if 'bad' in text:
+                raise RuntimeError('cannot tokenize')
+            return SimpleNamespace(sentences=[SimpleNamespace(sentiment=2)] if text.strip() else [])
+
+        def bulk_process(docs):
+            return [doc(d.text) for d in docs]
+
+        scorer = StanzaScorer.__new__(StanzaScorer)
+        scorer.stanza = SimpleNamespace(Document=lambda sentences, text: SimpleNamespace(text=text))
+        scorer.nlp = mock.Mock(side_effect=doc, bulk_process=bulk_process)
+
+        with self.assertLogs('api_v1.sentiment_scoring', 'WARNING'):
+            self.assertEqual(scorer.score_batch(['good', 'bad text', ' ']), [2, None, None])
+        self.assertEqual(scorer.score_batch(['good']), [2])
+        with self.assertRaises(TypeError):
+            Scorer()
+
+
+class MonthlyAggregateTests(TestCase):
+    def posts(self, rows):
+        df = pd.DataFrame(rows, columns=['date', 'stock', 'score', 'comms_num', 'title_sentiment', 'body_sentiment'])
+        return RedditSentimentData.prepare_sentiment_frame(df)
+
+    def test_appending_posts_matches_full_aggregation(self):
+        history = self.posts([
+            ('2021-01-05', 'GME', 10, 5, 2, 1), ('2021-01-20', 'AMC', 4, 8, 0, 1),
+            ('2021-02-03', 'GME', 3, 1, 1, 1), ('2021-02-10', 'BB', 7, 7, 2, 2),
+        ])
+        new_posts = self.posts([('2021-02-25', 'AMC', 20, 30, 2, 2), ('2021-02-26', 'GME', 1, 9, 0, 0)])
+        monthly_aggregates.rebuild(history)
+
+        months = monthly_aggregates.add_posts(new_posts)
+
+        self.assertEqual(months, [pd.Timestamp('2021-02-01')])
+        expected = MonthlyRankingIndex(pd.concat([history, new_posts]))
+        rankings = monthly_aggregates.month_rankings([pd.Timestamp('2021-01-01'), pd.Timestamp('2021-02-01')])
+        for (indicator, month), stocks_data in rankings.items():
+            self.assertEqual([ticker for ticker, value, rank in stocks_data],
+                             [ticker for ticker, value, rank in expected.top(indicator, month)])
+            for (_, value, _), (_, expected_value, _) in zip(stocks_data, expected.top(indicator, month)):
+                self.assertAlmostEqual(value, expected_value)
+
+    def test_append_command_recovers_from_a_failed_run(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        dataset, posts = os.path.join(tmp, 'sentiment.csv'), os.path.join(tmp, 'posts.csv')
+        columns = 'date,stock,score,comms_num,title_sentiment,body_sentiment\n'
+        with open(dataset, 'w') as f:
+            f.write(columns + '2021-01-05,GME,10,5,2,1\n2021-02-03,GME,3,1,1,1\n')
+        with open(posts, 'w') as f:
+            f.write(columns + '2021-02-25,AMC,20,30,2,2\n')
+        with open(dataset, 'rb') as f:
+            original = f.read()
+
+        # Dies after the aggregates moved to the staged version, before the csv is replaced
+        with mock.patch('os.replace', side_effect=RuntimeError('interrupted')):
+            with self.assertRaises(RuntimeError):
+                call_command('append_sentiment_posts', posts, dataset=dataset, stdout=StringIO())
+        with open(dataset, 'rb') as f:
+            self.assertEqual(f.read(), original)
+        self.assertEqual(sorted(os.listdir(tmp)), ['posts.csv', 'sentiment.csv'])
+
+        call_command('append_sentiment_posts', posts, dataset=dataset, stdout=StringIO())
+        self.assertEqual(len(pd.read_csv(dataset)), 3)
+        self.assertEqual(monthly_aggregates.source_version(), RedditSentimentData.dataset_version(dataset))
+        self.assertEqual(set(MonthlyIndicatorCache.objects.values_list('dataset_version', flat=True)),
+                         {RedditSentimentData.dataset_version(dataset)})
+        self.assertEqual(
+            sorted(MonthlyStockAggregate.objects.filter(indicator='score').values_list('ticker', 'month_year', 'total')),
+            [('AMC', date(2021, 2, 1), 20.0), ('GME', date(2021, 1, 1), 10.0), ('GME', date(2021, 2, 1), 3.0)],
+        )
+
+        # Aggregates of an edited csv are rebuilt before new posts are added
+        with open(dataset, 'a') as f:
+            f.write('2021-02-27,BB,1,1,0,0\n')
+        call_command('append_sentiment_posts', dataset=dataset, stdout=StringIO())
+        self.assertTrue(MonthlyStockAggregate.objects.filter(ticker='BB').exists())
+
+
+def write_price_csv(path, ticker, rows):
+    with open(path, 'w') as f:
+        f.write('Price,Close,High,Low,Open,Volume\n')
+        f.write(f'Ticker,{ticker},{ticker},{ticker},{ticker},{ticker}\n')
+        f.write('Date,,,,,\n')
+        for day, close, volume in rows:
+            prices = ',,,' if close is None else f'{close},{close + 1},{close - 1},{close}'
+            f.write(f'{day},{prices},{volume}\n')
+
+
+class PriceHistoryLoaderTests(TestCase):
+    def setUp(self):
+        self.price_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.price_dir)
+        write_price_csv(os.path.join(self.price_dir, 'GME.csv'), 'GME', [('2021-01-04', 17.25, 10), ('2021-01-05', 17.37, 11)])
+        write_price_csv(os.path.join(self.price_dir, 'AMC.csv'), 'AMC', [('2021-01-04', 2.01, 20), ('2021-01-05', None, 21)])
+
+    def test_loads_many_tickers_per_day_and_upserts(self):
+        files = price_history_loader.discover_files([self.price_dir])
+        price_history_loader.load_price_history(files, batch_rows=2)
+        write_price_csv(os.path.join(self.price_dir, 'GME.csv'), 'GME', [('2021-01-05', 18.0, 12)])
+        stats = price_history_loader.load_price_history(price_history_loader.discover_files([self.price_dir]))
+
+        self.assertEqual(stats['rows'], 2)
+        self.assertEqual(
+            list(StockPriceHistory.objects.order_by('ticker', 'date').values_list('ticker', 'date', 'close_price', 'volume')),
+            [('AMC', date(2021, 1, 4), Decimal('2.01'), 20),
+             ('GME', date(2021, 1, 4), Decimal('17.25'), 10),
+             ('GME', date(2021, 1, 5), Decimal('18'), 12)],
+        )
+
+
+class StockPriceHistoryViewTests(TestCase):
+    def setUp(self):
+        for ticker, day, close in [('GME', date(2021, 1, 4), '17.25'), ('GME', date(2021, 1, 5), '17.37'),
+                                   ('AMC', date(2021, 1, 4), '2.01'), ('AMC', date(2021, 2, 1), '13.26')]:
+            StockPriceHistory.objects.create(ticker=ticker, date=day, open_price=close, close_price=close,
+                                             high_price=close, low_price=close, volume=100)
+
+    def get(self, **params):
+        return self.client.get('/api_v1/stock-price-history/', {'start_date': '2021-01-01', 'end_date': '2021-01-31', **params})
+
+    def test_tickers_are_grouped_from_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.get(tickers='gme,AMC,NOPE')
+
+        data = response.json()
+        self.assertEqual(list(data), ['GME', 'AMC', 'NOPE'])
+        self.assertEqual([(row['date'], row['close_price']) for row in data['GME']],
+                         [('2021-01-04', 17.25), ('2021-01-05', 17.37)])
+        self.assertEqual(data['AMC'], [{'date': '2021-01-04', 'open_price': 2.01, 'close_price': 2.01,
+                                        'high_price': 2.01, 'low_price': 2.01, 'volume': 100}])
+        self.assertEqual(data['NOPE'], [])
+
+    def test_single_ticker_keeps_serializer_keys(self):
+        rows = self.get(ticker='GME').json()
+
+        self.assertEqual([list(row) for row in rows], [['id', 'ticker', 'date', 'open_price', 'close_price',
+                                                        'high_price', 'low_price', 'volume']] * 2)
+        self.assertEqual([row['close_price'] for row in rows], ['17.250000', '17.370000'])
+        self.assertEqual(self.get().status_code, 400)
+
+    def test_monthly_bars_and_invalid_resolution(self):
+        response = self.get(tickers='GME,AMC', end_date='2021-02-28', resolution='monthly')
+
+        self.assertEqual(response.json()['GME'], [{'date': '2021-01-05', 'open_price': 17.25, 'close_price': 17.37,
+                                                   'high_price': 17.37, 'low_price': 17.25, 'volume': 200}])
+        self.assertEqual([row['date'] for row in response.json()['AMC']], ['2021-01-04', '2021-02-01'])
+        self.assertEqual(self.get(ticker='GME', resolution='hourly').status_code, 400)
+
+
+class DownsamplingTests(SimpleTestCase):
+    def test_lttb_keeps_endpoints_and_extremes(self):
+        y = np.sin(np.linspace(0, 6 * np.pi, 3000))
+        kept = downsampling.lttb(y, 150)
+
+        self.assertEqual(len(kept), 150)
+        self.assertEqual((kept[0], kept[-1]), (0, 2999))
+        self.assertTrue(np.all(np.diff(kept) > 0))
+        self.assertGreater(y[kept].max(), 0.999)
+        self.assertLess(y[kept].min(), -0.999)
+
+    def test_frame_series_share_the_budget(self):
+        index = pd.bdate_range('2021-01-01', periods=1000)
+        df = pd.DataFrame({'portfolio_return': np.linspace(0, 1, 1000), 'QQQ': np.cos(np.arange(1000) / 50)}, index=index)
+
+        thinned = downsampling.downsample_frame(df, 100)
+
+        self.assertLessEqual(len(thinned), 100)
+        self.assertEqual((thinned.index[0], thinned.index[-1]), (index[0], index[-1]))
+        self.assertIs(downsampling.downsample_frame(df, 1000), df)
+
+    def test_weekly_resolution_labels_buckets_with_last_trading_day(self):
+        index = pd.to_datetime(['2021-01-04', '2021-01-05', '2021-01-08', '2021-01-11'])
+        df = pd.DataFrame({'portfolio_return': [0.1, 0.2, 0.3, 0.4]}, index=index)
+
+        weekly = downsampling.resample_frame(df, 'weekly')
+
+        self.assertEqual(list(weekly.index.strftime('%Y-%m-%d')), ['2021-01-08', '2021-01-11'])
+        self.assertEqual(weekly['portfolio_return'].tolist(), [0.3, 0.4])
+
+
+class ResponseFormatTests(SimpleTestCase):
+    def setUp(self):
+        index = pd.DatetimeIndex(['2021-03-01', '2021-03-02', '2021-03-03'], name='Date')
+        self.df = pd.DataFrame({'portfolio_return': [0.0, np.nan, 0.05], 'QQQ': [0.0, 0.01, 0.02]}, index=index)
+
+    def test_columnar_layout_matches_records(self):
+        records = renderers.frame_records(self.df)
+        columns = renderers.frame_columns(self.df)
+
+        self.assertEqual(records[1], {'Date': '2021-03-02', 'portfolio_return': None, 'QQQ': 0.01})
+        self.assertEqual(columns['dates'], [record['Date'] for record in records])
+        for name, values in columns['series'].items():
+            self.assertEqual(values, [record[name] for record in records])
+
+    def test_layout_format_does_not_select_a_renderer(self):
+        negotiation = renderers.LayoutContentNegotiation()
+        available = [JSONRenderer(), renderers.MessagePackRenderer()]
+
+        def select(params, accept):
+            request = Request(APIRequestFactory().get('/', params, HTTP_ACCEPT=accept))
+            return negotiation.select_renderer(request, available)[0]
+
+        self.assertIsInstance(select({'format': 'columnar'}, 'application/msgpack'), renderers.MessagePackRenderer)
+        self.assertIsInstance(select({'format': 'columnar'}, '*/*'), JSONRenderer)
+        self.assertIsInstance(select({'format': 'msgpack'}, '*/*'), renderers.MessagePackRenderer)
+        data = {'portfolio_returns': renderers.frame_columns(self.df)}
+        self.assertEqual(msgpack.unpackb(renderers.MessagePackRenderer().render(data)), data)
+
+
+class BacktestSweepViewTests(SimpleTestCase):
+    def post(self, body):
+        return self.client.post('/api_v1/backtest-sweep/', body, content_type='application/json')
+
+    def test_invalid_grids_are_rejected(self):
+        self.assertEqual(self.post([{'indicators': ['score']}]).json()['error'], 'The sweep grid must be a JSON object.')
+        self.assertEqual(self.post({'indicators': ['likes']}).status_code, 400)
+        self.assertEqual(self.post({'windows': [{'start_date': '2021-02-01'}]}).status_code, 400)
+        self.assertEqual(self.post({'market_indexes': ['../stock_historical_prices_2019-2024/GME']}).status_code, 400)
+        self.assertEqual(self.post({'market_indexes': 'QQQ'}).status_code, 400)
+
+
+class StubNewsClient:
+    """
+    Local stand-in for NewsApiClient: articles per ticker, published on consecutive hours
+    """
+
+    def __init__(self, hours_by_ticker, failing=()):
+        self.hours_by_ticker = hours_by_ticker
+        self.failing = set(failing)
+        self.queries = []
+
+    def get_everything(self, q, **kwargs):
+        self.queries.append(q)
+        if q in self.failing:
+            raise ConnectionError(f'{q} unavailable')
+        return {'status': 'ok', 'totalResults': len(self.hours_by_ticker.get(q, [])), 'articles': [
+            {'title': f'{q} news {hour}', 'description': 'text', 'source': {'name': 'Reuters'},
+             'url': f'https://example.com/{q}/{hour}', 'urlToImage': None,
+             'publishedAt': f'2025-07-01T{hour:02d}:00:00Z'}
+            for hour in self.hours_by_ticker.get(q, [])
+        ]}
+
+
+class NewsCacheTests(TestCase):
+    def setUp(self):
+        self.client_stub = StubNewsClient({'AAPL': [9, 1], 'TSLA': [8, 7, 6, 5, 4, 3], 'NVDA': [10]})
+
+    def get_news(self, tickers, **kwargs):
+        return news_cache.get_news(tickers, client_factory=lambda: self.client_stub, **kwargs)
+
+    def test_combinations_share_per_ticker_entries(self):
+        first = self.get_news(['AAPL', 'TSLA'])
+        second = self.get_news(['AAPL', 'NVDA', 'GME'])
+
+        self.assertEqual(sorted(self.client_stub.queries), ['AAPL', 'GME', 'NVDA', 'TSLA'])
+        self.assertEqual([article['title'] for article in first['articles']],
+                         ['AAPL news 9', 'TSLA news 8', 'TSLA news 7', 'TSLA news 6', 'TSLA news 5'])
+        self.assertEqual((second['cached_tickers'], second['fetched_tickers']), (['AAPL'], ['GME', 'NVDA']))
+        self.assertEqual([article['title'] for article in second['articles']], ['NVDA news 10', 'AAPL news 9', 'AAPL news 1'])
+        # Tickers without news are cached too
+        self.assertEqual(NewsCache.objects.get(cache_key='GME').total_results, 0)
+
+    def test_only_expired_tickers_are_refetched(self):
+        self.get_news(['AAPL', 'TSLA'])
+        NewsCache.objects.filter(cache_key='TSLA').update(expires_at=NewsCache.objects.get(cache_key='TSLA').created_at)
+
+        news = self.get_news(['AAPL', 'TSLA'], grace=timedelta(0))
+
+        self.assertEqual(self.client_stub.queries[2:], ['TSLA'])
+        self.assertEqual(news['fetched_tickers'], ['TSLA'])
+        self.assertEqual(NewsCache.objects.filter(cache_key='TSLA').count(), 1)
+
+    def test_recently_expired_entries_are_served_stale_and_refreshed(self):
+        self.get_news(['AAPL', 'TSLA'])
+        expired = NewsCache.objects.get(cache_key='TSLA').expires_at
+        refreshed = []
+
+        news = self.get_news(['AAPL', 'TSLA'], now=expired + timedelta(minutes=5),
+                             refresh=lambda tickers, client_factory, ttl: refreshed.extend(tickers))
+
+        self.assertEqual(self.client_stub.queries, ['AAPL', 'TSLA'])
+        self.assertEqual((news['stale_tickers'], refreshed, news['fetched_tickers']), (['AAPL', 'TSLA'], ['AAPL', 'TSLA'], []))
+        self.assertTrue(news['freshness']['TSLA']['stale'])
+        self.assertEqual(len(news['articles']), 5)
+
+        news_cache.refresh_ticker('TSLA', client_factory=lambda: self.client_stub)
+        self.assertGreater(NewsCache.objects.get(cache_key='TSLA').expires_at, expired)
+
+    def test_entries_past_the_grace_window_are_fetched(self):
+        self.get_news(['TSLA'])
+        expired = NewsCache.objects.get(cache_key='TSLA').expires_at
+
+        news = self.get_news(['TSLA'], now=expired + timedelta(seconds=settings.NEWS_CACHE_STALE_SECONDS + 1),
+                             refresh=lambda *args: self.fail('nothing is stale'))
+
+        self.assertEqual((news['fetched_tickers'], news['stale_tickers']), (['TSLA'], []))
+
+    def test_failed_tickers_are_left_out_unless_all_fail(self):
+        self.client_stub.failing = {'TSLA'}
+        news = self.get_news(['AAPL', 'TSLA'], workers=2)
+        self.assertEqual((news['fetched_tickers'], news['failed_tickers']), (['AAPL'], ['TSLA']))
+
+        with self.assertRaises(ConnectionError):
+            self.get_news(['TSLA'])
+
+    def test_failed_cache_writes_and_unparseable_dates_fail_one_ticker(self):
+        self.client_stub.hours_by_ticker['AAPL'] = [9, 99]
+        original_store = news_cache.store
+
+        def store(ticker, articles, now, ttl):
+            if ticker == 'TSLA':
+                raise ValueError('cache unavailable')
+            return original_store(ticker, articles, now, ttl)
+
+        with mock.patch.object(news_cache, 'store', store):
+            news = self.get_news(['AAPL', 'TSLA'])
+
+        self.assertEqual((news['fetched_tickers'], news['failed_tickers']), (['AAPL'], ['TSLA']))
+        # 2025-07-01T99:00:00Z is skipped
+        self.assertEqual([article['title'] for article in news['articles']], ['AAPL news 9'])
+
+    def test_view_merges_cached_and_fetched_news(self):
+        NewsViewSet.news_client_factory = staticmethod(lambda: self.client_stub)
+        self.addCleanup(setattr, NewsViewSet, 'news_client_factory', staticmethod(news_cache.newsapi_client))
+
+        data = self.client.get('/api_v1/news/', {'tickers': 'tsla, aapl'}).json()
+        cached = self.client.get('/api_v1/news/', {'tickers': 'AAPL,TSLA'}).json()
+
+        self.assertEqual((data['status'], data['tickers'], data['cached']), ('success', ['AAPL', 'TSLA'], False))
+        self.assertEqual(data['articles'][0]['publishedAt'], '2025-07-01T09:00:00+00:00')
+        self.assertTrue(cached['cached'])
+        self.assertEqual(cached['articles'], data['articles'])
+        self.assertEqual(self.client.get('/api_v1/news/', {'tickers': ','}).status_code, 400)
+        too_many = ','.join(f'T{i}' for i in range(settings.NEWS_MAX_TICKERS + 1))
+        self.assertEqual(self.client.get('/api_v1/news/', {'tickers': too_many}).status_code, 400)
+
+
+class WarmCachesTests(SampleDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_stub = StubNewsClient({'GME': [9], 'BB': [8]})
+        WarmCachesCommand.news_client_factory = staticmethod(lambda: self.client_stub)
+        self.addCleanup(setattr, WarmCachesCommand, 'news_client_factory', staticmethod(news_cache.newsapi_client))
+
+    def warm(self):
+        out = StringIO()
+        call_command('warm_caches', indicators='comms_num', windows='2021-02-01:2021-03-31', top_n='1', stdout=out)
+        return {line.split()[0] + ' ' + line.split()[1]: [int(n) for n in line.split()[2:4]]
+                for line in out.getvalue().splitlines() if line.startswith(('monthly', 'news'))}
+
+    def test_rankings_and_news_of_held_tickers_are_warmed_once(self):
+        first = self.warm()
+        second = self.warm()
+
+        self.assertEqual(first, {'monthly indicators': [3, 3], 'news tickers': [2, 2]})
+        self.assertEqual(second, {'monthly indicators': [3, 0], 'news tickers': [2, 0]})
+        self.assertEqual(sorted(self.client_stub.queries), ['BB', 'GME'])
+        self.assertTrue(self.portfolio(indicator='comms_num', top_n=1).json()['cached'])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.lock_dir)
+        self.flights = single_flight.SingleFlight(lock_dir=self.lock_dir, timeout=5)
+
+    def run_concurrently(self, fn, count=8):
+        results, errors = [], []
+        started = threading.Barrier(count)
+
+        def call():
+            started.wait()
+            try:
+                results.append(self.flights.do('portfolio-returns?top_n=5', fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_callers_share_one_computation(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'portfolio_returns': [len(calls)]}
+
+        results, errors = self.run_concurrently(compute)
+
+        self.assertEqual((len(calls), errors), (1, []))
+        self.assertEqual(results, [{'portfolio_returns': [1]}] * 8)
+        self.assertEqual(self.flights.stats, {'leaders': 1, 'shared': 7})
+        # Nothing in flight any more, so the next call computes again
+        self.assertEqual(self.flights.do('portfolio-returns?top_n=5', compute), {'portfolio_returns': [2]})
+
+    def test_callers_wait_for_a_leader_slower_than_the_timeout(self):
+        self.flights = single_flight.SingleFlight(lock_dir=self.lock_dir, timeout=0.05)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.3)
+            return len(calls)
+
+        results, errors = self.run_concurrently(compute, count=4)
+
+        self.assertEqual((results, errors), ([1] * 4, []))
+
+    def test_lock_files_are_bounded(self):
+        paths = {self.flights.lock_path(f'news?tickers=T{i}') for i in range(5000)}
+
+        self.assertLessEqual(len(paths), single_flight.LOCK_BUCKETS)
+        self.assertEqual(self.flights.lock_path('news?tickers=GME'), self.flights.lock_path('news?tickers=GME'))
+
+    def test_errors_reach_every_waiting_caller(self):
+        def compute():
+            time.sleep(0.2)
+            raise ConnectionError('NewsAPI down')
+
+        results, errors = self.run_concurrently(compute, count=3)
+
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ['NewsAPI down'] * 3)
+
+    def test_file_lock_excludes_other_holders_until_released(self):
+        path = os.path.join(self.lock_dir, 'key.lock')
+        held, release = threading.Event(), threading.Event()
+
+        def hold():
+            with single_flight.file_lock(path, timeout=1):
+                held.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        held.wait()
+        with single_flight.file_lock(path, timeout=0.1) as locked:
+            self.assertFalse(locked)
+        release.set()
+        holder.join()
+        with single_flight.file_lock(path, timeout=0.1) as locked:
+            self.assertTrue(locked)
+
+    def test_request_key_ignores_parameter_order(self):
+        factory = APIRequestFactory()
+        first = Request(factory.get('/', {'indicator': 'score', 'top_n': '5'}))
+        second = Request(factory.get('/', {'top_n': '5', 'indicator': 'score'}))
+
+        self.assertEqual(single_flight.request_key('portfolio-returns', first.query_params),
+                         single_flight.request_key('portfolio-returns', second.query_params))
+
+
+class CacheMaintenanceTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        for hours, ticker in enumerate(['AAPL', 'TSLA', 'NVDA', 'GME']):
+            news_cache.store(ticker, [
+                {'title': f'{ticker} {i}', 'source': 'Reuters', 'publishedAt': self.now, 'url': f'https://e.com/{ticker}/{i}',
+                 'description': 'text', 'urlToImage': ''} for i in range(3)
+            ], self.now - timedelta(hours=10 - hours), timedelta(hours=1))
+
+    def test_chunked_delete_removes_entries_with_their_articles(self):
+        expired = NewsCache.objects.filter(expires_at__lt=self.now - timedelta(hours=7))
+
+        self.assertEqual(cache_maintenance.summarize(expired)['rows'], 6)
+        self.assertEqual(cache_maintenance.delete_in_chunks(expired, chunk_size=1), 2)
+        self.assertEqual(sorted(NewsCache.objects.values_list('cache_key', flat=True)), ['GME', 'NVDA'])
+        self.assertEqual(NewsArticle.objects.count(), 6)
+
+    def test_least_recently_used_entries_are_evicted_first(self):
+        # AAPL is the oldest entry but was just read
+        news_cache.cached_entries(['AAPL'], self.now - timedelta(days=1))
+
+        dry_run = cache_maintenance.evict_lru(NewsCache, max_entries=2, chunk_size=1, dry_run=True)
+        self.assertEqual((dry_run['entries'], NewsCache.objects.count()), (2, 4))
+
+        evicted = cache_maintenance.evict_lru(NewsCache, max_entries=2, chunk_size=1)
+        self.assertEqual(evicted, dry_run)
+        self.assertEqual(sorted(NewsCache.objects.values_list('cache_key', flat=True)), ['AAPL', 'GME'])
+
+    def test_byte_budget_evicts_until_under_it(self):
+        size = cache_maintenance.summarize(NewsCache.objects.all())['bytes']
+
+        call_command('cleanup_news_cache', '--cache-type', 'news', '--days', '1', '--max-bytes', str(size // 2),
+                     stdout=StringIO())
+
+        self.assertEqual(NewsCache.objects.count(), 2)
+        self.assertLessEqual(cache_maintenance.summarize(NewsCache.objects.all())['bytes'], size // 2)
+
+    def test_loop_keeps_running_after_a_failed_cleanup(self):
+        cleanups = [OperationalError('database is locked'), None, KeyboardInterrupt()]
+        out, err = StringIO(), StringIO()
+
+        with mock.patch.object(CleanupCommand, 'cleanup', side_effect=cleanups) as cleanup, mock.patch('time.sleep'):
+            call_command('cleanup_news_cache', '--loop', '60', stdout=out, stderr=err)
+
+        self.assertEqual(cleanup.call_count, 3)
+        self.assertIn('database is locked', err.getvalue())
+        self.assertIn('Stopped', out.getvalue())
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """
+    Local stand-in for a Redis server: the RESP commands RedisBackend sends, over an in-memory dict
+    """
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            command = args[0].decode().upper()
+            self.server.commands.append(command)
+            now = time.time()
+            live = lambda key: key in store and (store[key][1] is None or store[key][1] > now)
+            if command == 'MGET':
+                reply = b'*%d\r\n' % (len(args) - 1) + b''.join(
+                    b'$%d\r\n%s\r\n' % (len(store[key][0]), store[key][0]) if live(key) else b'$-1\r\n'
+                    for key in args[1:]
+                )
+            elif command == 'SET':
+                expires = now + int(args[4]) / 1000 if len(args) > 3 and args[3].upper() == b'PX' else None
+                store[args[1]] = (args[2], expires)
+                reply = b'+OK\r\n'
+            elif command == 'DEL':
+                reply = b':%d\r\n' % sum(store.pop(key, None) is not None for key in args[1:])
+            elif command == 'SCAN':
+                keys = [key for key in store if live(key) and fnmatch.fnmatchcase(key, args[3])]
+                reply = b'*2\r\n$1\r\n0\r\n*%d\r\n' % len(keys) + b''.join(
+                    b'$%d\r\n%s\r\n' % (len(key), key) for key in keys
+                )
+            elif command == 'SELECT':
+                reply = b'+OK\r\n'
+            else:
+                reply = b'-ERR unknown command\r\n'
+            self.wfile.write(reply)
+
+
+class CacheBackendTests(TestCase):
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FakeRedisHandler)
+        self.server.daemon_threads = True
+        self.server.store, self.server.commands = {}, []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.redis_url = 'redis://127.0.0.1:%d/1' % self.server.server_address[1]
+
+    def backends(self):
+        return [cache_backends.LRUBackend(), cache_backends.FileBackend(self.tmp),
+                cache_backends.RedisBackend(self.redis_url)]
+
+    def test_backends_store_expire_and_delete_values(self):
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                backend.set_many({'a': [('GME', 1.5, 1)], 'b': {'n': 2}})
+                backend.set('short', 'gone', timeout=0.05)
+                self.assertEqual(backend.get_many(['a', 'b', 'missing']), {'a': [('GME', 1.5, 1)], 'b': {'n': 2}})
+                time.sleep(0.1)
+                self.assertIsNone(backend.get('short'))
+                backend.delete_many(['a'])
+                self.assertEqual(backend.get_many(['a', 'b']), {'b': {'n': 2}})
+        self.assertIn('MGET', self.server.commands)
+
+    def test_unreadable_cache_files_are_misses_and_removed(self):
+        backend = cache_backends.FileBackend(self.tmp)
+        backend.set_many({'truncated': list(range(100)), 'empty': 1, 'garbage': 2})
+        with open(backend.path('truncated'), 'r+b') as f:
+            f.truncate(10)
+        open(backend.path('empty'), 'wb').close()
+        with open(backend.path('garbage'), 'wb') as f:
+            f.write(b'not a pickle')
+
+        self.assertEqual(backend.get_many(['truncated', 'empty', 'garbage']), {})
+        self.assertEqual(os.listdir(self.tmp), [])
+        with self.assertRaises(TypeError):
+            cache_backends.KeyValueBackend()
+
+    def test_memory_backend_evicts_least_recently_used(self):
+        backend = cache_backends.LRUBackend(max_entries=2)
+        backend.set_many({'a': 1, 'b': 2})
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertEqual(backend.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+    def test_indicator_rankings_through_redis(self):
+        store = cache_backends.KeyValueIndicatorStore(cache_backends.RedisBackend(self.redis_url))
+        ranking = [('GME', 3.0, 1), ('AMC', 2.0, 2), ('TSLA', 1.0, 3)]
+        store.set_ranking('score', pd.Timestamp('2021-02-01'), ranking, 3, 'v1')
+
+        self.assertEqual(store.get_rankings('score', [date(2021, 2, 1), date(2021, 3, 1)], 'v1', 2),
+                         {date(2021, 2, 1): ranking[:2]})
+        self.assertEqual(store.get_rankings('score', [date(2021, 2, 1)], 'v1', 4), {})
+        self.assertEqual(store.get_rankings('score', [date(2021, 2, 1)], 'v2', 2), {})
+
+    def test_indicator_rankings_of_untouched_months_are_carried_forward(self):
+        monthly_aggregates.rebuild(pd.DataFrame(
+            {'score': [1.0, 2.0, 3.0]},
+            index=pd.MultiIndex.from_arrays([pd.to_datetime(['2021-01-05', '2021-02-05', '2021-03-05']),
+                                             ['GME', 'GME', 'AMC']], names=['date', 'stock']),
+        ))
+        store = cache_backends.KeyValueIndicatorStore(cache_backends.LRUBackend())
+        for month in ['2021-01-01', '2021-02-01', '2021-03-01']:
+            store.set_ranking('score', pd.Timestamp(month), [('GME', 1.0, 1)], 1, 'v1')
+
+        carried = store.carry_forward('v1', 'v2', [pd.Timestamp('2021-02-01')])
+
+        self.assertEqual(carried, 2)
+        self.assertEqual(set(store.get_rankings('score', [date(2021, 1, 1), date(2021, 2, 1), date(2021, 3, 1)], 'v2', 1)),
+                         {date(2021, 1, 1), date(2021, 3, 1)})
+        self.assertEqual(store.carry_forward('v2', 'v2', []), 0)
+
+    def test_superseded_indicator_rankings_are_purged(self):
+        ranking = [('GME', 3.0, 1)]
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                store = cache_backends.KeyValueIndicatorStore(backend)
+                for version in ['v1', 'v2']:
+                    store.set_ranking('score', pd.Timestamp('2021-02-01'), ranking, 1, version)
+                backend.set('news:GME', 'articles')
+
+                self.assertEqual(store.purge_superseded('v2', dry_run=True), 1)
+                self.assertEqual(len(backend.keys('indicators:')), 2)
+                self.assertEqual(store.purge_superseded('v2'), 1)
+                self.assertEqual(sorted(backend.keys()), ['indicators:v2:score:2021-02-01', 'news:GME'])
+
+    def test_cleanup_purges_superseded_rankings_of_the_file_backend(self):
+        dataset = os.path.join(self.tmp, 'reddit_sentiment_data.csv')
+        with open(dataset, 'w') as f:
+            f.write('title,score\n')
+        current_version = RedditSentimentData.dataset_version(dataset)
+        backends = {'indicators': {'BACKEND': 'file', 'LOCATION': os.path.join(self.tmp, 'cache')}}
+        with override_settings(API_CACHE_BACKENDS=backends):
+            store = cache_backends.indicator_store()
+            for version in ['old', current_version]:
+                store.set_ranking('score', pd.Timestamp('2021-02-01'), [('GME', 3.0, 1)], 1, version)
+            out = StringIO()
+
+            call_command('cleanup_news_cache', '--cache-type', 'indicators', '--dataset', dataset, stdout=out)
+
+            self.assertIn('deleted 1 superseded monthly indicator rankings from FileBackend', out.getvalue())
+            self.assertEqual(store.backend.keys(), [f'indicators:{current_version}:score:2021-02-01'])
+
+    def test_news_served_from_memory_backend_without_cache_rows(self):
+        client_stub = StubNewsClient({'AAPL': [9, 1], 'TSLA': [8]})
+        with override_settings(API_CACHE_BACKENDS={'news': {'BACKEND': 'memory', 'OPTIONS': {'MAX_ENTRIES': 100}}}):
+            first = news_cache.get_news(['AAPL', 'TSLA'], client_factory=lambda: client_stub)
+            second = news_cache.get_news(['AAPL', 'TSLA'], client_factory=lambda: client_stub)
+
+        self.assertEqual(client_stub.queries, ['AAPL', 'TSLA'])
+        self.assertEqual(second['cached_tickers'], ['AAPL', 'TSLA'])
+        self.assertEqual(second['articles'], first['articles'])
+        self.assertFalse(NewsCache.objects.exists())
+
+    def test_unreachable_backend_is_a_miss(self):
+        self.server.shutdown()
+        self.server.server_close()
+        store = cache_backends.KeyValueNewsStore(cache_backends.RedisBackend(self.redis_url, socket_timeout=0.2))
+
+        self.assertEqual(store.get_many(['AAPL'], timezone.now()), {})
+        self.assertEqual(store.set('AAPL', [], timezone.now(), timedelta(hours=1)).articles, [])
+
+
+class AsyncStubNewsClient(StubNewsClient):
+    async def get_everything(self, q, **kwargs):
+        await asyncio.sleep(0.01)
+        return super().get_everything(q, **kwargs)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        StockPriceHistoryViewTests.setUp(self)
+        self.client_stub = AsyncStubNewsClient({'AAPL': [9, 1], 'TSLA': [8, 7]})
+        AsyncNewsView.news_client_factory = staticmethod(lambda: self.client_stub)
+        self.addCleanup(setattr, AsyncNewsView, 'news_client_factory', staticmethod(news_cache.async_newsapi_client))
+
+    async def test_price_history_matches_sync_view(self):
+        params = {'start_date': '2021-01-01', 'end_date': '2021-02-28', 'tickers': 'GME,AMC', 'resolution': 'monthly'}
+        async_response = await self.async_client.get('/api_v1/async/stock-price-history/', params)
+        sync_response = await self.async_client.get('/api_v1/stock-price-history/', params)
+
+        self.assertEqual(async_response.json(), sync_response.json())
+        missing = await self.async_client.get('/api_v1/async/stock-price-history/', {'ticker': 'GME'})
+        self.assertEqual(missing.status_code, 400)
+
+    async def test_news_is_fetched_concurrently_and_cached(self):
+        responses = await asyncio.gather(*(
+            self.async_client.get('/api_v1/async/news/', {'tickers': 'tsla,AAPL'}) for _ in range(3)
+        ))
+        cached = (await self.async_client.get('/api_v1/async/news/', {'tickers': 'AAPL,TSLA'})).json()
+
+        # Identical concurrent requests share one fetch of each ticker
+        self.assertEqual(sorted(self.client_stub.queries), ['AAPL', 'TSLA'])
+        data = responses[0].json()
+        self.assertEqual((data['status'], data['fetched_tickers'], data['cached']), ('success', ['AAPL', 'TSLA'], False))
+        self.assertEqual([article['title'] for article in data['articles']],
+                         ['AAPL news 9', 'TSLA news 8', 'TSLA news 7', 'AAPL news 1'])
+        self.assertEqual((cached['cached'], cached['articles']), (True, data['articles']))
+
+    async def test_failed_tickers_are_left_out(self):
+        self.client_stub.failing = {'TSLA'}
+        data = (await self.async_client.get('/api_v1/async/news/', {'tickers': 'AAPL,TSLA'})).json()
+
+        self.assertEqual((data['fetched_tickers'], data['failed_tickers']), (['AAPL'], ['TSLA']))
+
+    async def test_portfolio_returns_runs_on_the_bounded_pool(self):
+        response = await self.async_client.get('/api_v1/async/portfolio-returns/', {'top_n': '0'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('top_n', response.json()['error'])
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.client_stub = StubNewsClient({'AAPL': [9, 1], 'TSLA': [8, 7]})
+        NewsViewSet.news_client_factory = staticmethod(lambda: self.client_stub)
+        self.addCleanup(setattr, NewsViewSet, 'news_client_factory', staticmethod(news_cache.newsapi_client))
+        # A registry of this test's requests only
+        patcher = mock.patch.object(instrumentation, 'registry', instrumentation.MetricsRegistry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stages(self, response) -> dict:
+        return {part.split(';')[0]: part for part in response['Server-Timing'].split(', ')}
+
+    def test_server_timing_lists_the_stages_of_a_request(self):
+        fetched = self.stages(self.client.get('/api_v1/news/', {'tickers': 'AAPL,TSLA'}))
+        cached = self.stages(self.client.get('/api_v1/news/', {'tickers': 'AAPL,TSLA'}))
+
+        self.assertEqual(list(fetched), ['cache_lookup', 'news_fetch', 'render', 'total'])
+        self.assertRegex(fetched['cache_lookup'], r'^cache_lookup;dur=\d+\.\d;desc="\d+ queries"$')
+        self.assertEqual(list(cached), ['cache_lookup', 'render', 'total'])
+
+    def test_metrics_expose_latency_histograms_and_cache_hit_ratio(self):
+        self.client.get('/api_v1/news/', {'tickers': 'AAPL'})
+        self.client.get('/api_v1/news/', {'tickers': 'AAPL,TSLA'})
+
+        response = self.client.get('/metrics')
+        lines = response.content.decode().splitlines()
+
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('# TYPE stock_server_request_duration_seconds histogram', lines)
+        self.assertIn('stock_server_request_duration_seconds_count{endpoint="news-list",method="GET",status="200"} 2',
+                      lines)
+        self.assertIn('stock_server_stage_duration_seconds_count{endpoint="news-list",stage="news_fetch"} 2', lines)
+        self.assertIn('stock_server_cache_lookups_total{cache="news",result="miss"} 2', lines)
+        self.assertIn('stock_server_cache_hit_ratio{cache="news"} 0.3333333333333333', lines)
+        self.assertIn('stock_server_single_flight_total{flight="requests",role="leader"} 2', lines)
+
+    def test_spans_count_queries_only_inside_requests(self):
+        with instrumentation.span('outside'):
+            list(NewsCache.objects.all())
+        self.assertEqual(self.registry.render(), '\n')
+
+        timings = []
+        token = instrumentation._timings.set(timings)
+        try:
+            with instrumentation.span('outer'):
+                list(NewsCache.objects.all())
+                with instrumentation.span('inner'):
+                    list(NewsArticle.objects.all())
+        finally:
+            instrumentation._timings.reset(token)
+
+        self.assertEqual([(name, queries) for name, _, queries in timings], [('inner', 1), ('outer', 2)])
+        self.assertEqual(instrumentation.server_timing([['a', 0.0012, 2], ['b', 0.5, 0], ['a', 0.001, 1]], 0.6),
+                         'a;dur=2.2;desc="3 queries", b;dur=500.0, total;dur=600.0')
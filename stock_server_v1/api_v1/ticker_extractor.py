@@ -0,0 +1,110 @@
+"""
+Vectorized stock ticker extraction from Reddit posts.
+
+Same rules as extract_ticker_regex.ipynb:
+- bare tickers: all-caps words of 2-5 letters (\\b[A-Z]{2,5}\\b) in the title or body
+- $TICKER mentions: only for posts without a bare ticker, the word after a '$' if it
+  has no digits
+- candidates are kept only if they are in ticker_list.txt, single letters are dropped
+
+The ticker list is compiled once into a hashed pd.Index. Posts are processed in
+batches with pandas string methods: one findall per pattern, one explode and one hash
+lookup per batch. The result is a long (post_id, ticker) frame, one row per distinct
+ticker of a post; join it back to the posts when the wide per-ticker rows are needed.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TICKER_LIST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'ticker_list.txt')
+
+BARE_TICKER_PATTERN = r'\b[A-Z]{2,5}\b'
+DOLLAR_TICKER_PATTERN = r'\$(\w+)'
+
+
+class TickerExtractor:
+    def __init__(self, tickers):
+        """
+        tickers: iterable of valid ticker symbols
+        """
+        symbols = {ticker.strip() for ticker in tickers if ticker and ticker.strip()}
+        self.tickers = pd.Index(sorted(symbols))
+        # Build the hash table once, get_indexer reuses it for every batch
+        self.tickers.get_indexer(self.tickers[:1])
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_TICKER_LIST) -> 'TickerExtractor':
+        with open(path, 'r') as f:
+            return cls(line for line in f)
+
+    def _valid(self, candidates: pd.Series) -> pd.Series:
+        return candidates[self.tickers.get_indexer(candidates.to_numpy(dtype=object)) >= 0]
+
+    def _find(self, text: pd.Series, pattern: str) -> pd.Series:
+        """
+        Every match of pattern in text as one Series indexed by the text's row
+        """
+        found = text.str.findall(pattern).explode().dropna()
+        return found.astype(object)
+
+    def extract_batch(self, text: pd.Series) -> pd.Series:
+        """
+        Valid tickers of each row of a text Series (RangeIndex), indexed by row position.
+        Each (row, ticker) appears once, in order of first mention.
+        """
+        bare = self._valid(self._find(text, BARE_TICKER_PATTERN))
+
+        # $TICKER mentions only for posts without a bare ticker
+        rest = text[~np.isin(np.arange(len(text)), bare.index.to_numpy())]
+        rest = rest[rest.str.contains('$', regex=False)]
+        dollar = self._find(rest, DOLLAR_TICKER_PATTERN)
+        dollar = self._valid(dollar[~dollar.str.contains(r'\d')])
+
+        found = pd.concat([bare, dollar])
+        found = found[found.str.len() > 1]
+        pairs = pd.DataFrame({'row': found.index.to_numpy(), 'ticker': found.to_numpy()})
+        pairs = pairs.drop_duplicates().sort_values('row', kind='stable')
+        return pd.Series(pairs['ticker'].to_numpy(), index=pairs['row'].to_numpy(), name='ticker')
+
+    def extract(self, df: pd.DataFrame, id_column: str = 'id',
+                text_columns: tuple = ('title', 'body'), batch_size: int = 50_000) -> pd.DataFrame:
+        """
+        Long (post_id, ticker) frame for the posts in df. Post ids come from id_column,
+        or from the index if df has no such column.
+        """
+        post_ids = df[id_column] if id_column in df.columns else df.index.to_series()
+        columns = [column for column in text_columns if column in df.columns]
+
+        frames = []
+        for start in range(0, len(df), batch_size):
+            stop = start + batch_size
+            # Joining with a newline keeps word boundaries, so matching the joined text
+            # finds the same words as matching each column
+            text = None
+            for column in columns:
+                part = df[column].iloc[start:stop].fillna('').astype(str).reset_index(drop=True)
+                text = part if text is None else text + '\n' + part
+            if text is None:
+                break
+            tickers = self.extract_batch(text)
+            frames.append(pd.DataFrame({
+                'post_id': post_ids.iloc[start:stop].to_numpy()[tickers.index.to_numpy(dtype='int64')],
+                'ticker': tickers.to_numpy(),
+            }))
+
+        if not frames:
+            return pd.DataFrame({'post_id': pd.Series(dtype=post_ids.dtype), 'ticker': pd.Series(dtype=object)})
+        return pd.concat(frames, ignore_index=True)
+
+
+def attach_tickers(df: pd.DataFrame, pairs: pd.DataFrame, id_column: str = 'id', column: str = 'stock') -> pd.DataFrame:
+    """
+    One row per (post, ticker) with the post's columns and the ticker in column, the
+    layout of the sentiment csv. Posts without a ticker are dropped.
+    """
+    post_ids = df[id_column] if id_column in df.columns else df.index.to_series()
+    positions = pd.Index(post_ids).get_indexer(pairs['post_id'])
+    result = df.iloc[positions].reset_index(drop=True)
+    result.insert(0, column, pairs['ticker'].to_numpy())
+    return result
@@ -3,16 +3,23 @@ from rest_framework import routers
 from .views import StockPriceHistoryViewSet
 from .views import PortfolioReturnsViewSet
 from .views import NewsViewSet
+from .views import BacktestSweepViewSet
+from .async_views import AsyncStockPriceHistoryView, AsyncNewsView, AsyncPortfolioReturnsView
 
 router = routers.DefaultRouter()
 router.register(r'stock-price-history', StockPriceHistoryViewSet, basename='stock-price-history')
 router.register(r'portfolio-returns', PortfolioReturnsViewSet, basename='portfolio-returns')
 router.register(r'news', NewsViewSet, basename='news')
+router.register(r'backtest-sweep', BacktestSweepViewSet, basename='backtest-sweep')
 
 urlpatterns = [
     # path('', include(router.urls)),
     # path('', index, name='index'),
     path('', include(router.urls)),
+    # Async versions of the I/O-bound endpoints, for ASGI deployments
+    path('async/stock-price-history/', AsyncStockPriceHistoryView.as_view(), name='async-stock-price-history'),
+    path('async/news/', AsyncNewsView.as_view(), name='async-news'),
+    path('async/portfolio-returns/', AsyncPortfolioReturnsView.as_view(), name='async-portfolio-returns'),
 ]
 
 
@@ -1,46 +1,69 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q
-from .models import StockPriceHistory, NewsCache, NewsArticle, MonthlyIndicatorCache, MonthlyIndicatorScore
-from .Serializers import StockPriceHistorySerializer
+from rest_framework.settings import api_settings
 from django.shortcuts import render
 from .RedditSentimentData import RedditSentimentData
+from .data_registry import registry as dataset_registry
+from .ranking_index import AGG_MAP
+from . import backtest
+from . import cache_backends
+from . import downsampling
+from . import news_cache
+from . import price_history
+from . import renderers
+from . import instrumentation
+from . import single_flight
 from django.conf import settings
-from django.utils import timezone
 import os
-import numpy as np
 import pandas as pd
 from pprint import pprint
-import hashlib
-import json
-from datetime import timedelta
 import logging
+import time
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Concurrent identical requests share one computation
+request_flights = single_flight.SingleFlight(name='requests')
+
+
+def coalesced_response(key, request, handler):
+    """
+    Response of handler(request), computed once for concurrent requests with the same key
+    """
+    response = request_flights.do(key, lambda: handler(request))
+    return Response(response.data, status=response.status_code)
+
+
 class StockPriceHistoryViewSet(viewsets.ViewSet):
     def list(self, request):
+        """
+        Daily prices between start_date and end_date.
+        ticker=GME returns a list of rows; tickers=GME,AMC returns {ticker: [rows]} from one query.
+        resolution=weekly|monthly aggregates OHLCV bars, max_points=N downsamples each series (LTTB).
+        """
         ticker = request.query_params.get('ticker')
+        tickers = price_history.parse_tickers(request.query_params.get('tickers', ''))
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
-        print(ticker, start_date, end_date)
 
-        if not all([ticker, start_date, end_date]):
-            return Response({"error": "Please provide ticker, start_date, and end_date."},
+        if not (ticker or tickers) or not all([start_date, end_date]):
+            return Response({"error": "Please provide ticker (or tickers), start_date, and end_date."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(tickers) > price_history.MAX_TICKERS:
+            return Response({"error": f"At most {price_history.MAX_TICKERS} tickers per request."},
                             status=status.HTTP_400_BAD_REQUEST)
-
         try:
-            # Assuming your StockPriceHistory model has 'ticker', 'date' (or a similar date field), and other data fields
-            queryset = StockPriceHistory.objects.filter(
-                Q(ticker=ticker) &
-                Q(date__gte=start_date) &
-                Q(date__lte=end_date)
-            ).order_by('date')  # Order by date for consistency
+            resolution, max_points = downsampling.parse_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            serializer = StockPriceHistorySerializer(queryset, many=True)  # Serialize multiple objects
-            return Response(serializer.data)
+        try:
+            if tickers:
+                return Response(price_history.price_records_by_ticker(tickers, start_date, end_date,
+                                                                      resolution, max_points))
+            return Response(price_history.price_records(ticker, start_date, end_date, resolution, max_points))
 
         except Exception as e:
             return Response({"error": str(e)},
@@ -48,9 +71,14 @@ class StockPriceHistoryViewSet(viewsets.ViewSet):
 
 
 class PortfolioReturnsViewSet(viewsets.ViewSet):
-    def get_cached_monthly_indicators(self, indicator, start_date, end_date):
+    # ?format=columnar picks the layout; Accept: application/msgpack the binary encoding
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [renderers.MessagePackRenderer]
+    content_negotiation_class = renderers.LayoutContentNegotiation
+
+    def get_cached_monthly_indicators(self, indicator, start_date, end_date, top_n=5, dataset_version=''):
         """
         Get cached monthly indicator scores for the date range.
+        Only months cached for the current dataset version with rankings at least top_n deep count as hits.
         Returns (cached_data, missing_months) where:
         - cached_data: dict of {month_str: [(ticker, score, rank), ...]}
         - missing_months: list of datetime objects for months that need calculation
@@ -67,190 +95,138 @@ class PortfolioReturnsViewSet(viewsets.ViewSet):
         
         cached_data = {}
         missing_months = []
-        now = timezone.now()
         
-        print(f"🔍 MONTHLY CACHE CHECK: {indicator} | {len(months_needed)} months needed ({start_date} to {end_date})")
+        # Fetch every valid cached month of the range with its top scores in one lookup
+        cached_by_month = cache_backends.indicator_store().get_rankings(
+            indicator, [month_dt.date() for month_dt in months_needed], dataset_version, top_n
+        )
         
         for month_dt in months_needed:
             month_str = month_dt.strftime('%Y-%m-%d')
+            cached_month = cached_by_month.get(month_dt.date())
             
-            # Check for cached monthly data
-            cached_month = MonthlyIndicatorCache.objects.filter(
-                month_year=month_dt.date(),
-                indicator=indicator,
-                expires_at__gt=now
-            ).first()
-            
-            if cached_month:
+            if cached_month is not None:
                 # Get cached scores for this month
-                scores = cached_month.scores.filter(rank__lte=5).order_by('rank')
-                cached_data[month_str] = [(score.ticker, score.score_value, score.rank) for score in scores]
-                print(f"📋 MONTHLY CACHE HIT: {month_str} | {len(cached_data[month_str])} stocks")
+                cached_data[month_str] = cached_month
             else:
                 missing_months.append(month_dt)
-                print(f"❌ MONTHLY CACHE MISS: {month_str}")
         
+        instrumentation.record_cache('monthly_indicators', hits=len(cached_data), misses=len(missing_months))
+        logger.debug("Monthly cache %s %s to %s: %d of %d months cached", indicator, start_date, end_date,
+                     len(cached_data), len(months_needed))
         return cached_data, missing_months
     
-    def cache_monthly_indicators(self, indicator, month_dt, stocks_data):
+    def cache_monthly_indicators(self, indicator, month_dt, stocks_data, depth, dataset_version):
         """
         Cache monthly indicator scores for a specific month.
-        stocks_data: list of (ticker, score, rank) tuples
+        stocks_data: list of (ticker, score, rank) tuples, the full ranking down to depth
         """
-        month_str = month_dt.strftime('%Y-%m-%d')
-        now = timezone.now()
-        
-        # Clean up any existing cache for this month/indicator
-        MonthlyIndicatorCache.objects.filter(
-            month_year=month_dt.date(),
-            indicator=indicator
-        ).delete()
+        # Replace any existing cache for this month/indicator/version in a single transaction
+        # (valid until the sentiment data or the ranking parameters change)
+        cache_backends.indicator_store().set_ranking(indicator, month_dt, stocks_data, depth, dataset_version)
         
-        # Create new cache entry (expires in 7 days - monthly data is relatively stable)
-        expires_at = now + timedelta(days=7)
-        monthly_cache = MonthlyIndicatorCache.objects.create(
-            month_year=month_dt.date(),
-            indicator=indicator,
-            expires_at=expires_at
-        )
-        
-        # Save stock scores
-        for ticker, score_value, rank in stocks_data:
-            MonthlyIndicatorScore.objects.create(
-                cache=monthly_cache,
-                ticker=ticker,
-                score_value=score_value,
-                rank=rank
-            )
-        
-        print(f"💾 MONTHLY CACHED: {month_str} | {len(stocks_data)} stocks | expires in 7 days")
+        logger.debug("Monthly cached %s %s: %d stocks, version %s", indicator, month_dt.strftime('%Y-%m'),
+                     len(stocks_data), dataset_version)
     
-    def calculate_missing_monthly_indicators(self, indicator, missing_months):
+    def calculate_missing_monthly_indicators(self, indicator, missing_months, top_n=5, dataset_version=''):
         """
         Calculate indicator scores for missing months using RedditSentimentData logic.
-        Returns dict of {month_str: [(ticker, score, rank), ...]}
+        Rankings are cached down to MONTHLY_INDICATOR_MAX_TOP_N so later requests for
+        any top_n up to that depth are cache hits.
+        Returns dict of {month_str: [(ticker, score, rank), ...]} limited to top_n
         """
         if not missing_months:
             return {}
         
-        print(f"🔄 CALCULATING MISSING MONTHS: {len(missing_months)} months for {indicator}")
+        logger.debug("Calculating %d missing months for %s", len(missing_months), indicator)
         
         # Load sentiment data
         file = "reddit_sentiment_data.csv"
         sentiment_data_path = os.path.join(settings.BASE_DIR, 'data', file)
         sentiment_data = RedditSentimentData(sentiment_data_path)
         
-        # Get the raw sentiment dataframe
-        df_sentiment = sentiment_data.df_sentiment
+        # Monthly aggregates and ranks for every indicator, computed once per dataset version
+        ranking = sentiment_data.ranking_index()
         
+        depth = settings.MONTHLY_INDICATOR_MAX_TOP_N
         calculated_data = {}
         
         for month_dt in missing_months:
             month_str = month_dt.strftime('%Y-%m-%d')
             
-            # Calculate for this specific month using RedditSentimentData logic
-            month_start = month_dt
-            month_end = month_dt + pd.offsets.MonthEnd()
-            
-            # Filter data for this month
-            month_data = df_sentiment.loc[
-                (df_sentiment.index.get_level_values('date') >= month_start) & 
-                (df_sentiment.index.get_level_values('date') <= month_end)
-            ]
-            
-            if month_data.empty:
-                print(f"⚠️  No data available for {month_str}")
+            if indicator not in ranking.indicators:
+                logger.warning("Unknown indicator: %s", indicator)
                 calculated_data[month_str] = []
                 continue
             
-            # Aggregate by stock for this month (same logic as filter_strategies)
-            agg_map = {
-                'engagement_ratio': 'mean',
-                'total_sentiment': 'mean', 
-                'comms_num': 'mean',
-                'score': 'mean'
-            }
-            
-            if indicator not in agg_map:
-                print(f"⚠️  Unknown indicator: {indicator}")
-                calculated_data[month_str] = []
-                continue
-            
-            agg_func = agg_map[indicator]
-            
-            # Group by stock and aggregate
-            month_agg = (
-                month_data.reset_index('stock')
-                .groupby('stock')[[indicator]]
-                .agg(agg_func)
-                .dropna()
-            )
+            # Look up the ranking of this month as (ticker, score, rank) tuples
+            stocks_data = ranking.top(indicator, month_dt, depth)
             
-            if month_agg.empty:
-                print(f"⚠️  No valid data after aggregation for {month_str}")
+            if not stocks_data:
+                logger.debug("No data available for %s", month_str)
                 calculated_data[month_str] = []
                 continue
             
-            # Rank stocks (descending order - higher is better)
-            month_agg['rank'] = month_agg[indicator].rank(ascending=False, method='first').astype(int)
+            calculated_data[month_str] = stocks_data[:top_n]
             
-            # Get top 5 stocks
-            top_stocks = month_agg[month_agg['rank'] <= 5].sort_values('rank')
-            
-            # Convert to list of tuples
-            stocks_data = [
-                (ticker, float(row[indicator]), int(row['rank'])) 
-                for ticker, row in top_stocks.iterrows()
-            ]
-            
-            calculated_data[month_str] = stocks_data
-            
-            # Cache this month's data
-            self.cache_monthly_indicators(indicator, month_dt, stocks_data)
-            
-            print(f"✅ CALCULATED: {month_str} | {len(stocks_data)} stocks")
+            # Cache this month's full-depth ranking
+            self.cache_monthly_indicators(indicator, month_dt, stocks_data, depth, dataset_version)
         
         return calculated_data
 
     def list(self, request):
+        key = single_flight.request_key('portfolio-returns', request.query_params)
+        return coalesced_response(key, request, self.portfolio_response)
+
+    def portfolio_response(self, request):
         start_date = request.query_params.get('start_date', '2021-01-28')
         end_date = request.query_params.get('end_date', '2021-08-02')
         market_index = request.query_params.get('market_index', 'QQQ')
         indicator = request.query_params.get('indicator', 'engagement_ratio')
+        top_n = request.query_params.get('top_n', settings.MONTHLY_INDICATOR_DEFAULT_TOP_N)
+
+        try:
+            top_n = int(top_n)
+        except (TypeError, ValueError):
+            top_n = 0
+        if not 1 <= top_n <= settings.MONTHLY_INDICATOR_MAX_TOP_N:
+            return Response({"error": f"top_n must be an integer between 1 and {settings.MONTHLY_INDICATOR_MAX_TOP_N}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            resolution, max_points = downsampling.parse_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        layout = renderers.parse_layout(request.query_params)
 
         # Enforce date range limits - do not exceed the available data range
-        max_start_date = '2021-01-28'
-        max_end_date = '2021-08-02'
-        
-        # Clamp the dates to the available range
-        if start_date < max_start_date:
-            start_date = max_start_date
-        if end_date > max_end_date:
-            end_date = max_end_date
+        start_date, end_date = backtest.clamp_date_range(start_date, end_date)
 
         try:
-            print(f"🚀 PORTFOLIO REQUEST: {indicator} | {start_date} to {end_date} | {market_index}")
-            
-            # 1. Check for cached monthly indicators
-            cached_monthly_data, missing_months = self.get_cached_monthly_indicators(
-                indicator, start_date, end_date
-            )
+            with instrumentation.span('cache_lookup'):
+                # Cached rankings are only valid for the current sentiment data and ranking parameters
+                sentiment_data_path = os.path.join(settings.BASE_DIR, 'data', 'reddit_sentiment_data.csv')
+                dataset_version = RedditSentimentData.dataset_version(sentiment_data_path)
+                
+                # 1. Check for cached monthly indicators
+                cached_monthly_data, missing_months = self.get_cached_monthly_indicators(
+                    indicator, start_date, end_date, top_n, dataset_version
+                )
             
             # 2. Calculate missing monthly data if needed
             if missing_months:
-                calculated_monthly_data = self.calculate_missing_monthly_indicators(
-                    indicator, missing_months
-                )
+                with instrumentation.span('indicator_calculation'):
+                    calculated_monthly_data = self.calculate_missing_monthly_indicators(
+                        indicator, missing_months, top_n, dataset_version
+                    )
                 # Merge calculated data with cached data
                 cached_monthly_data.update(calculated_monthly_data)
             
             # 3. Build filtered dataframe from cached/calculated monthly data
-            print(f"📊 BUILDING PORTFOLIO: {len(cached_monthly_data)} months of data")
             
             # Convert monthly data to the format expected by portfolio calculations
             tickers_by_date = {}
             for month_str, stocks_data in cached_monthly_data.items():
-                # Extract just the tickers (top 5)
+                # Extract just the tickers (top N)
                 tickers = [ticker for ticker, score, rank in stocks_data]
                 tickers_by_date[month_str] = tickers
             
@@ -264,44 +240,25 @@ class PortfolioReturnsViewSet(viewsets.ViewSet):
             sentiment_data_path = os.path.join(settings.BASE_DIR, 'data', file)
             sentiment_data = RedditSentimentData(sentiment_data_path)
             
-            # Get all unique stocks from monthly selections
-            all_stocks = set()
-            for stocks in tickers_by_date.values():
-                all_stocks.update(stocks)
-            stock_list = list(all_stocks)
-            
-            print(f"📈 LOADING HISTORICAL DATA: {len(stock_list)} unique stocks")
-            
-            # Load historical price data
-            historical_data_path = os.path.join(settings.BASE_DIR, 'data', 'stock_historical_prices_2019-2024')
-            df_portfolio = sentiment_data.load_historical_data(
-                historical_data_path, stock_list, tickers_by_date, start_date, end_date
-            )
-            
-            # Calculate portfolio returns
-            file_path_index = os.path.join(settings.BASE_DIR, 'data', 'market_indexes_2019-2024', f'{market_index}.csv')
-            portfolio_returns = sentiment_data.get_portfolio_returns(
-                file_path_index, df_portfolio, market_index, start_date, end_date
+            # Load historical price data and calculate portfolio returns against the market index
+            # (timed as the price_load and return_computation stages)
+            portfolio_returns = backtest.portfolio_frame(
+                sentiment_data, backtest.data_paths(settings.BASE_DIR), tickers_by_date,
+                market_index, start_date, end_date
             )
-            
-            # Debug: Check the portfolio_returns DataFrame structure
-            print(f"🔍 PORTFOLIO DATAFRAME DEBUG for {indicator}:")
-            print(f"  Shape: {portfolio_returns.shape}")
-            print(f"  Columns: {portfolio_returns.columns.tolist()}")
-            print(f"  Index name: {portfolio_returns.index.name}")
-            print(f"  First 3 rows:")
-            print(portfolio_returns.head(3))
-            print(f"  Has NaN values: {portfolio_returns.isnull().any().any()}")
-            print(f"  Data types: {portfolio_returns.dtypes.to_dict()}")
-            
-            # Convert portfolio index (date) to string
-            portfolio_returns.index = portfolio_returns.index.strftime('%Y-%m-%d')
-            # Reset index to turn the date index into a column
-            portfolio_returns_reset = portfolio_returns.reset_index()
-            # Replace NaN with None for JSON serialization
-            portfolio_returns_reset = portfolio_returns_reset.replace({np.nan: None})
-            # Convert DataFrame to list of dicts
-            portfolio_returns_list = portfolio_returns_reset.to_dict(orient='records')
+
+            with instrumentation.span('serialization'):
+                # Coarser resolution and point budget for the chart
+                daily_points = len(portfolio_returns)
+                portfolio_returns = downsampling.downsample_frame(
+                    downsampling.resample_frame(portfolio_returns, resolution), max_points
+                )
+                
+                # One dict per day, or a shared date array plus one array per series
+                if layout == 'columnar':
+                    portfolio_returns_data = renderers.frame_columns(portfolio_returns)
+                else:
+                    portfolio_returns_data = renderers.frame_records(portfolio_returns)
 
             # Filter tickers_by_date to only include dates within the selected date range
             start_date_dt = pd.to_datetime(start_date)
@@ -317,25 +274,93 @@ class PortfolioReturnsViewSet(viewsets.ViewSet):
             tickers_by_date_list = [{'date': date, 'tickers': tickers} 
                                    for date, tickers in filtered_tickers_by_date.items()]
             
-            print(f"✅ PORTFOLIO COMPLETE: {len(portfolio_returns_list)} return points | {len(tickers_by_date_list)} portfolio dates")
+            logger.debug("Portfolio %s top %d %s to %s vs %s: %d of %d points, %d portfolio dates, %d months calculated",
+                         indicator, top_n, start_date, end_date, market_index, len(portfolio_returns), daily_points,
+                         len(tickers_by_date_list), len(missing_months))
 
             return Response({
-                'portfolio_returns': portfolio_returns_list,
+                'portfolio_returns': portfolio_returns_data,
+                'format': layout,
                 'start_date': start_date,
                 'end_date': end_date,
                 'market_index': market_index,
                 'indicator': indicator,
+                'top_n': top_n,
+                'resolution': resolution,
+                'max_points': max_points,
                 'tickers_by_date': tickers_by_date_list,
                 'cached': len(missing_months) == 0,  # True if all months were cached
                 'cache_info': {
                     'total_months': len(cached_monthly_data),
                     'cached_months': len(cached_monthly_data) - len(missing_months),
-                    'calculated_months': len(missing_months)
+                    'calculated_months': len(missing_months),
+                    'dataset_version': dataset_version,
+                    'sentiment_dataset': dataset_registry.stats(sentiment_data_path)
                 }
             })
             
         except Exception as e:
-            print(f"❌ PORTFOLIO ERROR: {str(e)}")
+            logger.exception("Portfolio request failed: %s", e)
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class BacktestSweepViewSet(viewsets.ViewSet):
+    def create(self, request):
+        """
+        Run a grid of portfolio backtests in a process pool and return summary statistics per combination.
+        Body: {"indicators": [...], "market_indexes": [...],
+               "windows": [{"start_date": "...", "end_date": "..."}], "top_ns": [...], "workers": N}
+        """
+        grid = request.data
+        if not isinstance(grid, dict):
+            return Response({"error": "The sweep grid must be a JSON object."}, status=status.HTTP_400_BAD_REQUEST)
+        indicators = grid.get('indicators') or ['engagement_ratio']
+        unknown = [indicator for indicator in indicators if indicator not in AGG_MAP]
+        if unknown:
+            return Response({"error": f"Unknown indicators: {unknown}. Available: {list(AGG_MAP)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            top_ns = [int(top_n) for top_n in (grid.get('top_ns') or [settings.MONTHLY_INDICATOR_DEFAULT_TOP_N])]
+            windows = [{'start_date': str(window['start_date']), 'end_date': str(window['end_date'])}
+                       for window in (grid.get('windows') or [])]
+            workers = int(grid.get('workers') or settings.BACKTEST_SWEEP_MAX_WORKERS)
+        except (TypeError, ValueError, KeyError) as e:
+            return Response({"error": f"Invalid sweep grid: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(1 <= top_n <= settings.MONTHLY_INDICATOR_MAX_TOP_N for top_n in top_ns):
+            return Response({"error": f"top_ns must be integers between 1 and {settings.MONTHLY_INDICATOR_MAX_TOP_N}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # Index names become file paths, so only the indexes that have a price file are accepted
+        paths = backtest.data_paths(settings.BASE_DIR)
+        market_indexes = grid.get('market_indexes') or ['QQQ']
+        available = backtest.market_indexes(paths)
+        if not isinstance(market_indexes, list) or any(market_index not in available for market_index in market_indexes):
+            return Response({"error": f"Unknown market_indexes: {market_indexes}. Available: {available}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        tasks = backtest.expand_grid({
+            'indicators': indicators,
+            'market_indexes': market_indexes,
+            'windows': windows,
+            'top_ns': top_ns,
+        }, paths)
+        if len(tasks) > settings.BACKTEST_SWEEP_MAX_COMBINATIONS:
+            return Response({"error": f"Sweep has {len(tasks)} combinations, the limit is {settings.BACKTEST_SWEEP_MAX_COMBINATIONS}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            logger.info("Backtest sweep: %d combinations, %d workers", len(tasks), workers)
+            started = time.perf_counter()
+            # Never fork from a request thread; sweeps share one long-lived pool of spawned workers
+            executor = backtest.sweep_executor(tasks[0]['paths'], settings.BACKTEST_SWEEP_MAX_WORKERS)
+            results = backtest.run_sweep(tasks, min(workers, settings.BACKTEST_SWEEP_MAX_WORKERS), executor)
+            elapsed = time.perf_counter() - started
+            logger.info("Backtest sweep complete: %d combinations in %.2fs", len(results), elapsed)
+            return Response({
+                'combinations': len(results),
+                'elapsed_seconds': elapsed,
+                'results': results,
+            })
+        except Exception as e:
+            logger.exception("Backtest sweep failed: %s", e)
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 def index(request):
@@ -350,7 +375,7 @@ def index(request):
     end_date = '2021-07-25'
     historical_data_path = os.path.join(settings.BASE_DIR, 'data', 'stock_historical_prices_2019-2024')
     df_portfolio = sentiment_data.load_historical_data(historical_data_path, stock_list, fixed_dates, start_date, end_date)
-    print(df_portfolio)
+    logger.debug("Index portfolio frame: %s", df_portfolio.shape)
     market_index = 'QQQ'
     file_path_index = os.path.join(settings.BASE_DIR, 'data', 'market_indexes_2019-2024', f'{market_index}.csv')
     portfolio_returns = sentiment_data.get_portfolio_returns(file_path_index, df_portfolio, market_index, start_date, end_date)
@@ -367,153 +392,40 @@ def index(request):
 
 
 class NewsViewSet(viewsets.ViewSet):
+    # Builds the NewsAPI client on a cache miss; tests swap in a local stub
+    news_client_factory = staticmethod(news_cache.newsapi_client)
+
     def list(self, request):
+        tickers = news_cache.parse_tickers(request.query_params.get('tickers', ''))
+        return coalesced_response(f"news?tickers={','.join(tickers)}", request, self.news_response)
+
+    def news_response(self, request):
         """
-        Get recent news for a list of stock tickers with SQLite caching
+        Get recent news for a list of stock tickers, cached per ticker in SQLite
         """
-        tickers = request.query_params.get('tickers', '')
-        
-        if not tickers:
+        # Normalize tickers; each one is cached on its own
+        ticker_list = news_cache.parse_tickers(request.query_params.get('tickers', ''))
+
+        if not ticker_list:
             return Response({"error": "Please provide tickers parameter."},
                             status=status.HTTP_400_BAD_REQUEST)
-        
+        if len(ticker_list) > settings.NEWS_MAX_TICKERS:
+            return Response({"error": f"At most {settings.NEWS_MAX_TICKERS} tickers per request."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            # Normalize tickers for consistent caching
-            ticker_list = sorted([ticker.strip().upper() for ticker in tickers.split(',')])
-            normalized_tickers = ','.join(ticker_list)
-            
-            # Create cache key from tickers
-            cache_key = hashlib.md5(normalized_tickers.encode()).hexdigest()
-            
-            # Check for existing valid cache
-            now = timezone.now()
-            cached_news = NewsCache.objects.filter(
-                cache_key=cache_key,
-                expires_at__gt=now
-            ).first()
-            
-            if cached_news:
-                print(f"📰 NEWS CACHE HIT: {normalized_tickers} | {cached_news.total_results} articles | Cached at: {cached_news.created_at}")
-                
-                # Return cached articles
-                articles = []
-                for article in cached_news.articles.all().order_by('article_order'):
-                    articles.append({
-                        'title': article.title,
-                        'source': article.source,
-                        'publishedAt': article.published_at.isoformat(),
-                        'url': article.url,
-                        'description': article.description,
-                        'urlToImage': article.url_to_image
-                    })
-                
-                return Response({
-                    'status': 'success',
-                    'articles': articles,
-                    'totalResults': cached_news.total_results,
-                    'tickers': ticker_list,
-                    'cached': True,
-                    'cached_at': cached_news.created_at.isoformat()
-                })
-            
-            # No valid cache found - fetch from API
-            print(f"🌐 NEWS FETCHING: {normalized_tickers} | Calling NewsAPI...")
-            
-            from newsapi import NewsApiClient
-            
-            # Load API key from configuration file
-            config_path = os.path.join(settings.BASE_DIR, '..', '.api_keys.json')
-            try:
-                with open(config_path, 'r') as config_file:
-                    config = json.load(config_file)
-                api_key = config['news_api_key']
-            except FileNotFoundError:
-                return Response({"error": "API keys configuration file not found."},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            except KeyError:
-                return Response({"error": "News API key not found in configuration."},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            # Initialize NewsApiClient
-            newsapi = NewsApiClient(api_key=api_key)
-            
-            # Create search query from all tickers
-            search_query = ' OR '.join(ticker_list)
-            
-            # Get recent news from US sources
-            all_articles = newsapi.get_everything(
-                q=search_query,
-                language='en',
-                sort_by='publishedAt',
-                page_size=10,  # Get more articles to filter down to 5 US ones
-                page=1,
-                domains='wsj.com,bloomberg.com,reuters.com,cnbc.com,marketwatch.com,yahoo.com,forbes.com,cnn.com,foxbusiness.com,barrons.com,thestreet.com,seekingalpha.com,fool.com,benzinga.com,investorplace.com'
-            )
-            
-            if all_articles['status'] == 'ok' and all_articles['totalResults'] > 0:
-                # Clean up any expired cache entries for this key
-                NewsCache.objects.filter(cache_key=cache_key).delete()
-                
-                # Create new cache entry (expires in 1 hour)
-                expires_at = now + timedelta(hours=1)
-                news_cache = NewsCache.objects.create(
-                    cache_key=cache_key,
-                    tickers=normalized_tickers,
-                    expires_at=expires_at,
-                    total_results=0  # Will be updated after processing articles
-                )
-                
-                # Format articles for response and save to cache
-                articles = []
-                for idx, article in enumerate(all_articles['articles'][:5]):  # Limit to top 5 articles
-                    # Only include articles that have proper content
-                    if article['title'] and article['description']:
-                        # Save to cache
-                        NewsArticle.objects.create(
-                            cache=news_cache,
-                            title=article['title'],
-                            source=article['source']['name'],
-                            published_at=article['publishedAt'],
-                            url=article['url'],
-                            description=article['description'],
-                            url_to_image=article.get('urlToImage', ''),
-                            article_order=idx + 1
-                        )
-                        
-                        # Add to response
-                        articles.append({
-                            'title': article['title'],
-                            'source': article['source']['name'],
-                            'publishedAt': article['publishedAt'],
-                            'url': article['url'],
-                            'description': article['description'],
-                            'urlToImage': article.get('urlToImage', '')
-                        })
-                
-                # Update total results in cache
-                news_cache.total_results = len(articles)
-                news_cache.save()
-                
-                print(f"💾 NEWS CACHED: {normalized_tickers} | Saved {len(articles)} articles | Expires: {expires_at}")
-                
-                return Response({
-                    'status': 'success',
-                    'articles': articles,
-                    'totalResults': len(articles),
-                    'tickers': ticker_list,
-                    'cached': False,
-                    'cache_expires_at': expires_at.isoformat()
-                })
-            else:
-                return Response({
-                    'status': 'no_results',
-                    'message': 'No recent news found for the specified tickers.',
-                    'tickers': ticker_list
-                })
-                
+            news = news_cache.get_news(ticker_list, client_factory=self.news_client_factory)
+            logger.debug("News %s: fetched %s, cached %s, stale %s", ','.join(ticker_list),
+                         news['fetched_tickers'], news['cached_tickers'], news['stale_tickers'])
+
+            return Response(news_cache.response_data(ticker_list, news))
+
         except ImportError:
             return Response({"error": "NewsAPI library not installed."},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except news_cache.NewsConfigError as e:
+            return Response({"error": str(e)},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
             return Response({"error": f"Error fetching news: {str(e)}"},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
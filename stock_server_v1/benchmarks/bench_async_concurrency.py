@@ -0,0 +1,110 @@
+"""
+Serve a burst of concurrent requests through the ASGI handler and compare the sync DRF
+endpoints with their async versions (/api_v1/async/...).
+
+    cd stock_server_v1
+    python benchmarks/bench_async_concurrency.py
+    python benchmarks/bench_async_concurrency.py --endpoint news --concurrency 200 --latency 0.2
+    python benchmarks/bench_async_concurrency.py --endpoint prices --concurrency 100
+
+news: every request asks for a ticker nobody asked for before, so each one waits on a
+local stand-in for NewsAPI that answers after --latency seconds. News is cached in the
+memory backend, so the database is not written. prices: every request reads one
+ticker's daily history from the database. Django still runs async ORM queries on one
+thread, so the async price view frees the event loop while it waits but does not read
+faster; its gain is in the requests it no longer blocks.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_server_v1.settings')
+
+import django
+django.setup()
+
+from django.conf import settings
+from django.test import AsyncClient
+from api_v1.async_views import AsyncNewsView
+from api_v1.models import StockPriceHistory
+from api_v1.views import NewsViewSet
+
+
+def articles(q):
+    return {'status': 'ok', 'totalResults': 1, 'articles': [
+        {'title': f'{q} news', 'description': 'text', 'source': {'name': 'Reuters'},
+         'url': f'https://example.com/{q}', 'urlToImage': None, 'publishedAt': '2025-07-01T09:00:00Z'}
+    ]}
+
+
+class SlowNewsClient:
+    latency = 0.1
+
+    def get_everything(self, q, **kwargs):
+        time.sleep(self.latency)
+        return articles(q)
+
+
+class AsyncSlowNewsClient:
+    latency = 0.1
+
+    async def get_everything(self, q, **kwargs):
+        await asyncio.sleep(self.latency)
+        return articles(q)
+
+
+async def burst(path: str, params: list) -> tuple:
+    client = AsyncClient()
+
+    async def one(query):
+        started = time.perf_counter()
+        response = await client.get(path, query)
+        assert response.status_code == 200, response.content[:200]
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one(query) for query in params))
+    return time.perf_counter() - started, sorted(latencies)
+
+
+def report(name: str, elapsed: float, latencies: list):
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f'{name:40} {elapsed:8.2f}s {len(latencies) / elapsed:9.1f} req/s '
+          f'{statistics.median(latencies) * 1000:9.0f}ms {p95 * 1000:9.0f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--endpoint', choices=['news', 'prices'], default='news')
+    parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+    parser.add_argument('--latency', type=float, default=0.1, help='Seconds the NewsAPI stand-in takes per call')
+    args = parser.parse_args()
+
+    print(f'{args.concurrency} concurrent {args.endpoint} requests')
+    print(f'{"":40} {"total":>9} {"throughput":>13} {"p50":>11} {"p95":>11}')
+    if args.endpoint == 'news':
+        settings.API_CACHE_BACKENDS = dict(settings.API_CACHE_BACKENDS, news={'BACKEND': 'memory'})
+        SlowNewsClient.latency = AsyncSlowNewsClient.latency = args.latency
+        NewsViewSet.news_client_factory = staticmethod(SlowNewsClient)
+        AsyncNewsView.news_client_factory = staticmethod(AsyncSlowNewsClient)
+        for name, path, prefix in [('sync  /api_v1/news/', '/api_v1/news/', 'S'),
+                                   ('async /api_v1/async/news/', '/api_v1/async/news/', 'A')]:
+            params = [{'tickers': f'{prefix}{i:04d}'} for i in range(args.concurrency)]
+            report(name, *asyncio.run(burst(path, params)))
+    else:
+        tickers = list(StockPriceHistory.objects.values_list('ticker', flat=True).distinct()[:args.concurrency])
+        if not tickers:
+            sys.exit('No price history loaded; run load_price_history first')
+        params = [{'ticker': tickers[i % len(tickers)], 'start_date': '2019-01-01', 'end_date': '2024-12-31'}
+                  for i in range(args.concurrency)]
+        for name, path in [('sync  /api_v1/stock-price-history/', '/api_v1/stock-price-history/'),
+                           ('async /api_v1/async/stock-price-history/', '/api_v1/async/stock-price-history/')]:
+            report(name, *asyncio.run(burst(path, params)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare one backtest sweep against the same combinations requested one by one from
+the portfolio-returns endpoint.
+
+    cd stock_server_v1
+    python benchmarks/bench_backtest_sweep.py --windows 12 --top-n 5,10,20
+    python benchmarks/bench_backtest_sweep.py --url http://127.0.0.1:8000   # against a running server
+
+Without --url the sequential requests go through the full Django stack in-process
+(django.test.Client), so the comparison excludes network latency and favours the
+sequential path.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_server_v1.settings')
+
+import django
+django.setup()
+
+import pandas as pd
+from django.conf import settings
+from django.test import Client
+from api_v1 import backtest
+from api_v1.ranking_index import AGG_MAP
+
+
+def build_tasks(window_count: int, top_ns: list, market_indexes: list) -> list:
+    # Rolling windows of three months inside the available data range
+    starts = pd.date_range(backtest.MAX_START_DATE, backtest.MAX_END_DATE, periods=window_count + 1)[:-1]
+    windows = [
+        {'start_date': start.strftime('%Y-%m-%d'),
+         'end_date': min(start + pd.DateOffset(months=3), pd.Timestamp(backtest.MAX_END_DATE)).strftime('%Y-%m-%d')}
+        for start in starts
+    ]
+    grid = {'indicators': list(AGG_MAP), 'market_indexes': market_indexes, 'windows': windows, 'top_ns': top_ns}
+    return backtest.expand_grid(grid, backtest.data_paths(settings.BASE_DIR))
+
+
+def run_sequential(tasks: list, url: str = None) -> float:
+    client = Client(SERVER_NAME='localhost')
+    started = time.perf_counter()
+    for task in tasks:
+        params = {key: task[key] for key in ('indicator', 'market_index', 'start_date', 'end_date', 'top_n')}
+        if url:
+            with urllib.request.urlopen(f'{url}/api_v1/portfolio-returns/?{urllib.parse.urlencode(params)}') as response:
+                json.load(response)
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                client.get('/api_v1/portfolio-returns/', params).json()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--windows', type=int, default=8, help='Number of rolling windows (default: 8)')
+    parser.add_argument('--top-n', type=str, default='5,10', help='Comma-separated portfolio sizes')
+    parser.add_argument('--market-indexes', type=str, default='QQQ', help='Comma-separated market indexes')
+    parser.add_argument('--workers', type=int, default=settings.BACKTEST_SWEEP_MAX_WORKERS)
+    parser.add_argument('--url', type=str, default=None, help='Base url of a running server for the sequential run')
+    args = parser.parse_args()
+
+    tasks = build_tasks(args.windows, [int(n) for n in args.top_n.split(',')], args.market_indexes.split(','))
+    print(f'{len(tasks)} combinations, {args.workers} workers')
+
+    # Warm both paths once so neither pays for the first dataset load
+    run_sequential(tasks[:1], args.url)
+    backtest.run_sweep(tasks[:1], 1)
+
+    sequential = run_sequential(tasks, args.url)
+    print(f'sequential portfolio-returns: {sequential:8.2f}s  ({len(tasks) / sequential:7.1f} backtests/s)')
+
+    started = time.perf_counter()
+    backtest.run_sweep(tasks, args.workers)
+    sweep = time.perf_counter() - started
+    print(f'backtest sweep:               {sweep:8.2f}s  ({len(tasks) / sweep:7.1f} backtests/s)')
+    print(f'speedup: {sequential / sweep:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
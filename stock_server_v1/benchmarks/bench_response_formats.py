@@ -0,0 +1,70 @@
+"""
+Time building and encoding a portfolio-returns series in each response layout and
+encoding, with the gzip size of each payload.
+
+    cd stock_server_v1
+    python benchmarks/bench_response_formats.py
+    python benchmarks/bench_response_formats.py --days 10000 --series 4
+
+The series are synthetic cumulative returns over business days, so long windows can be
+measured beyond the range of the bundled data.
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_server_v1.settings')
+
+import django
+django.setup()
+
+import numpy as np
+import pandas as pd
+from rest_framework.renderers import JSONRenderer
+from api_v1 import renderers
+
+
+def synthetic_frame(days: int, series: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range('2000-01-03', periods=days, name='Date')
+    returns = np.cumprod(1 + rng.normal(0.0003, 0.01, (days, series)), axis=0) - 1
+    df = pd.DataFrame(returns, index=index, columns=['portfolio_return'] + [f'INDEX{i}' for i in range(1, series)])
+    df.iloc[0] = np.nan
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=5000)
+    parser.add_argument('--series', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs')
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.days, args.series)
+    cases = [
+        ('records, json', renderers.frame_records, JSONRenderer()),
+        ('columnar, json', renderers.frame_columns, JSONRenderer()),
+        ('records, msgpack', renderers.frame_records, renderers.MessagePackRenderer()),
+        ('columnar, msgpack', renderers.frame_columns, renderers.MessagePackRenderer()),
+    ]
+    print(f'{args.days} days x {args.series} series')
+    print(f'{"":20} {"build":>9} {"encode":>9} {"bytes":>10} {"gzip":>10}')
+    for name, build, renderer in cases:
+        build_seconds = encode_seconds = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            data = {'portfolio_returns': build(df)}
+            built = time.perf_counter()
+            payload = renderer.render(data)
+            encoded = time.perf_counter()
+            build_seconds = min(build_seconds or np.inf, built - started)
+            encode_seconds = min(encode_seconds or np.inf, encoded - built)
+        print(f'{name:20} {build_seconds * 1000:7.1f}ms {encode_seconds * 1000:7.1f}ms '
+              f'{len(payload):10d} {len(gzip.compress(payload)):10d}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare the stock-price-history fast path (one values_list query for all tickers)
+with the previous path: one StockPriceHistorySerializer query per ticker. Both are
+timed through JSON rendering, and the rows and values are checked to match.
+
+    cd stock_server_v1
+    python benchmarks/bench_stock_price_history.py
+    python benchmarks/bench_stock_price_history.py --tickers 20 --start 2020-01-01 --end 2025-06-30
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_server_v1.settings')
+
+import django
+django.setup()
+
+from rest_framework.renderers import JSONRenderer
+from api_v1 import price_history
+from api_v1.models import StockPriceHistory
+from api_v1.Serializers import StockPriceHistorySerializer
+
+
+def serializer_path(tickers: list, start_date: str, end_date: str) -> dict:
+    # One request per ticker, as the dashboard did before the tickers parameter
+    return {
+        ticker: StockPriceHistorySerializer(
+            StockPriceHistory.objects.filter(ticker=ticker, date__gte=start_date, date__lte=end_date).order_by('date'),
+            many=True,
+        ).data
+        for ticker in tickers
+    }
+
+
+def timed(function, repeat: int):
+    renderer = JSONRenderer()
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        payload = b''.join(renderer.render(rows) for rows in result.values())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, payload, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', type=int, default=10, help='Number of tickers with the most rows to request')
+    parser.add_argument('--start', default='2000-01-01')
+    parser.add_argument('--end', default='2100-01-01')
+    parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs')
+    args = parser.parse_args()
+
+    tickers = list(StockPriceHistory.objects.values_list('ticker', flat=True).distinct().order_by('ticker')[:args.tickers])
+    if not tickers:
+        print('StockPriceHistory is empty; run manage.py load_price_history first')
+        return
+
+    old, old_payload, old_seconds = timed(lambda: serializer_path(tickers, args.start, args.end), args.repeat)
+    new, new_payload, new_seconds = timed(
+        lambda: price_history.price_records_by_ticker(tickers, args.start, args.end), args.repeat)
+
+    rows = sum(len(records) for records in new.values())
+    print(f'{rows} rows of {len(tickers)} tickers')
+    print(f'serializer, one query per ticker: {old_seconds * 1000:8.1f}ms {rows / old_seconds:10.0f} rows/s '
+          f'{len(old_payload) / 1024:8.0f} KiB')
+    print(f'values_list, one query:           {new_seconds * 1000:8.1f}ms {rows / new_seconds:10.0f} rows/s '
+          f'{len(new_payload) / 1024:8.0f} KiB ({old_seconds / new_seconds:.1f}x faster)')
+
+    same = all(
+        [(record['date'], float(record['close_price']), record['volume']) for record in old[ticker]]
+        == [(record['date'], record['close_price'], record['volume']) for record in new[ticker]]
+        for ticker in tickers
+    )
+    print('results identical' if same else 'results DIFFER')
+
+
+if __name__ == '__main__':
+    main()
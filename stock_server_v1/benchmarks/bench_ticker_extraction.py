@@ -0,0 +1,83 @@
+"""
+Compare the vectorized TickerExtractor with the row-by-row extraction of
+extract_ticker_regex.ipynb on the raw Reddit posts, and check both find the same
+(post, ticker) pairs.
+
+    cd stock_server_v1
+    python benchmarks/bench_ticker_extraction.py
+    python benchmarks/bench_ticker_extraction.py --repeat 20   # posts duplicated 20x
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from api_v1.ticker_extractor import TickerExtractor, DEFAULT_TICKER_LIST
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def notebook_extract(df: pd.DataFrame, ticker_list: list) -> set:
+    """
+    The notebook's approach: list membership, df.apply per row, then a $TICKER pass
+    over the rows without a ticker
+    """
+    def find_tickers_in_row(row) -> list:
+        title = row['title'] if pd.notnull(row['title']) else ''
+        body = row['body'] if pd.notnull(row['body']) else ''
+        found = re.findall(r'\b[A-Z]{2,5}\b', title) + re.findall(r'\b[A-Z]{2,5}\b', body)
+        return list(set(ticker for ticker in found if ticker in ticker_list))
+
+    def dollar_tickers(text) -> list:
+        if not isinstance(text, str) or '$' not in text:
+            return []
+        return [t for t in re.findall(r'\$(\w+)', text)
+                if not any(char.isdigit() for char in t) and t in ticker_set]
+
+    ticker_set = set(ticker_list)
+    pairs = set()
+    tickers_per_row = df.apply(find_tickers_in_row, axis=1)
+    for post_id, tickers, title, body in zip(df['id'], tickers_per_row, df['title'], df['body']):
+        if not tickers:
+            tickers = set(dollar_tickers(title) + dollar_tickers(body))
+        pairs.update((post_id, ticker) for ticker in tickers if len(ticker) > 1)
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=1, help='Duplicate the posts to scale the input')
+    parser.add_argument('--skip-notebook', action='store_true', help='Only time the vectorized extractor')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(DATA_DIR, 'reddit_raw_data', 'reddit_posts_*.csv')))
+    df = pd.concat([pd.read_csv(path, dtype={'id': str}) for path in paths], ignore_index=True)
+    df = df.drop_duplicates('id')
+    if args.repeat > 1:
+        df = pd.concat([df.assign(id=df['id'] + f'_{i}') for i in range(args.repeat)], ignore_index=True)
+    print(f'{len(df)} posts from {len(paths)} files')
+
+    started = time.perf_counter()
+    extractor = TickerExtractor.from_file(DEFAULT_TICKER_LIST)
+    pairs = extractor.extract(df)
+    vectorized = time.perf_counter() - started
+    print(f'TickerExtractor:  {vectorized:.2f}s, {len(pairs)} (post, ticker) pairs')
+
+    if not args.skip_notebook:
+        with open(DEFAULT_TICKER_LIST) as f:
+            ticker_list = [line.strip() for line in f if line.strip()]
+        started = time.perf_counter()
+        expected = notebook_extract(df, ticker_list)
+        row_by_row = time.perf_counter() - started
+        print(f'notebook row-by-row: {row_by_row:.2f}s ({row_by_row / vectorized:.0f}x slower)')
+        same = expected == set(zip(pairs['post_id'], pairs['ticker']))
+        print('results identical' if same else 'results DIFFER')
+
+
+if __name__ == '__main__':
+    main()
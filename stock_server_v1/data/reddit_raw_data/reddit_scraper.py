@@ -1,6 +1,7 @@
 import praw
 import json
-import pandas as pd
+import os
+import sys
 
 # Read json file with reddit credentials
 with open(".reddit_credentials.json", "r") as f:
@@ -15,52 +16,17 @@ reddit = praw.Reddit(
     password=credentials["password"],
 )
 
-def get_reddit_posts(subreddit_name,
-                     limit=10
-                     ):
-    """
-    Fetches the latest posts from a given subreddit.
-
-    Args:
-        subreddit_name (str): The name of the subreddit to fetch posts from.
-        limit (int): The number of posts to fetch. Default is 2000.
-
-    Returns:
-        list: A list of dictionaries containing post details.
-    """
-    print(f"Try to fetch max. {limit} posts from r/{subreddit_name}...")
-    subreddit = reddit.subreddit(subreddit_name)
-    posts = []
-    counter = 0
-    # Fetch the posts from the subreddit 
-    for submission in subreddit.new(limit=limit):
-        post = {
-            "id": submission.id,
-            "title": submission.title,
-            "score": submission.score,
-            "num_comments": submission.num_comments,
-            "body": submission.selftext,
-            "created_utc": submission.created_utc,
-        }
-        posts.append(post)
-        counter += 1
-        print(f"Fetched {counter} posts...")
-
-    print(f"Total posts fetched: {len(posts)}")       
-    return posts
-
 
 if __name__ == "__main__":
-    # PRAW
+    # Incremental ingestion: only posts newer than the last checkpoint are fetched,
+    # deduplicated by id and appended to reddit_posts_<subreddit>_<YYYY-MM>.csv
+    # (same as `python manage.py ingest_reddit`)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from api_v1.reddit_ingest import ingest
+
     subreddit_name = "wallstreetbets"
-    limit = 2000
-    posts = get_reddit_posts(
-        subreddit_name=subreddit_name,
-        limit=limit
-    )
-    
-    # Save the posts to a csv file
-    df = pd.DataFrame(posts)
-    output_file = f"reddit_posts_{subreddit_name}_latest.csv"
-    df.to_csv(output_file, index=False)
-    print(f"Posts saved to {output_file}")
\ No newline at end of file
+    summary = ingest(reddit, subreddit_name, os.path.dirname(os.path.abspath(__file__)))
+    for month, count in sorted(summary["months"].items()):
+        print(f"{month}: +{count} posts")
+    print(f"Fetched {summary['fetched']} posts, saved {summary['written']} new, "
+          f"skipped {summary['duplicates']} already seen")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Serve the project under ASGI with uvicorn, for the async endpoints (/api_v1/async/...).
+
+    cd stock_server_v1
+    python serve_asgi.py
+    python serve_asgi.py --port 8000 --workers 4
+
+Each worker process runs one event loop, so a worker holds any number of requests that
+wait on NewsAPI or the database. The DRF endpoints keep working and run on Django's
+sync thread, one at a time per worker; scale them with --workers.
+"""
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('ASGI_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('ASGI_PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('ASGI_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--log-level', default=os.environ.get('ASGI_LOG_LEVEL', 'info'))
+    args = parser.parse_args()
+
+    import uvicorn
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_server_v1.settings')
+    uvicorn.run(
+        'stock_server_v1.asgi:application',
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        # Django has no lifespan handlers
+        lifespan='off',
+        # Keep-alive across the dashboard's polling
+        timeout_keep_alive=30,
+    )
+
+
+if __name__ == '__main__':
+    main()
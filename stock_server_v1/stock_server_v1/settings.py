@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import json
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Server-Timing header and /metrics latencies of every request, compression included
+    'api_v1.instrumentation.ServerTimingMiddleware',
+    # Compresses responses for clients sending Accept-Encoding: gzip; before the rest, so it sees the final body
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -96,6 +101,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transactions take the write lock up front, so concurrent writers (request threads
+            # and background cache refreshes) wait for each other instead of failing with
+            # "database is locked" when a read lock cannot be upgraded
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -141,6 +153,63 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Monthly indicator cache: every cached month stores rankings this deep, so any
+# portfolio-returns top_n up to this value is served without recomputing
+MONTHLY_INDICATOR_DEFAULT_TOP_N = 5
+MONTHLY_INDICATOR_MAX_TOP_N = 50
+
+# Parameter sweeps (backtest-sweep endpoint and run_backtest_sweep command)
+BACKTEST_SWEEP_MAX_WORKERS = os.cpu_count() or 1
+BACKTEST_SWEEP_MAX_COMBINATIONS = 2000
+
+# News cache (news endpoint): articles are cached per ticker for this long, and the
+# tickers missing from the cache are fetched from NewsAPI this many at a time.
+# Entries expired less than NEWS_CACHE_STALE_SECONDS ago are served as stale while a
+# background thread refreshes them
+NEWS_CACHE_TTL_SECONDS = 60 * 60
+NEWS_CACHE_STALE_SECONDS = 6 * 60 * 60
+NEWS_FETCH_WORKERS = 4
+# Every ticker missing from the cache costs one NewsAPI request (of the plan's daily quota),
+# so a news request may name at most this many tickers (one portfolio's holdings at the deepest top_n)
+NEWS_MAX_TICKERS = MONTHLY_INDICATOR_MAX_TOP_N
+
+# Concurrent identical portfolio-returns and news requests are computed once; worker
+# processes coordinate through lock files in this directory
+SINGLE_FLIGHT_LOCK_DIR = BASE_DIR / '.locks'
+SINGLE_FLIGHT_TIMEOUT_SECONDS = 120
+
+# Async portfolio-returns view (api_v1/async_views.py): the pandas work of at most this many
+# requests runs at a time, the rest wait without holding a thread
+ASYNC_PORTFOLIO_WORKERS = os.cpu_count() or 1
+
+# Cache hits record last_used_at for the LRU eviction of cleanup_news_cache --max-entries/--max-bytes,
+# at most once per entry per this many seconds
+CACHE_LRU_TOUCH_SECONDS = 10 * 60
+
+# Where the news and monthly indicator caches live (see api_v1/cache_backends.py):
+# 'database' (the cache tables), 'memory' (per-process LRU, OPTIONS MAX_ENTRIES),
+# 'file' (LOCATION directory shared by worker processes) or 'redis' (LOCATION redis://host:port/db).
+# Anything but 'database' keeps cache writes off the SQLite writer
+API_CACHE_BACKENDS = {
+    'news': {'BACKEND': 'database'},
+    'indicators': {'BACKEND': 'database'},
+}
+
+# api_v1 logs to the console; DEBUG adds the per-month cache and portfolio details
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'api_v1': {'handlers': ['console'], 'level': os.environ.get('API_LOG_LEVEL', 'INFO')},
+    },
+}
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -16,8 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from api_v1.instrumentation import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api_v1/', include('api_v1.urls')),
+    # Prometheus scrape target
+    path('metrics', metrics, name='metrics'),
 ]